@@ -0,0 +1,278 @@
+import os
+import json
+import threading
+import numpy as np
+import picod
+from motion import MotionQueue
+
+ARM_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arm.json")
+
+# Pulse width change per degree of a 500-2500µs, 180° servo
+US_PER_DEGREE = 2000 / 180
+
+# Servo response for types that do not give their own
+DEFAULT_LAG = 0.05  # s
+DEFAULT_DEADBAND = 5  # µs
+
+def load_config(path=ARM_CONFIG):
+    """Load the arm description
+
+    Each joint has an id, name, servo type, GPIO pin and its pulse widths
+    in µs: min, max, center, home (the start-up pose) and the manual jog
+    step.  Optional "zero" (pulse width at 0° of the kinematic model,
+    default center) and "us_per_degree" (signed, default 2000/180) give
+    the pulse/angle mapping.  Servo types list their speed in °/s and
+    acceleration in °/s², and optionally their response lag (time
+    constant in s) and deadband in µs for the servo model and their
+    "current" draw in A for the power budget (see power.py), which the
+    top-level "power" entry sets.  The "startup" and "park" entries are
+    the bring-up and shutdown plans (see bringup.py).
+    """
+    with open(path) as f:
+        return json.load(f)
+
+class Joint:
+    """A view of one joint of an Arm; the state stays in the arm's arrays"""
+
+    __slots__ = ("arm", "index")
+
+    def __init__(self, arm, index):
+        self.arm = arm
+        self.index = index
+
+    id = property(lambda self: self.arm.ids[self.index])
+    name = property(lambda self: self.arm.names[self.index])
+    type = property(lambda self: self.arm.types[self.index])
+    pin = property(lambda self: int(self.arm.pins[self.index]))
+    min = property(lambda self: int(self.arm.min[self.index]))
+    max = property(lambda self: int(self.arm.max[self.index]))
+    center = property(lambda self: int(self.arm.center[self.index]))
+    home = property(lambda self: int(self.arm.home[self.index]))
+    position = property(lambda self: int(self.arm.position[self.index]))
+
+    @property
+    def step(self):
+        return int(self.arm.step[self.index])
+
+    @step.setter
+    def step(self, value):
+        self.arm.step[self.index] = value
+
+class Arm:
+    """The servo joints of the arm, driven through one pico connection
+
+    Joint state is held in NumPy arrays indexed in config order, so limits,
+    clamping and pulse/angle mapping work on all joints at once.  Joints are
+    addressed by their config id in the dict based calls.
+    """
+
+    def __init__(self, pico, config=None):
+        if config is None:
+            config = load_config()
+        joints = config["joints"]
+        types = config["servo_types"]
+
+        self.pico = pico
+        self.config = config
+        self.frequency = config.get("frequency", 50)
+        self.ids = [j["id"] for j in joints]
+        self.names = [j["name"] for j in joints]
+        self.types = [j["type"] for j in joints]
+        self._index = {joint_id: i for i, joint_id in enumerate(self.ids)}
+
+        def column(key, default=None, dtype=np.int64):
+            return np.array([j.get(key, j["center"] if default is None else default)
+                             for j in joints], dtype=dtype)
+
+        self.pins = column("pin")
+        self.min = column("min")
+        self.max = column("max")
+        self.center = column("center")
+        self.home = column("home")
+        self.step = column("step", 50)
+        self.zero = column("zero", dtype=float)
+        self.us_per_degree = column("us_per_degree", US_PER_DEGREE, dtype=float)
+
+        speed = np.array([types[t]["speed"] for t in self.types], dtype=float)
+        accel = np.array([types[t]["accel"] for t in self.types], dtype=float)
+        self.vmax = speed * np.abs(self.us_per_degree)  # µs/s
+        self.amax = accel * np.abs(self.us_per_degree)  # µs/s²
+        self.lag = np.array([types[t].get("lag", DEFAULT_LAG) for t in self.types], dtype=float)
+        self.deadband = np.array([types[t].get("deadband", DEFAULT_DEADBAND) for t in self.types],
+                                 dtype=float)
+
+        self.position = self.home.copy()
+        self.active = np.zeros(len(joints), dtype=bool)
+        self.motion = None
+        self.lock = threading.RLock()  # held while commanding the servos and updating their state
+        self.recorder = None  # gets each commanded pose, see recording.Recorder
+        self.estimator = None  # predicts the real pose, see estimator.PositionEstimator
+        self.power = None  # limits planned moves to the supply, see power.PowerScheduler
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, joint):
+        return self._index[joint]
+
+    def joint(self, joint):
+        return Joint(self, self._index[joint])
+
+    def joints(self):
+        return [Joint(self, i) for i in range(len(self.ids))]
+
+    def clamp(self, pulses):
+        return np.clip(pulses, self.min, self.max)
+
+    def within_limits(self, pulses):
+        return (pulses >= self.min) & (pulses <= self.max)
+
+    def pulse_to_angle(self, pulses):
+        """Joint angles in radians for pulse widths in µs"""
+        return np.radians((np.asarray(pulses) - self.zero) / self.us_per_degree)
+
+    def angle_to_pulse(self, angles):
+        """Pulse widths in µs (not clamped) for joint angles in radians"""
+        return self.zero + np.degrees(angles) * self.us_per_degree
+
+    def estimated_position(self):
+        """Where the joints really are as far as is known, in µs
+
+        The servos give no feedback, so without an estimator this is the
+        commanded widths.
+        """
+        if self.estimator:
+            return self.estimator.estimate()
+        return self.position.astype(float)
+
+    def pose(self, pulses):
+        """Pulse width array for a {joint: µs} dict, unlisted joints keep their position"""
+        out = self.position.copy()
+        for joint, width in pulses.items():
+            out[self._index[joint]] = width
+        return out
+
+    def set_pulse_array(self, pulses, mask=None, ack=False):
+        """Set the joints' pulse widths in a single message
+
+        `pulses` holds one width per joint in µs (0 switches the output
+        off), `mask` selects the joints to write.  Widths outside a joint's
+        range are clamped and active joints whose width has not changed
+        are skipped.  Every servo request is queued and the message is
+        sent once, so all joints change within the same PWM period.  With
+        `ack` the last request asks for a reply and its status is
+        returned, otherwise nothing is waited for.
+        """
+        pulses = np.asarray(pulses)
+        off = pulses == 0
+        widths = np.where(off, 0, self.clamp(np.rint(pulses))).astype(np.int64)
+        with self.lock:
+            send = off | ~self.active | (widths != self.position)
+            if mask is not None:
+                send &= mask
+            changed = np.flatnonzero(send)
+            if not len(changed):
+                return picod.STATUS_OKAY
+
+            last = len(changed) - 1
+            status = picod.STATUS_NO_REPLY
+            for k, i in enumerate(changed):
+                reply = picod.REPLY_NOW if ack and k == last else picod.REPLY_NONE
+                status = self.pico.tx_servo(int(self.pins[i]), int(widths[i]), self.frequency,
+                                            reply=reply, flush=(k == last))
+
+            self.active[changed] = ~off[changed]
+            self.position[changed] = np.where(off[changed], self.position[changed], widths[changed])
+            self._sent()
+            return status
+
+    def _sent(self):
+        if self.recorder:
+            self.recorder.record(np.where(self.active, self.position, 0))
+        if self.estimator:
+            self.estimator.command(self.position, self.active)
+
+    def configure(self, pull=picod.PULL_DOWN, widths=None):
+        """Set up every servo pin in one message: PWM function, pull and output
+
+        The outputs start at `widths` (clamped; 0 or None leaves them
+        off), so a whole bring-up step costs one USB transfer rather than
+        several requests per pin.
+        """
+        pins = [int(pin) for pin in self.pins]
+        mask = sum(1 << pin for pin in pins)
+        widths = np.zeros(len(pins), dtype=np.int64) if widths is None else np.asarray(widths)
+        off = widths == 0
+        widths = np.where(off, 0, self.clamp(np.rint(widths))).astype(np.int64)
+
+        with self.lock:
+            sequence = self.pico.sequence()
+            sequence.GPIO_set_functions(mask, sum(picod.FUNC_PWM << (4 * pin) for pin in pins))
+            sequence.GPIO_set_pulls(mask, sum(pull << (2 * pin) for pin in pins))
+            for pin, width in zip(pins, widths):
+                sequence.tx_servo(pin, int(width), self.frequency)
+            sequence.run()
+
+            self.active = ~off
+            self.position = np.where(off, self.position, widths)
+            self._sent()
+
+    def set_pulses(self, pulses, ack=False):
+        """Set several joints' pulse widths ({joint: µs}) in a single message"""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        values = self.position.copy()
+        for joint, width in pulses.items():
+            i = self._index[joint]
+            mask[i] = True
+            values[i] = width
+        return self.set_pulse_array(values, mask=mask, ack=ack)
+
+    def set_pulse(self, joint, width, ack=False):
+        return self.set_pulses({joint: width}, ack=ack)
+
+    def center_all(self):
+        return self.set_pulse_array(self.center)
+
+    def off(self):
+        return self.set_pulse_array(np.zeros(len(self.ids), dtype=np.int64))
+
+    def emergency_stop(self):
+        """Switch every servo output off at once, ahead of any other traffic
+
+        The outputs go off in one high priority message whatever the arm
+        thinks is active, and only then is background motion cancelled;
+        setpoints queued before the stop are dropped by the writer.  If
+        the control loop got a tick in before it stopped, the outputs are
+        stopped again.  Returns the seconds until the Pico acknowledged
+        the first stop.
+        """
+        pins = [int(pin) for pin in self.pins]
+        _, _, acked = self.pico.stop_all_outputs(pins)
+        with self.lock:
+            self.active[:] = False
+            self._sent()
+
+        self.stop_motion()
+        with self.lock:
+            if self.active.any():
+                self.pico.stop_all_outputs(pins)
+                self.active[:] = False
+                self._sent()
+        return acked
+
+    def move_to(self, pose, duration=None, preempt=False):
+        """Queue a smooth move to `pose` ({joint: µs}) and return its handle
+
+        Moves run in the background on the motion queue's control loop,
+        which is started on first use.
+        """
+        if self.motion is None:
+            self.motion = MotionQueue(self)
+            self.motion.start()
+        return self.motion.move_to(pose, duration=duration, preempt=preempt)
+
+    def stop_motion(self):
+        if self.motion:
+            self.motion.cancel_all()
+            self.motion.stop()
+            self.motion = None
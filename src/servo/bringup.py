@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import numpy as np
+import picod
+from arm import load_config
+from trajectory import plan_move, play
+
+# Where the last park left the joints, so the next start-up can resume there
+PARK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parked.json")
+
+PULLS = {"none": picod.PULL_NONE, "down": picod.PULL_DOWN, "up": picod.PULL_UP}
+
+# Used for whatever the config's "startup" and "park" entries leave out
+DEFAULT_STARTUP = {"pull": "down", "pose": "home", "profile": "min_jerk", "cold_speed": 0.25}
+DEFAULT_PARK = {"pose": "center", "profile": "min_jerk", "settle": 0.5}
+
+def load_plans(config=None):
+    """The start-up and park plans of the arm config, with defaults filled in
+
+    A plan's "pose" names a per-joint config column ("home", "center")
+    or gives one width per joint.  The start-up plan's "cold_speed" is
+    the fraction of full speed used when the servos' positions are
+    unknown.
+    """
+    if config is None:
+        config = load_config()
+    return (dict(DEFAULT_STARTUP, **config.get("startup", {})),
+            dict(DEFAULT_PARK, **config.get("park", {})))
+
+def _pose(arm, pose):
+    if isinstance(pose, str):
+        return getattr(arm, pose).copy()
+    return arm.clamp(np.asarray(pose))
+
+def load_parked(arm, path=PARK_FILE):
+    """Widths the joints were parked at, or None if unknown"""
+    try:
+        with open(path) as f:
+            parked = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if parked.get("joints") != arm.ids:
+        return None
+    return np.array(parked["widths"], dtype=np.int64)
+
+def bring_up(arm, plan=None, path=PARK_FILE):
+    """Configure every servo pin and bring all joints to the start-up pose together
+
+    If the last park was recorded the servos are still where it left
+    them, so one message sets up all the pins with their outputs already
+    at those widths (nothing jumps) and all joints then ramp to the pose
+    along one smooth profile.  Otherwise the outputs start at the joints'
+    centres, where the servos most likely rest (staggered by the power
+    scheduler when the arm has one), and the ramp to the pose is slowed
+    to the plan's "cold_speed", so only the unavoidable first move is
+    made at full speed.  Returns the seconds it took.
+    """
+    if plan is None:
+        plan = load_plans()[0]
+    start = time.perf_counter()
+    target = _pose(arm, plan["pose"])
+    pull = PULLS[plan["pull"]]
+    parked = load_parked(arm, path)
+
+    if parked is not None:
+        arm.configure(pull, widths=parked)
+        if arm.estimator:
+            arm.estimator.reset(arm.position)
+        play(arm, plan_move(arm, target, profile=plan["profile"]))
+    else:
+        if arm.power:
+            arm.configure(pull)
+            arm.power.enable(arm.center)
+        else:
+            arm.configure(pull, widths=arm.center)
+        if arm.estimator:
+            arm.estimator.reset(arm.position, uncertainty=(arm.max - arm.min) / 2)
+        duration = plan_move(arm, target, profile=plan["profile"]).duration / plan["cold_speed"]
+        play(arm, plan_move(arm, target, profile=plan["profile"], duration=duration))
+
+    # The joints are live now; a crash must not leave a stale park behind
+    if os.path.exists(path):
+        os.remove(path)
+    return time.perf_counter() - start
+
+def park(arm, plan=None, path=PARK_FILE):
+    """Move all joints to the park pose together, then switch every output off at once
+
+    The move is one smooth profile; the outputs go off as soon as the
+    position estimate (or, without an estimator, the `settle` time)
+    says the joints have arrived, in a single message.  The widths are
+    recorded for the next bring_up when every joint was driven there.
+    Returns the seconds it took.
+    """
+    if plan is None:
+        plan = load_plans()[1]
+    start = time.perf_counter()
+    if arm.active.any():
+        play(arm, plan_move(arm, _pose(arm, plan["pose"]), profile=plan["profile"]))
+        if arm.estimator:
+            deadline = time.perf_counter() + plan["settle"]
+            while not arm.estimator.settled()[arm.active].all() and time.perf_counter() < deadline:
+                time.sleep(0.005)
+        else:
+            time.sleep(plan["settle"])
+
+    if arm.active.all():
+        with open(path, "w") as f:
+            json.dump({"joints": arm.ids, "widths": arm.position.tolist(),
+                       "parked": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    arm.off()
+    return time.perf_counter() - start
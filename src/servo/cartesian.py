@@ -0,0 +1,106 @@
+import numpy as np
+from scheduler import SERVO_RATE
+from trajectory import Trajectory, MIN_JERK_PEAK_VELOCITY, time_optimal
+
+# Largest joint change between two waypoints before the path counts as a
+# jump to another IK branch rather than motion, radians
+MAX_JOINT_JUMP = 0.35
+
+def _timing(length, speed, rate, smooth):
+    """Path fraction at each control tick for a path of `length` metres
+
+    Smooth paths follow the minimum-jerk profile, so they start and stop
+    at rest and peak at `speed`; otherwise the speed is constant.
+    """
+    duration = length / speed * (MIN_JERK_PEAK_VELOCITY if smooth else 1.0)
+    n = max(1, int(np.ceil(duration * rate)))
+    tau = np.arange(1, n + 1) / n
+    if smooth:
+        return tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    return tau
+
+def line(start, end, speed=0.05, rate=SERVO_RATE, smooth=True):
+    """Waypoints (N, 3) along a straight line, one per control tick"""
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    s = _timing(np.linalg.norm(end - start), speed, rate, smooth)
+    return start + np.outer(s, end - start)
+
+def arc(center, start, angle, normal=(0, 0, 1), speed=0.05, rate=SERVO_RATE, smooth=True):
+    """Waypoints (N, 3) turning `start` about `center` by `angle` radians
+
+    The rotation is right-handed about `normal`; `start` is projected
+    onto the plane through `center` normal to it.
+    """
+    center = np.asarray(center, dtype=float)
+    normal = np.asarray(normal, dtype=float)
+    normal = normal / np.linalg.norm(normal)
+    radial = np.asarray(start, dtype=float) - center
+    radial -= normal * (radial @ normal)
+    radius = np.linalg.norm(radial)
+    u = radial / radius
+    v = np.cross(normal, u)
+
+    s = _timing(abs(angle) * radius, speed, rate, smooth)
+    theta = s * angle
+    return center + radius * (np.outer(np.cos(theta), u) + np.outer(np.sin(theta), v))
+
+def circle(center, radius, normal=(0, 0, 1), speed=0.05, rate=SERVO_RATE, start_angle=0.0):
+    """Waypoints (N, 3) once round a circle at constant speed, ending where it starts
+
+    The start point is at `start_angle` from the direction in the circle's
+    plane closest to +X (or +Y when the normal is along X).
+    """
+    center = np.asarray(center, dtype=float)
+    normal = np.asarray(normal, dtype=float)
+    normal = normal / np.linalg.norm(normal)
+    ref = np.array([1.0, 0, 0]) if abs(normal[0]) < 0.9 else np.array([0, 1.0, 0])
+    u = ref - normal * (ref @ normal)
+    u /= np.linalg.norm(u)
+    v = np.cross(normal, u)
+    start = center + radius * (np.cos(start_angle) * u + np.sin(start_angle) * v)
+    return arc(center, start, 2 * np.pi, normal, speed, rate, smooth=False)
+
+def solve_path(arm, solver, waypoints, pitch=None, rate=SERVO_RATE, check_speed=True, retime=False):
+    """Joint trajectory through Cartesian waypoints sampled at `rate`
+
+    Every waypoint is solved in one batched IK call, warm-started from
+    the arm's estimated pose.  Without a `pitch` the approach pitch varies
+    smoothly along the path as the joint limits require.  Raises
+    ValueError if a waypoint cannot be reached, if neighbouring
+    waypoints land on different IK branches (a joint jump), or, with
+    `check_speed`, if a joint would have to move faster than its servo.
+    The first waypoint is not checked against the current pose; move
+    there first.
+
+    With `retime` the waypoints only fix the path, not its timing: the
+    joint path is re-timed to the fastest the servos allow, starting and
+    ending at rest, and the speed check is skipped.
+    """
+    waypoints = np.atleast_2d(waypoints)
+    seed = arm.pulse_to_angle(arm.estimated_position())
+    if pitch is None:
+        pitch = solver.path_pitches(waypoints, seed)
+    q, ok, _ = solver.solve_batch(waypoints, seed, pitch=pitch)
+
+    if not ok.all():
+        first = int(np.flatnonzero(~ok)[0])
+        raise ValueError(f"Waypoint {first} at {np.round(waypoints[first], 3).tolist()} is out of reach "
+                         f"({int((~ok).sum())} of {len(ok)} waypoints)")
+
+    steps = np.abs(np.diff(q, axis=0))
+    if len(steps) and steps.max() > MAX_JOINT_JUMP:
+        tick, joint = np.unravel_index(np.argmax(steps), steps.shape)
+        raise ValueError(f"{arm.names[joint]} jumps {np.degrees(steps[tick, joint]):.0f}° "
+                         f"at waypoint {tick + 1}, the path crosses an IK branch")
+
+    pulses = np.rint(arm.clamp(arm.angle_to_pulse(q))).astype(np.int32)
+    if retime:
+        return time_optimal(pulses, arm.vmax, arm.amax, rate=rate)
+    if check_speed and len(pulses) > 1:
+        ratio = np.abs(np.diff(pulses, axis=0)) * rate / arm.vmax
+        if ratio.max() > 1:
+            tick, joint = np.unravel_index(np.argmax(ratio), ratio.shape)
+            raise ValueError(f"{arm.names[joint]} needs {ratio.max():.1f}x its rated speed "
+                             f"at waypoint {tick + 1}, slow the path down")
+    return Trajectory(pulses, rate)
@@ -0,0 +1,189 @@
+import time
+import sys
+import signal
+import threading
+import numpy as np
+import picod
+
+DHT_GOOD = 0
+DHT_BAD_DATA = 1
+DHT_BAD_CHECKSUM = 2
+DHT_TIMEOUT = 3
+
+# Rising edge to rising edge time separating a 0 bit (~76µs) from a 1 bit (~120µs)
+BIT_THRESHOLD_US = 100
+BURST_GAP_US = 200000
+MAX_EDGES = 64
+
+class GracefulExit(Exception):
+    pass
+
+def signal_handler(signum, frame):
+    raise GracefulExit()
+
+def decode_burst(ticks):
+    """Decode the rising edge ticks of one read into (status, temperature, humidity)
+
+    The last 40 edge-to-edge deltas are the data bits, most significant
+    first: RH, RH, temp, temp, checksum (DHT11 uses only the high bytes).
+    """
+    ticks = np.asarray(ticks, dtype=np.int64)
+    deltas = np.diff(ticks) % (1 << 32)  # tick wraps every ~72 minutes
+
+    # Only the edges after the last long gap belong to this read
+    gaps = np.flatnonzero(deltas > BURST_GAP_US)
+    if len(gaps):
+        deltas = deltas[gaps[-1] + 1:]
+    if len(deltas) < 40:
+        return DHT_TIMEOUT, 0, 0
+
+    data = np.packbits(deltas[-40:] > BIT_THRESHOLD_US)
+    if (int(data[:4].sum()) & 0xff) != data[4]:
+        return DHT_BAD_CHECKSUM, 0, 0
+
+    # Try DHTXX first
+    rh = ((int(data[0]) << 8) | int(data[1])) / 10.0
+    temp = (((int(data[2]) & 127) << 8) | int(data[3])) / 10.0
+    if data[2] & 128:
+        temp = -temp
+    if rh <= 110.0 and -50.0 <= temp <= 135.0:
+        return DHT_GOOD, temp, rh
+
+    # Then DHT11
+    temp = int(data[2])
+    rh = int(data[0])
+    if data[1] == 0 and data[3] == 0 and temp <= 60 and 9 <= rh <= 90:
+        return DHT_GOOD, temp, rh
+
+    return DHT_BAD_DATA, 0, 0
+
+class DHTSensor:
+    """One DHT sensor, capturing the edges of a read and decoding them as a burst"""
+
+    def __init__(self, pico, gpio, trigger_secs=0.018, func=None):
+        self.pico = pico
+        self.gpio = gpio
+        self.func = func
+        self.ticks = np.zeros(MAX_EDGES, dtype=np.int64)
+        self.edges = 0
+
+        self.status = DHT_TIMEOUT
+        self.temperature = None
+        self.humidity = None
+        self.timestamp = None
+
+        pico.gpio_open(gpio)
+        pico.gpio_set_pull(gpio, picod.PULL_UP)
+        pico.gpio_set_watchdog(gpio, 0.05)  # watchdog after all bits received
+
+        self.trigger_handle = (pico.sequence()
+                               .gpio_set_output(gpio, 0)
+                               .sleep(trigger_secs)
+                               .gpio_set_input(gpio)
+                               .compile())
+        self._cb = pico.callback(gpio, picod.EDGE_RISING, self._edge)
+
+    def _edge(self, gpio, level, tick, levels):
+        if level == picod.LEVEL_TIMEOUT:
+            self._decode()
+        elif self.edges < MAX_EDGES:
+            self.ticks[self.edges] = tick
+            self.edges += 1
+
+    def _decode(self):
+        if self.edges == 0:
+            return
+        self.status, t, h = decode_burst(self.ticks[:self.edges])
+        self.edges = 0
+        self.timestamp = time.time()
+        if self.status == DHT_GOOD:
+            self.temperature, self.humidity = t, h
+        if self.func:
+            self.func(self.gpio, self.status, t, h)
+
+    def trigger(self):
+        """Start a read, the result arrives through the edge callback"""
+        self.edges = 0
+        self.pico.sequence_run(self.trigger_handle)
+
+    def read(self):
+        """Return the last (status, temperature, humidity)"""
+        return self.status, self.temperature, self.humidity
+
+    def cancel(self):
+        self._cb.cancel()
+        self.pico.sequence_delete(self.trigger_handle)
+
+class DHTScheduler:
+    """Reads several DHT sensors every `interval` seconds
+
+    Triggers are spread evenly across the interval so each sensor's
+    2 second read cycle overlaps the others without their bursts
+    colliding.
+    """
+
+    def __init__(self, pico, gpios, interval=2.0, func=None):
+        self.sensors = [DHTSensor(pico, gpio, func=func) for gpio in gpios]
+        self.interval = interval
+        self.offsets = np.arange(len(self.sensors)) * interval / max(1, len(self.sensors))
+        self._thread = None
+        self._stop = threading.Event()
+
+    def run(self):
+        start = time.monotonic()
+        cycle = 0
+        while not self._stop.is_set():
+            for sensor, offset in zip(self.sensors, self.offsets):
+                due = start + cycle * self.interval + offset
+                if self._stop.wait(max(0.0, due - time.monotonic())):
+                    return
+                sensor.trigger()
+            cycle += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for sensor in self.sensors:
+            sensor.cancel()
+
+    def readings(self):
+        """Return {gpio: (status, temperature, humidity)} for all sensors"""
+        return {sensor.gpio: sensor.read() for sensor in self.sensors}
+
+def main():
+    gpios = [int(arg) for arg in sys.argv[1:]] or [15]
+
+    def report(gpio, status, t, h):
+        print(f"gpio={gpio} t={t} h={h} status={status}")
+
+    pico = None
+    scheduler = None
+    try:
+        signal.signal(signal.SIGINT, signal_handler)
+        pico = picod.pico()
+        if not pico.connected:
+            raise Exception("Failed to connect to Pico")
+
+        scheduler = DHTScheduler(pico, gpios, func=report)
+        scheduler.start()
+        while True:
+            time.sleep(1)
+
+    except GracefulExit:
+        print("\nReceived Ctrl+C, shutting down gracefully...")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        if scheduler:
+            scheduler.stop()
+        if pico:
+            pico.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import curses
+import selectors
+import threading
+from collections import deque
+
+# Escape sequences of the keys the controllers use
+ESCAPE_KEYS = {
+    "\x1b[A": "up",
+    "\x1b[B": "down",
+    "\x1b[C": "right",
+    "\x1b[D": "left",
+}
+
+def decode_keys(text):
+    """Split terminal input into key names (arrows by name, other keys as characters)"""
+    keys = []
+    i = 0
+    while i < len(text):
+        sequence = text[i:i + 3]
+        if sequence in ESCAPE_KEYS:
+            keys.append(ESCAPE_KEYS[sequence])
+            i += 3
+        else:
+            keys.append(text[i])
+            i += 1
+    return keys
+
+class Display:
+    """Curses terminal display and keyboard, each on its own thread
+
+    The control loop never touches the terminal.  It either hands over
+    lines with `show` / `set_line`, which only store them, or passes a
+    `source` callable that the render thread calls for the lines each
+    frame.  The render thread redraws at most `fps` times a second and
+    only the lines that changed; curses then sends just the changed
+    cells.
+
+    Key input is event driven: the input thread sleeps in a selector on
+    stdin and queues decoded keys as they arrive, and `keys()` drains
+    the queue without blocking.
+    """
+
+    def __init__(self, fps=10, source=None):
+        self.interval = 1.0 / fps
+        self.source = source
+        self.lines = []
+        self._drawn = []
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._keys = deque()
+        self._running = False
+        self._threads = []
+        self.screen = None
+        self.fd = sys.stdin.fileno()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def start(self):
+        self.screen = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+        self._running = True
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.fd, selectors.EVENT_READ)
+        self._threads = [threading.Thread(target=self._render_loop, daemon=True),
+                         threading.Thread(target=self._input_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._changed.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._selector.close()
+        curses.nocbreak()
+        curses.echo()
+        curses.endwin()
+
+    def show(self, lines):
+        """Replace the whole display"""
+        with self._lock:
+            self.lines = list(lines)
+        self._changed.set()
+
+    def set_line(self, row, text):
+        """Replace one line, leaving the rest"""
+        with self._lock:
+            if row >= len(self.lines):
+                self.lines.extend([""] * (row + 1 - len(self.lines)))
+            self.lines[row] = text
+        self._changed.set()
+
+    def keys(self):
+        """Keys pressed since the last call, oldest first"""
+        keys = []
+        while self._keys:
+            keys.append(self._keys.popleft())
+        return keys
+
+    def _render_loop(self):
+        next_frame = time.monotonic()
+        while self._running:
+            if self.source is None:
+                self._changed.wait()
+                if not self._running:
+                    break
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_frame = time.monotonic() + self.interval
+            self._changed.clear()
+            if self.source is not None:
+                self.show(self.source())
+            with self._lock:
+                lines = list(self.lines)
+            self._draw(lines)
+
+    def _draw(self, lines):
+        height, width = self.screen.getmaxyx()
+        for row in range(min(max(len(lines), len(self._drawn)), height)):
+            text = lines[row] if row < len(lines) else ""
+            if row < len(self._drawn) and self._drawn[row] == text:
+                continue
+            try:
+                self.screen.move(row, 0)
+                self.screen.clrtoeol()
+                self.screen.addnstr(row, 0, text, width - 1)
+            except curses.error:
+                pass
+        self._drawn = lines
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def _input_loop(self):
+        while self._running:
+            # Wake at least every interval to notice stop()
+            for _ in self._selector.select(timeout=self.interval):
+                data = os.read(self.fd, 64)
+                self._keys.extend(decode_keys(data.decode(errors="ignore")))
@@ -0,0 +1,141 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+import picod
+from arm import load_config
+
+# Prediction error as a fraction of the distance a joint was predicted to move
+MODEL_ERROR = 0.1
+
+def servo_response(position, target, dt, lag, vmax, deadband):
+    """Where servos at `position` (µs) are `dt` seconds later, driving to `target`
+
+    A servo closes its error at error / lag but no faster than vmax, so
+    it slews at vmax until the error is down to vmax * lag and then
+    decays exponentially.  It stops once the error is within its
+    deadband, and does not start while it is.
+    """
+    error = np.asarray(target, dtype=float) - position
+    distance = np.abs(error)
+    knee = vmax * lag
+    slewing = np.maximum(distance - knee, 0.0) / vmax  # time spent at full speed
+    remaining = np.where(dt <= slewing, distance - vmax * dt,
+                         np.minimum(distance, knee) * np.exp(-np.maximum(dt - slewing, 0.0) / lag))
+    remaining = np.where(distance > deadband, np.maximum(remaining, deadband), distance)
+    return target - np.sign(error) * remaining
+
+class PositionEstimator:
+    """Predicts where the open-loop servos really are from what they were sent
+
+    Attach it as `arm.estimator` and the arm passes it every command.  A
+    command takes effect `latency` seconds after it is sent (by default
+    the transport plus half a PWM frame, the average wait for the next
+    frame), and between commands each joint follows servo_response.
+    Nothing runs per command: an estimate replays the commands since the
+    last one, a vectorized step each.
+
+    Joints whose config entry has an "adc" potentiometer ({"channel",
+    "at_min", "at_max": the raw readings at the joint's min and max
+    widths, optional "noise" in µs}) can be corrected from readings with
+    `read_feedback`.  Each joint keeps a variance that grows with the
+    distance it is predicted to move, and a reading is blended in by
+    the usual Kalman gain.
+    """
+
+    def __init__(self, arm, latency=None, clock=time.perf_counter, config=None, uncertainty=50.0):
+        if config is None:
+            config = load_config()
+        self.arm = arm
+        self.clock = clock
+        self.latency = 0.0015 + 0.5 / arm.frequency if latency is None else latency
+        self.time = clock()
+        self.position = arm.position.astype(float)
+        self.target = self.position.copy()
+        self.powered = arm.active.copy()
+        self.variance = np.full(len(arm), uncertainty ** 2)
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+        adc = [j.get("adc", {}) for j in config["joints"]]
+        self.channels = np.array([a.get("channel", -1) for a in adc])
+        self.at_min = np.array([a.get("at_min", 0) for a in adc], dtype=float)
+        self.at_max = np.array([a.get("at_max", 4095) for a in adc], dtype=float)
+        self.noise = np.array([a.get("noise", 15.0) for a in adc], dtype=float)
+
+    def reset(self, position, uncertainty=10.0):
+        """Take the joints to be at rest at `position` (µs) now, e.g. where they were parked"""
+        with self._lock:
+            self._pending.clear()
+            self.time = self.clock()
+            self.position = np.array(position, dtype=float)
+            self.target = self.position.copy()
+            self.variance[:] = uncertainty ** 2
+
+    def command(self, widths, active):
+        """Note a command sent now: `widths` for the `active` joints (called by Arm)"""
+        with self._lock:
+            self._pending.append((self.clock() + self.latency, np.array(widths, dtype=float),
+                                  np.array(active)))
+
+    def _advance(self, t):
+        dt = t - self.time
+        if dt <= 0:
+            return
+        moved = servo_response(self.position, self.target, dt,
+                               self.arm.lag, self.arm.vmax, self.arm.deadband)
+        moved = np.where(self.powered, moved, self.position)
+        self.variance += (MODEL_ERROR * (moved - self.position)) ** 2
+        self.position = moved
+        self.time = t
+
+    def _update(self, now):
+        while self._pending and self._pending[0][0] <= now:
+            due, widths, active = self._pending.popleft()
+            self._advance(due)
+            self.target = np.where(active, widths, self.target)
+            self.powered = active
+        self._advance(now)
+
+    def estimate(self, now=None):
+        """Estimated pulse widths of all joints, µs"""
+        with self._lock:
+            self._update(self.clock() if now is None else now)
+            return self.position.copy()
+
+    def angles(self, now=None):
+        """Estimated joint angles in radians"""
+        return self.arm.pulse_to_angle(self.estimate(now))
+
+    def settled(self, tolerance=None):
+        """Which joints have stopped moving: within their deadband (or `tolerance` µs) of the target"""
+        position = self.estimate()
+        with self._lock:
+            waiting = np.zeros(len(position), dtype=bool)
+            for _, _, active in self._pending:
+                waiting |= active
+            limit = self.arm.deadband if tolerance is None else tolerance
+            return ~waiting & (np.abs(self.target - position) <= limit + 1e-6)
+
+    def correct(self, measured, now=None):
+        """Blend measured widths (µs, NaN where there is no reading) into the estimate"""
+        measured = np.asarray(measured, dtype=float)
+        with self._lock:
+            self._update(self.clock() if now is None else now)
+            seen = np.isfinite(measured)
+            gain = np.where(seen, self.variance / (self.variance + self.noise ** 2), 0.0)
+            self.position += gain * np.where(seen, measured - self.position, 0.0)
+            self.variance *= 1 - gain
+            return self.position.copy()
+
+    def read_feedback(self):
+        """Read the potentiometers of the joints that have one and correct the estimate"""
+        raw = np.full(len(self.channels), np.nan)
+        for i in np.flatnonzero(self.channels >= 0):
+            status, _, value = self.arm.pico.adc_read(int(self.channels[i]))
+            if status == picod.STATUS_OKAY:
+                raw[i] = value
+        if np.isnan(raw).all():
+            return self.estimate()
+        fraction = (raw - self.at_min) / (self.at_max - self.at_min)
+        return self.correct(self.arm.min + fraction * (self.arm.max - self.arm.min))
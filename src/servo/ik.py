@@ -0,0 +1,273 @@
+import numpy as np
+from kinematics import Kinematics
+from workspace import joint_limits, WorkspaceTable
+
+HALF_PI = np.pi / 2
+
+def _wrap(angles):
+    return (angles + np.pi) % (2 * np.pi) - np.pi
+
+class IKSolver:
+    """Inverse kinematics for the 5-DOF arm, batched over N targets
+
+    Targets are end-effector positions with an optional approach pitch
+    (angle of the tool axis above the horizontal, pointing away from the
+    base, radians) and wrist roll.
+    When the DH parameters have the base-yaw / three-pitch / wrist-roll
+    layout the solution is analytic: base yaw from the target bearing,
+    a planar two-link solve for the wrist center, then wrist pitch and
+    roll.  Of the facing/reaching-back and elbow up/down solutions the one inside the joint limits
+    and closest to the seed wins.  Targets the analytic step cannot
+    reach inside the limits (or every target, for other layouts) fall
+    back to damped least squares on position, started from the seed.
+
+    Seeds are the current joint angles, so without a given pitch the
+    arm keeps the approach pitch it already has, or the nearest pitch
+    that reaches the target.  Targets further or nearer than the links
+    can reach fail at once.  With a WorkspaceTable, so do targets far
+    from every sampled position, and targets the warm start cannot
+    reach are retried from the nearest sample.
+    """
+
+    def __init__(self, kinematics, lower, upper, damping=0.02, tolerance=1e-3, iterations=60,
+                 pitches=36, table=None):
+        self.kin = kinematics
+        self.table = table
+        self.lower = np.minimum(lower, upper)
+        self.upper = np.maximum(lower, upper)
+        self.damping = damping
+        self.tolerance = tolerance
+        self.iterations = iterations
+        self.pitches = np.linspace(-np.pi, np.pi, pitches, endpoint=False)
+        self.analytic = self._has_analytic_layout()
+        self.envelope = self._envelope()
+
+    @classmethod
+    def from_arm(cls, arm, kinematics=None, table=True, **kwargs):
+        """Solver using the arm's joint limits (converted to radians)
+
+        The kinematics default to the DH parameters of the config the arm
+        was built from.  With `table` left True the workspace table for
+        them is loaded, and built first if it is missing or stale; pass a
+        table to use that one, or None to solve without one.
+        """
+        if kinematics is None:
+            kinematics = Kinematics.from_config(arm.config)
+        if table is True:
+            table = WorkspaceTable.ensure(arm, kinematics=kinematics)
+        return cls(kinematics, *joint_limits(arm), table=table, **kwargs)
+
+    def _has_analytic_layout(self):
+        k = self.kin
+        if k.joints != 5 or not np.allclose(k.base, np.eye(4)) or not np.allclose(k.tool, np.eye(4)):
+            return False
+        return (np.allclose([k.a[0], k.a[3], k.a[4], k.d[1], k.d[2], k.d[3]], 0)
+                and np.allclose(k.alpha, [HALF_PI, 0, 0, HALF_PI, 0], atol=1e-4))
+
+    def _envelope(self):
+        """Centre and nearest and furthest reach of the end effector, from the link lengths
+
+        For the analytic layout the distance is measured from the
+        shoulder: the wrist centre lies as far from it as the elbow's
+        limits allow, and the tool tip within d5 of the wrist centre.
+        Otherwise it is the distance from the base, up to `kin.reach`.
+        """
+        k = self.kin
+        if not self.analytic:
+            return k.base[:3, 3], 0.0, k.reach
+        a2, a3 = abs(k.a[1]), abs(k.a[2])
+        elbow = np.array([self.lower[2], self.upper[2]]) + k.offset[2]
+        cos3 = np.cos(elbow)
+        if elbow[0] <= 0 <= elbow[1]:
+            cos3 = np.append(cos3, 1.0)
+        if elbow[0] <= np.pi <= elbow[1] or elbow[0] <= -np.pi <= elbow[1]:
+            cos3 = np.append(cos3, -1.0)
+        wrist = np.sqrt(np.maximum(a2 ** 2 + a3 ** 2 + 2 * a2 * a3 * cos3, 0.0))
+        tool = abs(k.d[4])
+        return np.array([0.0, 0.0, k.d[0]]), max(wrist.min() - tool, 0.0), wrist.max() + tool
+
+    def in_envelope(self, positions):
+        """Which targets lie within the arm's reach at all, (N,)
+
+        A cheap necessary check: targets outside it fail without trying
+        to solve them.
+        """
+        centre, near, far = self.envelope
+        distance = np.linalg.norm(np.atleast_2d(positions) - centre, axis=1)
+        return (distance >= near - self.tolerance) & (distance <= far + self.tolerance)
+
+    def pitch_roll(self, q):
+        """Approach pitch and wrist roll of joint configurations, each (N,)"""
+        q = np.atleast_2d(q)
+        pose = self.kin.forward(q)
+        approach = pose[:, :3, 2]
+        bearing = np.arctan2(pose[:, 1, 3], pose[:, 0, 3])
+        radial = approach[:, 0] * np.cos(bearing) + approach[:, 1] * np.sin(bearing)
+        return np.arctan2(approach[:, 2], radial), q[:, 4] + self.kin.offset[4]
+
+    def _analytic(self, positions, pitch, roll, seeds):
+        k = self.kin
+        x, y, z = positions.T
+        r = np.hypot(x, y)
+        h = z - k.d[0]
+        a2, a3 = k.a[1], k.a[2]
+
+        candidates = []
+        reachable = []
+        # Facing the target, or facing away and reaching back over the base
+        for flip in (False, True):
+            theta1 = np.arctan2(y, x) + (np.pi if flip else 0.0)
+            rr = -r if flip else r
+            pp = np.pi - pitch if flip else pitch
+
+            # Wrist center, back along the approach direction
+            wr = rr - k.d[4] * np.cos(pp)
+            wz = h - k.d[4] * np.sin(pp)
+            cos3 = (wr ** 2 + wz ** 2 - a2 ** 2 - a3 ** 2) / (2 * a2 * a3)
+            reachable += [np.abs(cos3) <= 1.0] * 2
+            cos3 = np.clip(cos3, -1.0, 1.0)
+
+            for elbow in (1.0, -1.0):
+                theta3 = elbow * np.arccos(cos3)
+                theta2 = np.arctan2(wz, wr) - np.arctan2(a3 * np.sin(theta3), a2 + a3 * np.cos(theta3))
+                theta4 = pp - theta2 - theta3 + HALF_PI
+                theta = np.stack([theta1, theta2, theta3, theta4, roll], axis=1)
+                candidates.append(_wrap(theta - k.offset))
+        candidates = np.stack(candidates, axis=1)  # (N, 4, joints)
+        reachable = np.stack(reachable, axis=1)
+
+        inside = np.all((candidates >= self.lower) & (candidates <= self.upper), axis=2)
+        valid = inside & reachable
+        cost = np.sum((candidates - seeds[:, None, :]) ** 2, axis=2)
+        cost = np.where(valid, cost, np.inf)
+        best = np.argmin(cost, axis=1)
+        q = candidates[np.arange(len(positions)), best]
+        return q, np.isfinite(cost[np.arange(len(positions)), best])
+
+    def _search_pitch(self, positions, roll, seeds, seed_pitch, q, ok, retry):
+        """Retry targets over a grid of pitches, keeping the one nearest the seed's"""
+        fail = np.flatnonzero(retry)
+        m, k = len(fail), len(self.pitches)
+        pitch = np.tile(self.pitches, m)
+        tq, tok = self._analytic(np.repeat(positions[fail], k, axis=0), pitch,
+                                 np.repeat(roll[fail], k), np.repeat(seeds[fail], k, axis=0))
+        cost = np.abs(_wrap(pitch - np.repeat(seed_pitch[fail], k))).reshape(m, k)
+        cost = np.where(tok.reshape(m, k), cost, np.inf)
+        best = np.argmin(cost, axis=1)
+        found = np.isfinite(cost[np.arange(m), best])
+        rows = np.arange(m) * k + best
+        q[fail[found]] = tq[rows[found]]
+        ok[fail[found]] = True
+
+    def path_pitches(self, positions, seed, roll=None, steps=144, smooth=25):
+        """Approach pitch for each waypoint of a path, changing as little as possible
+
+        Of a grid of `steps` pitches, the sequence that keeps every
+        waypoint inside the joint limits with the least total pitch
+        change is found by dynamic programming, starting as close to the
+        seed's pitch as possible.  The steps between grid values are then
+        spread over a moving average of `smooth` waypoints wherever that
+        stays inside the limits.  Waypoints no pitch reaches get NaN.
+        """
+        positions = np.atleast_2d(positions)
+        n = len(positions)
+        grid = np.linspace(-np.pi, np.pi, steps, endpoint=False)
+        seed = np.asarray(seed, dtype=float)
+        seed_pitch, seed_roll = self.pitch_roll(seed)
+        roll = np.full(n * steps, seed_roll[0] if roll is None else roll)
+        _, valid = self._analytic(np.repeat(positions, steps, axis=0), np.tile(grid, n), roll,
+                                  np.broadcast_to(seed, (n * steps, self.kin.joints)))
+        valid = valid.reshape(n, steps)
+        reachable = valid.any(axis=1)
+        penalty = np.where(valid | ~reachable[:, None], 0.0, np.inf)
+
+        change = np.abs(_wrap(grid[:, None] - grid[None, :]))
+        cost = np.abs(_wrap(grid - seed_pitch[0])) + penalty[0]
+        back = np.empty((n, steps), dtype=np.int64)
+        for i in range(1, n):
+            total = cost[:, None] + change
+            back[i] = np.argmin(total, axis=0)
+            cost = total[back[i], np.arange(steps)] + penalty[i]
+
+        best = np.empty(n, dtype=np.int64)
+        best[-1] = np.argmin(cost)
+        for i in range(n - 1, 0, -1):
+            best[i - 1] = back[i, best[i]]
+        pitch = np.unwrap(grid[best])
+
+        if smooth > 1 and n > 1:
+            padded = np.pad(pitch, (smooth // 2, smooth - 1 - smooth // 2), mode="edge")
+            averaged = np.convolve(padded, np.ones(smooth) / smooth, mode="valid")
+            _, ok = self._analytic(positions, averaged, roll[::steps], np.broadcast_to(seed, (n, self.kin.joints)))
+            pitch = np.where(ok, averaged, pitch)
+        return np.where(reachable, _wrap(pitch), np.nan)
+
+    def _dls(self, positions, q):
+        q = np.clip(q, self.lower, self.upper)
+        eye = np.eye(3) * self.damping ** 2
+        active = np.ones(len(q), dtype=bool)
+        for _ in range(self.iterations):
+            error = positions[active] - self.kin.positions(q[active])
+            done = np.linalg.norm(error, axis=1) < self.tolerance
+            idx = np.flatnonzero(active)
+            active[idx[done]] = False
+            if not active.any():
+                break
+            error = error[~done]
+            J = self.kin.jacobian(q[active])[:, :3]
+            JT = J.transpose(0, 2, 1)
+            step = JT @ np.linalg.solve(J @ JT + eye, error[:, :, None])
+            q[active] = np.clip(q[active] + step[:, :, 0], self.lower, self.upper)
+        return q
+
+    def solve_batch(self, positions, seeds, pitch=None, roll=None):
+        """Solve N targets at once
+
+        positions (N, 3) in metres, seeds (N, joints) or (joints,) in
+        radians.  Returns joint angles (N, joints), a success mask (N,)
+        and the position error (N,) in metres.
+        """
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))
+        n = len(positions)
+        seeds = np.broadcast_to(np.asarray(seeds, dtype=float), (n, self.kin.joints)).copy()
+        seed_pitch, seed_roll = self.pitch_roll(seeds)
+        free_pitch = pitch is None
+        pitch = seed_pitch if pitch is None else np.broadcast_to(pitch, (n,))
+        roll = seed_roll if roll is None else np.broadcast_to(roll, (n,))
+
+        reach = self.in_envelope(positions)
+        fallback = seeds
+        if self.table is not None and reach.any():
+            fallback, table_pitch, in_table = self.table.seeds(positions)
+            reach &= in_table
+
+        if self.analytic:
+            q, ok = self._analytic(positions, pitch, roll, seeds)
+            retry = ~ok & reach
+            if free_pitch and self.table is not None and retry.any():
+                q[retry], ok[retry] = self._analytic(positions[retry], table_pitch[retry],
+                                                     roll[retry], seeds[retry])
+                retry = ~ok & reach
+            if free_pitch and retry.any():
+                self._search_pitch(positions, roll, seeds, seed_pitch, q, ok, retry)
+        else:
+            q, ok = seeds.copy(), np.zeros(n, dtype=bool)
+
+        retry = ~ok & reach
+        if retry.any():
+            q[retry] = self._dls(positions[retry], fallback[retry])
+        q[~reach] = np.clip(seeds[~reach], self.lower, self.upper)
+
+        error = np.linalg.norm(self.kin.positions(q) - positions, axis=1)
+        return q, error < self.tolerance, error
+
+    def solve(self, position, seed, pitch=None, roll=None):
+        """Solve a single target, returning (joint angles, success)"""
+        q, ok, _ = self.solve_batch(np.asarray(position)[None], seed, pitch, roll)
+        return q[0], bool(ok[0])
+
+    def solve_pulses(self, arm, positions, pitch=None, roll=None):
+        """Solve targets warm-started from the arm's current pose, returning pulse widths"""
+        seed = arm.pulse_to_angle(arm.position)
+        q, ok, error = self.solve_batch(positions, seed, pitch, roll)
+        return np.rint(arm.clamp(arm.angle_to_pulse(q))).astype(np.int64), ok, error
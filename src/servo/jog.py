@@ -0,0 +1,104 @@
+import numpy as np
+from kinematics import Kinematics
+from scheduler import SERVO_RATE
+from workspace import joint_limits
+
+class CartesianJog:
+    """Resolved-rate control: moves the end effector at a Cartesian velocity
+
+    Each tick the velocity (m/s) is mapped to joint rates through the
+    damped pseudo-inverse of the Jacobian, together with a zero rate for
+    the tool's pitch so the approach angle holds while the arm travels.
+    The Jacobian is cached and only recomputed once the joints have
+    moved more than `refresh` radians since it was last evaluated.
+
+    Near a singularity (small singular value) the damping grows, trading
+    path accuracy for bounded joint rates.  Joints are limited to their
+    servo speed, and a joint that would cross a limit is frozen and the
+    remaining joints re-solved without it.
+    """
+
+    def __init__(self, arm, kinematics=None, rate=SERVO_RATE, speed=0.05,
+                 damping=0.02, singular=0.005, refresh=0.02):
+        self.arm = arm
+        self.kin = Kinematics.from_config(arm.config) if kinematics is None else kinematics
+        self.rate = rate
+        self.speed = speed
+        self.damping = damping
+        self.singular_value = singular
+        self.refresh = refresh
+        self.lower, self.upper = joint_limits(arm)
+        self.max_step = np.radians(arm.vmax / np.abs(arm.us_per_degree)) / rate
+        self.q = None
+        self.commanded = None
+        self._J = None
+        self._J_at = None
+        self.limited = np.zeros(len(arm), dtype=bool)
+        self.singular = False
+
+    def sync(self):
+        """Take the joint angles from the arm if something else has moved it"""
+        if self.commanded is None or not np.array_equal(self.commanded, self.arm.position):
+            self.q = self.arm.pulse_to_angle(self.arm.position)
+            self.commanded = self.arm.position.copy()
+
+    def position(self):
+        """End-effector position in metres"""
+        self.sync()
+        return self.kin.positions(self.q)[0]
+
+    def jacobian(self):
+        """Task Jacobian (4, joints): linear velocity and tool pitch rate"""
+        if self._J is None or np.max(np.abs(self.q - self._J_at)) > self.refresh:
+            J = self.kin.jacobian(self.q)[0]
+            end = self.kin.positions(self.q)[0]
+            bearing = np.arctan2(end[1], end[0])
+            # Pitch turns about the horizontal axis across the arm's plane
+            across = np.array([-np.sin(bearing), np.cos(bearing), 0.0])
+            self._J = np.vstack([J[:3], across @ J[3:]])
+            self._J_at = self.q.copy()
+        return self._J
+
+    def _solve(self, J, task):
+        JJ = J @ J.T
+        smallest = np.linalg.svd(J, compute_uv=False)[-1]
+        self.singular = smallest < self.singular_value
+        damping = self.damping * (1 - (smallest / self.singular_value) ** 2) if self.singular else 0.0
+        return J.T @ np.linalg.solve(JJ + damping ** 2 * np.eye(len(JJ)), task)
+
+    def step(self, direction):
+        """Advance one tick along `direction` (x, y, z) scaled to `speed`
+
+        Returns the pulse widths sent, or None if nothing moved.
+        """
+        direction = np.asarray(direction, dtype=float)
+        if not np.any(direction):
+            return None
+        self.sync()
+        task = np.append(direction * self.speed / self.rate, 0.0)
+
+        J = self.jacobian().copy()
+        free = np.ones(len(self.q), dtype=bool)
+        for _ in range(len(self.q)):
+            dq = self._solve(J, task)
+            scale = np.max(np.abs(dq) / self.max_step)
+            if scale > 1:
+                dq /= scale
+            target = self.q + dq
+            crossing = free & ((target < self.lower) | (target > self.upper))
+            if not crossing.any():
+                break
+            free &= ~crossing
+            J[:, ~free] = 0.0
+        self.limited = ~free
+
+        q = np.clip(self.q + dq, self.lower, self.upper)
+        pulses = np.rint(self.arm.angle_to_pulse(q)).astype(np.int64)
+        if np.array_equal(pulses, self.arm.position):
+            # Below one µs per tick: keep accumulating in joint space
+            self.q = q
+            return None
+        self.arm.set_pulse_array(pulses)
+        self.q = q
+        self.commanded = self.arm.position.copy()
+        return pulses
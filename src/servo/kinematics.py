@@ -0,0 +1,102 @@
+import numpy as np
+from arm import load_config
+
+def _fixed_transform(a, alpha, d):
+    """Tz(d) Tx(a) Rx(alpha), the joint-independent part of a DH link"""
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    return np.array([
+        [1.0, 0.0, 0.0, a],
+        [0.0, ca, -sa, 0.0],
+        [0.0, sa, ca, d],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+
+class Kinematics:
+    """Forward kinematics of a serial arm from standard DH parameters
+
+    Link i's transform is Rz(q_i + offset_i) Tz(d_i) Tx(a_i) Rx(alpha_i).
+    The Tz Tx Rx part is constant and computed once, so each evaluation
+    only applies the joint rotations.  All methods take joint angles in
+    radians shaped (N, joints) (or (joints,) for a single configuration)
+    and evaluate every configuration at once.
+    """
+
+    def __init__(self, dh, base=None, tool=None):
+        dh = np.asarray(dh, dtype=float)
+        self.a, self.alpha, self.d, self.offset = dh.T
+        self.fixed = np.stack([_fixed_transform(a, alpha, d)
+                               for a, alpha, d in zip(self.a, self.alpha, self.d)])
+        self.base = np.eye(4) if base is None else np.asarray(base, dtype=float)
+        self.tool = np.eye(4) if tool is None else np.asarray(tool, dtype=float)
+
+    @classmethod
+    def from_config(cls, config=None):
+        """Build from the "dh" entries of the arm config joints"""
+        if config is None:
+            config = load_config()
+        dh = [[j["dh"]["a"], j["dh"]["alpha"], j["dh"]["d"], j["dh"].get("offset", 0.0)]
+              for j in config["joints"]]
+        return cls(dh)
+
+    @property
+    def joints(self):
+        return len(self.a)
+
+    @property
+    def reach(self):
+        """Upper bound on the distance from the base to the end effector"""
+        return float(np.sum(np.abs(self.a)) + np.sum(np.abs(self.d)))
+
+    def link_transforms(self, q):
+        """Each link's transform relative to the previous one, (N, joints, 4, 4)"""
+        q = np.atleast_2d(q)
+        theta = q + self.offset
+        c = np.cos(theta)[..., None]
+        s = np.sin(theta)[..., None]
+        out = np.broadcast_to(self.fixed, q.shape + (4, 4)).copy()
+        # Rz(theta) @ fixed only mixes the first two rows
+        row0 = self.fixed[:, 0, :]
+        row1 = self.fixed[:, 1, :]
+        out[..., 0, :] = c * row0 - s * row1
+        out[..., 1, :] = s * row0 + c * row1
+        return out
+
+    def forward_all(self, q):
+        """Poses of the base, every link frame and the tool, (N, joints + 2, 4, 4)"""
+        links = self.link_transforms(q)
+        n = links.shape[0]
+        poses = np.empty((n, self.joints + 2, 4, 4))
+        poses[:, 0] = self.base
+        for i in range(self.joints):
+            np.matmul(poses[:, i], links[:, i], out=poses[:, i + 1])
+        np.matmul(poses[:, -2], self.tool, out=poses[:, -1])
+        return poses
+
+    def forward(self, q):
+        """End-effector poses, (N, 4, 4)"""
+        links = self.link_transforms(q)
+        pose = np.broadcast_to(self.base, links.shape[:1] + (4, 4))
+        for i in range(self.joints):
+            pose = pose @ links[:, i]
+        return pose @ self.tool
+
+    def positions(self, q):
+        """End-effector positions, (N, 3)"""
+        return self.forward(q)[:, :3, 3]
+
+    def jacobian(self, q):
+        """Geometric Jacobian (N, 6, joints): linear velocity rows, then angular
+
+        Column i is z x (p - o) and z for the axis z and origin o of the
+        frame joint i turns about, p being the end-effector position.
+        """
+        poses = self.forward_all(q)
+        end = poses[:, -1, :3, 3]
+        axes = poses[:, :-2, :3, 2]
+        origins = poses[:, :-2, :3, 3]
+        linear = np.cross(axes, end[:, None, :] - origins)
+        return np.concatenate([linear, axes], axis=2).transpose(0, 2, 1)
+
+    def link_positions(self, q):
+        """Origins of the base, every link frame and the tool, (N, joints + 2, 3)"""
+        return self.forward_all(q)[:, :, :3, 3]
@@ -1,11 +1,29 @@
 import time
 import picod
 import os
-import sys
 import signal
-import tty
-import termios
-import select
+import numpy as np
+from arm import Arm
+from scheduler import Scheduler, SERVO_RATE
+from jog import CartesianJog
+from recording import Recorder, RECORDING_DIR
+from estimator import PositionEstimator
+from power import PowerScheduler
+from bringup import bring_up, park
+from display import Display
+
+# Cartesian jog keys: direction of travel in the base frame
+JOG_KEYS = {
+    'up': (1, 0, 0),      # forward (+X)
+    'down': (-1, 0, 0),   # back (-X)
+    'left': (0, 1, 0),    # left (+Y)
+    'right': (0, -1, 0),  # right (-Y)
+    'w': (0, 0, 1),       # up (+Z)
+    's': (0, 0, -1),      # down (-Z)
+}
+
+# A held key auto-repeats; keep moving this long after each press
+JOG_HOLD = 0.15
 
 class GracefulExit(Exception):
     pass
@@ -13,172 +31,203 @@ class GracefulExit(Exception):
 def signal_handler(signum, frame):
     raise GracefulExit()
 
-class NonBlockingInput:
-    def __init__(self):
-        self.fd = sys.stdin.fileno()
-        self.old_settings = termios.tcgetattr(self.fd)
-        
-    def __enter__(self):
-        tty.setraw(self.fd)
-        return self
-        
-    def __exit__(self, type, value, traceback):
-        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
-
-    def get_char(self):
-        if select.select([sys.stdin], [], [], 0)[0]:
-            return sys.stdin.read(1)
-        return None
-
 class ServoController:
     def __init__(self):
         self.pico = picod.pico()
         if not self.pico.connected:
             raise Exception("Failed to connect to Pico")
+        # Key repeats and jog ticks send bursts of small writes; share transfers
+        self.pico.coalesce()
             
-        self.servos = {
-            1: {
-                "pin": 21,
-                "name": "Base",
-                "position": 1490,
-                "min": 500,
-                "max": 2500,
-                "center": 1490,
-                "step": 50
-            },
-            2: {
-                "pin": 22,
-                "name": "Second",
-                "position": 1540,
-                "min": 1540,
-                "max": 2500,
-                "center": 2020,
-                "step": 50
-            },
-            3: {
-                "pin": 3,
-                "name": "Third",
-                "position": 1840,
-                "min": 1840,
-                "max": 2500,
-                "center": 2170,
-                "step": 50
-            },
-            4: {
-                "pin": 4,
-                "name": "Fourth",
-                "position": 925,
-                "min": 500,
-                "max": 1350,
-                "center": 925,
-                "step": 50
-            },
-            5: {
-                "pin": 5,
-                "name": "Wrist",
-                "position": 1500,
-                "min": 500,
-                "max": 2500,
-                "center": 1500,
-                "step": 50
-            }
-        }
-
-        self.current_servo = 1
+        self.arm = Arm(self.pico)
+        self.arm.estimator = PositionEstimator(self.arm)
+
+        self.current_servo = self.arm.ids[0]
         self.running = True
+        self.cartesian = False
+        self.jog = CartesianJog(self.arm)
+        self.held = {}  # jog key -> time its auto-repeat runs out
+        self.recorder = None
+        self.stopped = None  # seconds the last emergency stop took
         
-        # Initialize servos
-        for servo in self.servos.values():
-            self.pico.tx_servo(servo["pin"], servo["position"])
-            time.sleep(0.1)
+        # Set up all the pins and bring the joints home together
+        self.arm.power = PowerScheduler(self.arm)
+        bring_up(self.arm)
 
     def move_servo(self, servo_id, new_position):
         """Move a servo to an absolute position"""
-        servo = self.servos[servo_id]
-        if servo["min"] <= new_position <= servo["max"]:
-            servo["position"] = new_position
-            self.pico.tx_servo(servo["pin"], new_position)
+        servo = self.arm.joint(servo_id)
+        if servo.min <= new_position <= servo.max:
+            self.arm.set_pulse(servo_id, new_position)
             return True
         return False
 
-    def handle_input(self, char):
+    def handle_input(self, key):
         """Handle keyboard input"""
-        if char == 'q':
+        if key == 'q':
             self.running = False
-        elif char == 'c':
+        elif key == 'm':
+            self.cartesian = not self.cartesian
+            self.held.clear()
+        elif key == 'r':
+            self.toggle_recording()
+        elif key == 'x':
+            self.held.clear()
+            self.stopped = self.arm.emergency_stop()
+        elif self.cartesian:
+            self.handle_jog_input(key)
+        elif key == 'c':
             # Center current servo
-            servo = self.servos[self.current_servo]
-            self.move_servo(self.current_servo, servo["center"])
-        elif char == '\x1b':
-            # Handle arrow keys
-            next_char = sys.stdin.read(2)
-            if next_char == '[A':  # Up arrow
-                self.current_servo = max(1, self.current_servo - 1)
-            elif next_char == '[B':  # Down arrow
-                self.current_servo = min(5, self.current_servo + 1)
-            elif next_char == '[D':  # Left arrow
-                servo = self.servos[self.current_servo]
-                new_pos = servo["position"] - servo["step"]
-                self.move_servo(self.current_servo, new_pos)
-            elif next_char == '[C':  # Right arrow
-                servo = self.servos[self.current_servo]
-                new_pos = servo["position"] + servo["step"]
-                self.move_servo(self.current_servo, new_pos)
-        elif char in ['+', '=']:
-            servo = self.servos[self.current_servo]
-            servo["step"] = min(100, servo["step"] + 10)
-        elif char == '-':
-            servo = self.servos[self.current_servo]
-            servo["step"] = max(10, servo["step"] - 10)
-
-    def update_display(self):
-        """Update the display with current servo information"""
-        os.system('clear')
-        print("\n=== Servo Control ===")
-        print("\nSelected Servo:")
-        servo = self.servos[self.current_servo]
-        print(f"  Servo {self.current_servo}: {servo['name']}")
-        print(f"  Position: {servo['position']}µs")
-        print(f"  Range: {servo['min']} - {servo['max']}µs")
-        print(f"  Step size: {servo['step']}µs")
-        
-        print("\nAll Servos:")
-        for id, s in self.servos.items():
-            marker = ">" if id == self.current_servo else " "
-            print(f"{marker} {id}: {s['name']} = {s['position']}µs")
-        
-        print("\nControls:")
-        print("  ↑/↓ : Select servo")
-        print("  ←/→ : Adjust position")
-        print("  C   : Center servo")
-        print("  +/- : Adjust step size")
-        print("  Q   : Quit")
+            servo = self.arm.joint(self.current_servo)
+            self.move_servo(self.current_servo, servo.center)
+        elif key in ('up', 'down', 'left', 'right'):
+            index = self.arm.index(self.current_servo)
+            if key == 'up':
+                self.current_servo = self.arm.ids[max(0, index - 1)]
+            elif key == 'down':
+                self.current_servo = self.arm.ids[min(len(self.arm) - 1, index + 1)]
+            elif key == 'left':
+                servo = self.arm.joint(self.current_servo)
+                self.move_servo(self.current_servo, servo.position - servo.step)
+            elif key == 'right':
+                servo = self.arm.joint(self.current_servo)
+                self.move_servo(self.current_servo, servo.position + servo.step)
+        elif key in ['+', '=']:
+            servo = self.arm.joint(self.current_servo)
+            servo.step = min(100, servo.step + 10)
+        elif key == '-':
+            servo = self.arm.joint(self.current_servo)
+            servo.step = max(10, servo.step - 10)
+
+    def toggle_recording(self):
+        """Start or stop recording the commanded poses"""
+        if self.recorder:
+            self.arm.recorder = None
+            self.recorder.close()
+            self.recorder = None
+        else:
+            path = os.path.join(RECORDING_DIR, time.strftime("%Y%m%d-%H%M%S"))
+            self.recorder = Recorder(path, self.arm)
+            self.arm.recorder = self.recorder
+
+    def handle_jog_input(self, key):
+        """Handle keyboard input in Cartesian mode"""
+        if key in JOG_KEYS:
+            self.held[key] = time.monotonic() + JOG_HOLD
+        elif key in ['+', '=']:
+            self.jog.speed = min(0.2, self.jog.speed + 0.01)
+        elif key == '-':
+            self.jog.speed = max(0.01, self.jog.speed - 0.01)
+
+    def jog_tick(self):
+        """Move the end effector along the held jog keys for one control period"""
+        if not self.cartesian or not self.held:
+            return
+        now = time.monotonic()
+        self.held = {key: until for key, until in self.held.items() if until > now}
+        if self.held:
+            self.jog.step(np.sum([JOG_KEYS[key] for key in self.held], axis=0))
+
+    def render(self):
+        """Lines of the display; called from the display thread, so only reads state"""
+        lines = ["", "=== Servo Control ==="]
+        if self.recorder:
+            rows = self.recorder.rows + self.recorder.count
+            lines += ["", f"Recording to {self.recorder.path} ({rows} rows)"]
+        if self.stopped is not None:
+            lines += ["", f"Emergency stop: outputs off in {self.stopped * 1000:.1f}ms"]
+        if self.cartesian:
+            return lines + self.render_jog()
+
+        servo = self.arm.joint(self.current_servo)
+        estimate = self.arm.estimated_position()
+        lines += [
+            "",
+            "Selected Servo:",
+            f"  Servo {self.current_servo}: {servo.name}",
+            f"  Position: {servo.position}µs (at ~{estimate[servo.index]:.0f}µs)",
+            f"  Range: {servo.min} - {servo.max}µs",
+            f"  Step size: {servo.step}µs",
+            "",
+            "All Servos:",
+        ]
+        for s in self.arm.joints():
+            marker = ">" if s.id == self.current_servo else " "
+            lines.append(f"{marker} {s.id}: {s.name} = {s.position}µs (~{estimate[s.index]:.0f})")
+
+        return lines + [
+            "",
+            "Controls:",
+            "  ↑/↓ : Select servo",
+            "  ←/→ : Adjust position",
+            "  C   : Center servo",
+            "  +/- : Adjust step size",
+            "  M   : Cartesian mode",
+            "  R   : Start/stop recording",
+            "  X   : Emergency stop",
+            "  Q   : Quit",
+        ]
+
+    def render_jog(self):
+        """Display lines for Cartesian mode"""
+        estimate = self.arm.estimated_position()
+        x, y, z = self.jog.kin.positions(self.arm.pulse_to_angle(estimate))[0] * 1000
+        lines = [
+            "",
+            "End effector:",
+            f"  X: {x:7.1f}mm  Y: {y:7.1f}mm  Z: {z:7.1f}mm",
+            f"  Speed: {self.jog.speed * 1000:.0f}mm/s",
+        ]
+        limited = [self.arm.names[i] for i in np.flatnonzero(self.jog.limited)]
+        if limited:
+            lines.append(f"  At limit: {', '.join(limited)}")
+        if self.jog.singular:
+            lines.append("  Near singularity, slowing down")
+
+        lines += ["", "All Servos:"]
+        for s in self.arm.joints():
+            lines.append(f"  {s.id}: {s.name} = {s.position}µs (~{estimate[s.index]:.0f})")
+
+        return lines + [
+            "",
+            "Controls:",
+            "  ↑/↓ : Forward / back (X)",
+            "  ←/→ : Left / right (Y)",
+            "  W/S : Up / down (Z)",
+            "  +/- : Adjust speed",
+            "  M   : Joint mode",
+            "  R   : Start/stop recording",
+            "  X   : Emergency stop",
+            "  Q   : Quit",
+        ]
 
     def cleanup(self):
         """Clean up before exit"""
-        print("\nMoving to center positions...")
-        for servo in self.servos.values():
-            self.pico.tx_servo(servo["pin"], servo["center"])
-            time.sleep(0.2)
-        time.sleep(0.5)
-        for servo in self.servos.values():
-            self.pico.tx_servo(servo["pin"], 0)
+        if self.recorder:
+            self.toggle_recording()
+        print("\nParking...")
+        park(self.arm)
         self.pico.close()
 
 def main():
     controller = None
+    scheduler = Scheduler()
     try:
         signal.signal(signal.SIGINT, signal_handler)
         controller = ServoController()
-        
-        with NonBlockingInput() as keyboard:
-            while controller.running:
-                controller.update_display()
-                char = keyboard.get_char()
-                if char:
-                    controller.handle_input(char)
-                time.sleep(0.1)
-            
+
+        with Display(fps=10, source=controller.render) as display:
+            def poll_input():
+                # Handle every key that arrived since the last tick
+                for key in display.keys():
+                    controller.handle_input(key)
+                controller.jog_tick()
+                if not controller.running:
+                    scheduler.stop()
+
+            scheduler.add("input", SERVO_RATE, poll_input)
+            scheduler.run()
+
     except GracefulExit:
         print("\nReceived Ctrl+C, shutting down gracefully...")
     except Exception as e:
@@ -186,7 +235,8 @@ def main():
     finally:
         if controller:
             controller.cleanup()
+        print(scheduler.report())
         print("Program terminated")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
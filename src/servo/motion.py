@@ -0,0 +1,202 @@
+import threading
+import itertools
+from collections import deque
+import numpy as np
+from scheduler import Scheduler, SERVO_RATE
+from trajectory import min_jerk
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+class MotionHandle:
+    """Tracks one queued move; returned immediately by MotionQueue.move_to"""
+
+    def __init__(self, queue, motion_id, target, duration):
+        self._queue = queue
+        self.id = motion_id
+        self.target = target
+        self.duration = duration
+        self.state = QUEUED
+        self._finished = threading.Event()
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the move completes or is cancelled"""
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        self._queue.cancel(self)
+
+    def _finish(self, state):
+        self.state = state
+        self._finished.set()
+
+class _Segment:
+    __slots__ = ("handle", "trajectory", "previous")
+
+    def __init__(self, handle, trajectory, start):
+        self.handle = handle
+        self.trajectory = trajectory
+        self.previous = np.asarray(start, dtype=np.int32)
+
+    def increment(self):
+        """Setpoint change this tick, or None once the segment is complete"""
+        row = self.trajectory.next()
+        if row is None:
+            return None
+        step = row - self.previous
+        self.previous = row
+        return step
+
+class MotionQueue:
+    """Runs queued joint moves on the control loop without blocking callers
+
+    Each tick the active segments' setpoint increments are summed onto the
+    commanded pose.  When the running segment has `blend` seconds left the
+    next queued segment starts, so the two overlap and the arm flows
+    through the waypoint instead of stopping at it.  The summed step is
+    held to each joint's vmax; what it cuts off is carried into the next
+    ticks, so the arm still ends on the target.
+    """
+
+    def __init__(self, arm, rate=SERVO_RATE, blend=0.15):
+        self.arm = arm
+        self.rate = rate
+        self.blend_ticks = int(blend * rate)
+        self.commanded = arm.position.astype(np.int32)
+        self.target = self.commanded.copy()  # where the last queued move ends
+        self.max_step = np.maximum(1, np.floor(arm.vmax / rate)).astype(np.int32)
+        self._behind = np.zeros(len(arm), dtype=np.int32)  # µs the speed limit held back
+        self._queue = deque()
+        self._active = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._scheduler = None
+        self._thread = None
+
+    def _pose_array(self, pose, base):
+        target = base.copy()
+        for joint, width in pose.items():
+            target[self.arm.index(joint)] = width
+        return self.arm.clamp(target).astype(np.int32)
+
+    def move_to(self, pose, duration=None, preempt=False):
+        """Queue a move to `pose` ({joint: µs}) and return its handle at once
+
+        With `preempt` every queued and running move is cancelled and the
+        new move starts from the currently commanded pose.
+        """
+        with self._lock:
+            if preempt:
+                self._cancel_all()
+            if self.idle():
+                # The arm may have been moved directly since the last move
+                self.commanded = self.arm.position.astype(np.int32)
+                self.target = self.commanded.copy()
+            target = self._pose_array(pose, self.target)
+            handle = MotionHandle(self, next(self._ids), target, duration)
+            self._queue.append(handle)
+            self.target = target
+        return handle
+
+    def cancel(self, handle):
+        """Cancel one move; the moves still running are replanned from the commanded pose"""
+        with self._lock:
+            if handle in self._queue:
+                self._queue.remove(handle)
+            running = any(s.handle is handle for s in self._active)
+            self._active = [s for s in self._active if s.handle is not handle]
+            if not handle.done:
+                handle._finish(CANCELLED)
+            if running:
+                self._rebase()
+            remaining = list(self._queue) or [s.handle for s in self._active]
+            self.target = remaining[-1].target.copy() if remaining else self.commanded.copy()
+
+    def _rebase(self):
+        """Replan the active segments so they end on their targets from the commanded pose
+
+        Blended segments each add their increments, so a segment that
+        started from a cancelled one's end would leave the arm offset by
+        the part of that move not yet made.  Each keeps its remaining
+        time, starting where the one before it now ends.
+        """
+        start = self.commanded
+        for segment in self._active:
+            remaining = len(segment.trajectory) - segment.trajectory.index
+            segment.trajectory = min_jerk(start, segment.handle.target, self.arm.vmax, self.arm.amax,
+                                          rate=self.rate, duration=remaining / self.rate)
+            segment.previous = np.asarray(start, dtype=np.int32)
+            start = segment.handle.target
+        self._behind[:] = 0
+
+    def cancel_all(self):
+        with self._lock:
+            self._cancel_all()
+
+    def _cancel_all(self):
+        for handle in list(self._queue) + [s.handle for s in self._active]:
+            handle._finish(CANCELLED)
+        self._queue.clear()
+        self._active = []
+        self._behind[:] = 0
+        self.target = self.commanded.copy()
+
+    def _start_next(self):
+        handle = self._queue.popleft()
+        # A blended segment starts where the previous one ends
+        start = self._active[-1].trajectory.setpoints[-1] if self._active else self.commanded
+        trajectory = min_jerk(start, handle.target, self.arm.vmax, self.arm.amax,
+                              rate=self.rate, duration=handle.duration)
+        self._active.append(_Segment(handle, trajectory, start))
+        handle.state = RUNNING
+
+    def idle(self):
+        return not self._queue and not self._active and not self._behind.any()
+
+    def tick(self):
+        """Advance the active moves by one control period"""
+        with self._lock:
+            if self._queue:
+                last = self._active[-1] if self._active else None
+                if last is None or len(last.trajectory) - last.trajectory.index <= self.blend_ticks:
+                    self._start_next()
+            if not self._active and not self._behind.any():
+                return
+
+            wanted = self._behind.copy()
+            for segment in list(self._active):
+                step = segment.increment()
+                if step is None:
+                    self._active.remove(segment)
+                    segment.handle._finish(DONE)
+                else:
+                    wanted += step
+            step = np.clip(wanted, -self.max_step, self.max_step)
+            self._behind = wanted - step
+            if not step.any():
+                return
+            pose = self.commanded + step
+            self.commanded = pose
+
+            # Other threads command the arm too; keep the queue and arm in step
+            with self.arm.lock:
+                self.arm.set_pulse_array(pose)
+
+    def start(self):
+        """Run the queue on its own control loop thread"""
+        self._scheduler = Scheduler()
+        self._scheduler.add("motion", self.rate, self.tick)
+        self._thread = threading.Thread(target=self._scheduler.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._scheduler:
+            self._scheduler.stop()
+            self._thread.join()
+            self._scheduler = None
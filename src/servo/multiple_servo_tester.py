@@ -2,6 +2,9 @@ import time
 import picod
 import sys
 import signal
+from arm import Arm
+from power import PowerScheduler
+from bringup import bring_up, park, load_plans
 
 class GracefulExit(Exception):
     pass
@@ -16,46 +19,37 @@ class PWMTester:
             raise Exception("Failed to connect to Pico")
         
         # Define all servos
-        self.servos = {
-            1: {"pin": 7, "name": "Base"},
-            2: {"pin": 8, "name": "Second"},
-            3: {"pin": 5, "name": "Third"},
-            4: {"pin": 10, "name": "Fourth"},
-            5: {"pin": 11, "name": "Wrist"}
-        }
+        self.arm = Arm(self.pico)
         
-        # Initialize each servo pin explicitly
+        # Set up all the pins and center every servo together
         print("Initializing servo pins...")
-        for servo in self.servos.values():
-            print(f"Setting up pin {servo['pin']} for {servo['name']}")
-            self.pico.tx_servo(servo['pin'], 1500)  # Center position
-            time.sleep(0.1)  # Small delay between initializations
+        self.arm.power = PowerScheduler(self.arm)
+        seconds = bring_up(self.arm, dict(load_plans()[0], pose="center"))
+        print(f"Pins {', '.join(str(servo.pin) for servo in self.arm.joints())} centered in {seconds:.2f}s")
         
     def test_sequence(self):
         """Test all servos in sequence"""
         try:
             while True:
                 # Move each servo independently
-                for servo_id, servo in self.servos.items():
-                    print(f"\nTesting {servo['name']} (Pin {servo['pin']}):")
+                for servo in self.arm.joints():
+                    print(f"\nTesting {servo.name} (Pin {servo.pin}):")
                     
-                    # Test movement range
+                    # Test movement range, clamped to the joint's limits
                     positions = [1000, 1500, 2000]
                     for pos in positions:
                         print(f"Moving to position {pos}...")
-                        self.pico.tx_servo(servo['pin'], pos)
+                        self.arm.set_pulse(servo.id, pos)
                         time.sleep(0.5)  # Give servo time to move
                     
-                    print(f"Completed test of {servo['name']}")
+                    print(f"Completed test of {servo.name}")
                     time.sleep(0.5)  # Delay between servos
                 
                 # Now test all servos moving together
                 print("\nTesting all servos together...")
                 for pos in [1000, 1500, 2000]:
                     print(f"\nMoving all servos to {pos}")
-                    for servo in self.servos.values():
-                        self.pico.tx_servo(servo['pin'], pos)
-                        time.sleep(0.05)  # Small delay between each servo
+                    self.arm.set_pulses({servo_id: pos for servo_id in self.arm.ids}, ack=True)
                     time.sleep(1)  # Wait for movement to complete
                 
                 retry = input("\nTest another cycle? (y/n): ").lower()
@@ -67,10 +61,7 @@ class PWMTester:
 
     def cleanup(self):
         print("\nCleaning up...")
-        for servo in self.servos.values():
-            print(f"Stopping PWM on pin {servo['pin']}")
-            self.pico.tx_servo(servo['pin'], 0)
-            time.sleep(0.1)
+        print(f"Parked in {park(self.arm):.2f}s")
         self.pico.close()
 
 def main():
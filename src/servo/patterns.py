@@ -0,0 +1,258 @@
+import os
+import ast
+import json
+import numpy as np
+from scheduler import SERVO_RATE
+from trajectory import plan_move
+from cartesian import circle, line, solve_path
+
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns")
+
+# Easing curves map the fraction of a keyframe segment to the fraction of its change
+EASINGS = {
+    "linear": lambda u: u,
+    "step": lambda u: (u >= 1).astype(float),
+    "ease_in": lambda u: u ** 2,
+    "ease_out": lambda u: u * (2 - u),
+    "ease_in_out": lambda u: u * u * (3 - 2 * u),
+    "min_jerk": lambda u: u ** 3 * (10 - 15 * u + 6 * u ** 2),
+}
+
+# Names available to pattern expressions besides FUNCTIONS: the time and
+# the joint's center, home, low and high pulse widths
+PARAMETERS = ("t", "center", "home", "low", "high")
+
+FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "exp": np.exp, "sqrt": np.sqrt,
+    "abs": np.abs, "sign": np.sign, "clip": np.clip, "where": np.where,
+    "minimum": np.minimum, "maximum": np.maximum, "mod": np.mod, "pi": np.pi,
+}
+
+PATHS = {
+    "circle": lambda p, rate: circle(p["center"], p["radius"], p.get("normal", (0, 0, 1)),
+                                     p.get("speed", 0.05), rate),
+    "line": lambda p, rate: line(p["start"], p["end"], p.get("speed", 0.05), rate),
+}
+
+OPERATORS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide, ast.Mod: np.mod, ast.Pow: np.power,
+    ast.UAdd: np.positive, ast.USub: np.negative,
+}
+
+class Expression:
+    """A pattern expression, parsed once into a tree of closures
+
+    Only numbers, PARAMETERS, FUNCTIONS and arithmetic operators are
+    allowed; anything else raises ValueError when the expression is
+    parsed, so nothing in a pattern file is ever run as Python.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Bad pattern expression {source!r}: {e.msg}") from None
+        self._value = self._build(tree.body)
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+    def __call__(self, t=0.0, **names):
+        try:
+            value = self._value(dict(names, t=t))
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]} is not defined for pattern expression {self.source!r}") from None
+        return np.broadcast_to(np.asarray(value, dtype=float), np.shape(t))
+
+    def _build(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = node.value
+            return lambda names: value
+        if isinstance(node, ast.Name) and node.id in PARAMETERS:
+            name = node.id
+            return lambda names: names[name]
+        if isinstance(node, ast.Name) and node.id in FUNCTIONS and not callable(FUNCTIONS[node.id]):
+            value = FUNCTIONS[node.id]
+            return lambda names: value
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            op, left, right = OPERATORS[type(node.op)], self._build(node.left), self._build(node.right)
+            return lambda names: op(left(names), right(names))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in OPERATORS:
+            op, operand = OPERATORS[type(node.op)], self._build(node.operand)
+            return lambda names: op(operand(names))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords
+                and callable(FUNCTIONS.get(node.func.id))):
+            func, args = FUNCTIONS[node.func.id], [self._build(arg) for arg in node.args]
+            return lambda names: func(*[arg(names) for arg in args])
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            node = node.func
+        what = node.id if isinstance(node, ast.Name) else type(node).__name__
+        raise ValueError(f"{what} is not allowed in pattern expression {self.source!r}")
+
+def parse(expression):
+    """An Expression for a string, or the number itself"""
+    return Expression(expression) if isinstance(expression, str) else expression
+
+def parse_spec(spec):
+    """Parse every expression of a pattern spec in place, so each is parsed only once"""
+    if "duration" in spec:
+        spec["duration"] = parse(spec["duration"])
+    joints = spec.get("joints", {})
+    for joint, entry in joints.items():
+        if isinstance(entry, dict):
+            for frame in entry["keyframes"]:
+                frame[1] = parse(frame[1])
+        else:
+            joints[joint] = parse(entry)
+    return spec
+
+def load_patterns(directory=PATTERN_DIR):
+    """Pattern specs from the .json files in `directory`, keyed by file name, in menu order
+
+    Their expressions are parsed as they are loaded, so a bad pattern
+    file fails here rather than when it is compiled.
+    """
+    specs = {}
+    for filename in os.listdir(directory):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename)) as f:
+                specs[filename[:-5]] = parse_spec(json.load(f))
+    return dict(sorted(specs.items(), key=lambda item: (item[1].get("order", 100), item[0])))
+
+def evaluate(expression, t=0.0, **names):
+    """Value of a pattern expression (a number, string or Expression) at times `t`"""
+    if isinstance(expression, str):
+        expression = Expression(expression)
+    if isinstance(expression, Expression):
+        return expression(t, **names)
+    return np.broadcast_to(float(expression), np.shape(t))
+
+def _keyframes(frames, t, names):
+    """Interpolate [time, value, easing] keyframes at times `t`
+
+    The easing of a keyframe shapes the segment that ends on it; the
+    value is held before the first keyframe and after the last.
+    """
+    times = np.array([frame[0] for frame in frames], dtype=float)
+    values = np.array([float(evaluate(frame[1], **names)) for frame in frames])
+    easings = [frame[2] if len(frame) > 2 else "linear" for frame in frames]
+
+    end = np.clip(np.searchsorted(times, t, side="right"), 1, len(times) - 1)
+    start = end - 1
+    span = np.maximum(times[end] - times[start], 1e-9)
+    u = np.clip((t - times[start]) / span, 0.0, 1.0)
+    eased = np.empty_like(u)
+    for k, easing in enumerate(easings):
+        segment = end == k
+        eased[segment] = EASINGS[easing](u[segment])
+    out = values[start] + (values[end] - values[start]) * eased
+    if len(times) == 1:
+        out[:] = values[0]
+    return out
+
+class Pattern:
+    """A compiled pattern: a pulse width table at the control rate
+
+    `mask` marks the joints the pattern drives; the others are left
+    where they are.
+    """
+
+    def __init__(self, name, description, setpoints, mask, rate, loop=True):
+        self.name = name
+        self.description = description
+        self.setpoints = setpoints
+        self.mask = mask
+        self.rate = rate
+        self.loop = loop
+
+    def __len__(self):
+        return len(self.setpoints)
+
+    @property
+    def duration(self):
+        return len(self.setpoints) / self.rate
+
+def compile_pattern(arm, name, spec, rate=SERVO_RATE, solver=None):
+    """Compile a pattern spec into a Pattern for `arm`
+
+    A spec either gives a "duration" (seconds, may be an expression) and
+    per-joint "joints" entries, each an expression of t or a
+    {"keyframes": [[time, value, easing], ...]} list, or a Cartesian
+    "path" solved with the IK `solver`.  Widths are clamped to each
+    joint's range.
+    """
+    description = spec.get("description", name)
+    loop = spec.get("loop", True)
+    mask = np.zeros(len(arm), dtype=bool)
+
+    if "path" in spec:
+        path = spec["path"]
+        waypoints = PATHS[path["shape"]](path, rate)
+        setpoints = solve_path(arm, solver, waypoints, rate=rate).setpoints
+        mask[:] = True
+        return Pattern(name, description, setpoints, mask, rate, loop)
+
+    duration = float(evaluate(spec["duration"]))
+    n = max(1, int(round(duration * rate)))
+    t = np.arange(n) / rate
+    setpoints = np.tile(arm.position, (n, 1)).astype(float)
+    for joint, entry in spec["joints"].items():
+        i = arm.index(int(joint))
+        names = {"center": float(arm.center[i]), "home": float(arm.home[i]),
+                 "low": float(arm.min[i]), "high": float(arm.max[i])}
+        if isinstance(entry, dict):
+            setpoints[:, i] = _keyframes(entry["keyframes"], t, names)
+        else:
+            setpoints[:, i] = evaluate(entry, t, **names)
+        mask[i] = True
+    setpoints = np.rint(arm.clamp(setpoints)).astype(np.int32)
+    return Pattern(name, description, setpoints, mask, rate, loop)
+
+def compile_patterns(arm, specs=None, rate=SERVO_RATE, solver=None):
+    if specs is None:
+        specs = load_patterns()
+    return {name: compile_pattern(arm, name, spec, rate, solver) for name, spec in specs.items()}
+
+class PatternPlayer:
+    """Plays a compiled pattern on the arm, one table row per control tick
+
+    Playback first moves the pattern's joints to its first row, then
+    steps through the table `speed` rows per tick, so speed scales time
+    without recomputing anything.
+    """
+
+    def __init__(self, arm, pattern):
+        self.arm = arm
+        self.pattern = pattern
+        self.phase = 0.0
+        self.approach = None
+
+    def start(self):
+        first = np.where(self.pattern.mask, self.pattern.setpoints[0], self.arm.position)
+        self.approach = plan_move(self.arm, first, rate=self.pattern.rate)
+        self.phase = 0.0
+
+    @property
+    def done(self):
+        return not self.pattern.loop and self.approach is None and self.phase >= len(self.pattern)
+
+    def tick(self, speed=1.0):
+        """Output the next row; returns it, or None once a one-shot pattern has finished"""
+        if self.approach is not None:
+            row = self.approach.next()
+            if row is not None:
+                self.arm.set_pulse_array(row)
+                return row
+            self.approach = None
+
+        n = len(self.pattern)
+        if self.pattern.loop:
+            self.phase %= n
+        elif self.phase >= n:
+            return None
+        row = self.pattern.setpoints[int(self.phase)]
+        self.phase += speed
+        self.arm.set_pulse_array(row, mask=self.pattern.mask)
+        return row
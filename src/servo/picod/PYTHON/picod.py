@@ -108,12 +108,14 @@ PWM/SERVO
 tx_pwm               Starts hardware PWM pulses on a single GPIO
 tx_servo             Starts hardware servo pulses on a single GPIO
 tx_close             Stops PWM/Servo pulses and frees the associated GPIO
+stop_all_outputs     Zeroes every PWM/Servo output in one high priority message
 
 PWM_READ
 
 pwm_read_dutycycle   Returns the PWM dutycycle of a single GPIO
 pwm_read_frequency   Returns the PWM frequency of a single GPIO
 pwm_read_high_edges  Returns the high edge count of a single GPIO
+pwm_read_many        Returns raw PWM readings of several GPIO in one message
 
 SERIAL
 
@@ -144,6 +146,14 @@ uid                  Returns the Pico's unique id (64-bit number)
 version              Returns the Pico software version (dotted quad)
 set_config_value     Sets the value of an internal configuration item
 get_config_value     Gets the value of an internal configuration item
+coalesce             Holds unacknowledged requests to send them together
+coalesce_stats       Returns how many requests were held and replaced
+
+SEQUENCES
+
+sequence             Returns a builder for a timed GPIO sequence
+sequence_run         Replays a compiled sequence
+sequence_delete      Deletes a compiled sequence
 
 CALLBACKS
 
@@ -163,6 +173,7 @@ import time
 import struct
 import binascii
 import threading
+import weakref
 import atexit
 
 VERSION = 0x00000600
@@ -295,6 +306,10 @@ _CMD_PWM = 63
 _CMD_SERVO = 64
 _CMD_PWM_CLOSE = 65
 
+PWM_READ_FREQ = _CMD_PWM_READ_FREQ
+PWM_READ_DUTY = _CMD_PWM_READ_DUTY
+PWM_READ_EDGE = _CMD_PWM_READ_EDGE
+
 _CMD_SPI_OPEN = 70
 _CMD_SPI_CLOSE = 71
 
@@ -318,8 +333,48 @@ _CMD_SET_CONFIG_VAL = 97
 _CMD_GET_CONFIG_VAL = 98
 _CMD_PD_VERSION = 99
 
+PRIORITY_STOP = 0 # stop_all_outputs only, ahead of everything
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_BULK = 3
+
+# Reply queues: the flags byte has 6 bits for the queue.  Queue 0 is
+# the main thread's, the others are allotted to threads as they make
+# their first request, and the last one is shared once they run out.
+_QUEUES = 64
+_SHARED_QUEUE = _QUEUES - 1
+
+# Requests not listed are PRIORITY_NORMAL.  A message goes out at the
+# highest priority of the requests in it.
+_PRIORITY = {
+   _CMD_SERVO: PRIORITY_HIGH, _CMD_PWM: PRIORITY_HIGH,
+   _CMD_PWM_CLOSE: PRIORITY_HIGH, _CMD_GPIO_WRITE: PRIORITY_HIGH,
+   _CMD_GPIO_SET_IN_OUT: PRIORITY_HIGH,
+
+   _CMD_I2C_READ: PRIORITY_BULK, _CMD_I2C_WRITE: PRIORITY_BULK,
+   _CMD_I2C_PUSH: PRIORITY_BULK, _CMD_I2C_POP: PRIORITY_BULK,
+   _CMD_SPI_READ: PRIORITY_BULK, _CMD_SPI_WRITE: PRIORITY_BULK,
+   _CMD_SPI_XFER: PRIORITY_BULK, _CMD_SPI_PUSH: PRIORITY_BULK,
+   _CMD_SPI_POP: PRIORITY_BULK,
+   _CMD_UART_READ: PRIORITY_BULK, _CMD_UART_WRITE: PRIORITY_BULK,
+   _CMD_GPIO_READ: PRIORITY_BULK, _CMD_PULLS_GET: PRIORITY_BULK,
+   _CMD_FUNCTION_GET: PRIORITY_BULK, _CMD_ADC_READ: PRIORITY_BULK,
+   _CMD_PWM_READ_FREQ: PRIORITY_BULK, _CMD_PWM_READ_DUTY: PRIORITY_BULK,
+   _CMD_PWM_READ_EDGE: PRIORITY_BULK, _CMD_TICK: PRIORITY_BULK,
+   _CMD_UID: PRIORITY_BULK, _CMD_PD_VERSION: PRIORITY_BULK,
+   _CMD_GET_CONFIG_VAL: PRIORITY_BULK,
+}
+
 MSG_HEADER = 0xff
 MSG_HEADER_LEN = 5
+MSG_MAX_LEN = 32764
+
+USB_PACKET = 64 # bytes in a USB full speed bulk packet
+
+# Message bytes besides the requests: header, length, and two CRCs
+_FRAME_OVERHEAD = MSG_HEADER_LEN + 2
+
+SLEEP_MAX_US = 2000000
 
 MSG_BAD_CHECKSUM = 0xfe
 MSG_BAD_LENGTH =  0xfd
@@ -362,6 +417,364 @@ def _tobuf(x):
 def _byte2hex(s):
    return "".join("{:02x} ".format(c) for c in bytearray(s))
 
+def _pack_request(req, data=bytearray(), reply=REPLY_NONE, queue=0):
+   """
+   Request
+   <-------- Length bytes ------->
+   +-------+---+---+-------------+
+   |Length |Flg|Req|Optional data|
+   |msb|lsb|   |   |             |
+   +---+---+---+---+-------------+
+   """
+   flags = (reply << 6) | queue
+   return struct.pack(">HBB", len(data) + 4, flags, req) + data
+
+def _servo_raw(pulsewidth, frequency):
+   """
+   Returns the clock divider, steps, and high steps giving
+   servo pulses of pulsewidth microseconds at frequency Hz.
+   """
+   norm = CLOCK_HZ / frequency
+   div = int(norm / 65536) + 1
+   newf = CLOCK_HZ / div
+   steps = int(newf / frequency)
+   micros = 1e6 * steps / newf
+   high = int(pulsewidth * steps / micros)
+
+   if high > steps:
+      high = steps
+
+   return div, steps, high
+
+def _frame(request):
+   """
+   <------------ Length bytes ------------>
+   +---+-------+-------+----------+-------+
+   |Hdr|Length | CRC1  |Request(s)| CRC2  |
+   |xFF|msb|lsb|msb|lsb|          |msb|lsb|
+   +---+---+---+---+---+----------+---+---+
+
+   CRC1: Hdr+Length
+   CRC2: Hdr+Length+CRC1+Request(s)
+   """
+
+   length = len(request) + MSG_HEADER_LEN + 2
+
+   msg = struct.pack(">BH", MSG_HEADER, length)
+
+   crc1 = binascii.crc_hqx(msg, 0)
+
+   msg += struct.pack(">H", crc1)
+
+   msg += request
+
+   crc2 = binascii.crc_hqx(msg, 0)
+
+   msg += struct.pack(">H", crc2)
+
+   return msg
+
+def _split_requests(requests):
+   """
+   Returns the packed requests in a buffer as a list.
+   """
+   out = []
+   i = 0
+   while i < len(requests):
+      length = struct.unpack_from(">H", requests, i)[0]
+      out.append(bytes(requests[i:i+length]))
+      i += length
+   return out
+
+# Requests that only set an output; a stop cancels them
+_OUTPUT_REQUESTS = (_CMD_SERVO, _CMD_PWM, _CMD_GPIO_WRITE)
+
+def _output_key(request):
+   """
+   Returns what a packed request sets, if it only sets an output
+   which a later request of the same key can replace: (_CMD_SERVO,
+   gpio) for a servo/PWM write, (_CMD_GPIO_WRITE, mask) for a GPIO
+   write.  Returns None for any other request.
+   """
+   req = request[3]
+   if req == _CMD_SERVO or req == _CMD_PWM:
+      return (_CMD_SERVO, request[4])
+   if req == _CMD_GPIO_WRITE:
+      return (_CMD_GPIO_WRITE, struct.unpack_from(">I", request, 4)[0])
+   return None
+
+class _thread_local(threading.local):
+   """
+   Per thread request state.  Requests queued with flush=False stay
+   with their thread, so threads cannot send each other's requests,
+   and each thread gets its own reply queue, so threads cannot take
+   each other's replies.
+   """
+
+   def __init__(self):
+      self.queue = None # reply queue, allotted on the first request
+      self.sent = 0.0 # time.perf_counter() of the thread's last write
+      self.pending = bytearray()
+      self.pending_priority = PRIORITY_BULK
+      self.pending_generation = 0 # writer generation of the first pending
+      self.pending_outputs = True # every pending request only sets outputs
+
+class _writer:
+   """
+   Serialises message writes to the Pico, higher priority first.
+
+   A writer waits while the link is busy or while any writer of a
+   higher priority is waiting, so high priority messages go out
+   ahead of queued lower priority ones.  A message already being
+   written is never interrupted (the Pico must receive it whole).
+
+   Messages that only set outputs carry the generation current when
+   they were made.  cancel() starts a new generation, and a message
+   of an older one is dropped instead of written, so setpoints made
+   before a stop cannot follow it out and re-energise an output.
+   """
+
+   def __init__(self, write):
+      self._write = write
+      self._cond = threading.Condition()
+      self._waiting = [0] * (PRIORITY_BULK + 1)
+      self._busy = False
+      self.generation = 0
+      self.cancelled = 0 # messages dropped by cancel()
+
+   def cancel(self):
+      """
+      Drops every output-only message made so far that is not yet
+      being written.
+      """
+      with self._cond:
+         self.generation += 1
+
+   def write(self, data, priority=PRIORITY_NORMAL, generation=None):
+      """
+      Writes data once its turn comes.  Returns the time.perf_counter()
+      at which the write completed, or None if it was cancelled.
+      """
+      with self._cond:
+         self._waiting[priority] += 1
+         while self._busy or any(self._waiting[:priority]):
+            self._cond.wait()
+         self._waiting[priority] -= 1
+         if generation is not None and generation != self.generation:
+            self.cancelled += 1
+            self._cond.notify_all()
+            return None
+         self._busy = True
+      try:
+         self._write(data)
+      finally:
+         with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+      return time.perf_counter()
+
+class _coalescer(threading.Thread):
+   """
+   Holds REPLY_NONE requests for a short window and sends them
+   together in one message.
+
+   The first request held starts the window.  The held requests go
+   out when it ends, or at once when the next one would no longer
+   fit in a USB packet of size bytes.  A servo/PWM write to a GPIO
+   held behind an earlier one for the same GPIO replaces it, as does
+   a GPIO write covering every GPIO of an earlier one.  Any other
+   request is a barrier: nothing is replaced across it, so the Pico
+   still sees the writes in the order they were made.
+
+   Messages are taken from the held requests under _cond but written
+   after it is released, so a slow write never holds up cancel() (and
+   so a stop).  Each message taken gets a ticket and waits for its
+   turn to be written, so they still go out in the order taken.
+   """
+
+   def __init__(self, pico, window, size):
+      threading.Thread.__init__(self)
+      self.daemon = True
+      self._pico = pico
+      self.window = window
+      self.size = size
+      self._cond = threading.Condition()
+      self._held = [] # (key, request) in arrival order
+      self._length = 0
+      self._priority = PRIORITY_BULK
+      self._deadline = None
+      self._running = True
+      self._order = threading.Condition()
+      self._tickets = 0 # messages taken
+      self._turn = 0 # ticket of the next message to write
+      self.requests = 0 # requests given to the coalescer
+      self.superseded = 0 # of which replaced before being sent
+      self.messages = 0 # messages sent
+
+   def add(self, requests, priority, generation=None):
+      """
+      Holds packed requests for the next message, unless they only
+      set outputs and a stop came since they were made.
+      """
+      out = []
+      with self._cond:
+         if generation is not None and \
+            generation != self._pico._writer.generation:
+            return
+         for request in _split_requests(requests):
+            key = _output_key(request)
+            if key is not None:
+               self._supersede(key)
+            if self._held and \
+               self._length + len(request) + _FRAME_OVERHEAD > self.size:
+               self._send(out)
+            self._held.append((key, request))
+            self._length += len(request)
+            self.requests += 1
+
+         self._priority = min(self._priority, priority)
+
+         if self._length + _FRAME_OVERHEAD >= self.size:
+            self._send(out)
+         elif self._deadline is None:
+            self._deadline = time.perf_counter() + self.window
+            self._cond.notify()
+      self._write(out)
+
+   def _supersede(self, key):
+      for i in range(len(self._held) - 1, -1, -1):
+         old = self._held[i][0]
+         if old is None:
+            break
+         if old[0] == key[0] and \
+            (old[1] == key[1] if key[0] == _CMD_SERVO else
+               old[1] & ~key[1] == 0):
+            self._length -= len(self._held[i][1])
+            del self._held[i]
+            self.superseded += 1
+
+   def _take(self):
+      request = b"".join(r for _, r in self._held)
+      priority = self._priority
+      # Held requests are all newer than the last cancel (see cancel)
+      if all(key is not None for key, _ in self._held):
+         generation = self._pico._writer.generation
+      else:
+         generation = None
+      self._held = []
+      self._length = 0
+      self._priority = PRIORITY_BULK
+      self._deadline = None
+      return request, priority, generation
+
+   def _queue(self, out, request, priority, generation):
+      # With _cond held: the ticket fixes the message's place in line
+      out.append((self._tickets, request, priority, generation))
+      self._tickets += 1
+
+   def _send(self, out):
+      """
+      Takes the held requests as the next message, appending it to
+      out for _write() once _cond is released.
+      """
+      if self._held:
+         self._queue(out, *self._take())
+         self.messages += 1
+
+   def _write(self, out):
+      """
+      Writes the messages taken, each once every message taken
+      before it has been written.  Call without _cond held.
+      """
+      for ticket, request, priority, generation in out:
+         with self._order:
+            while self._turn != ticket:
+               self._order.wait()
+         try:
+            self._pico._message(request, priority, generation)
+         finally:
+            with self._order:
+               self._turn += 1
+               self._order.notify_all()
+
+   def send_with(self, request, priority, generation=None):
+      """
+      Sends the held requests followed by request (packed requests)
+      as one message, or as two if they would not fit in one.
+      """
+      out = []
+      with self._cond:
+         if self._held and \
+            self._length + len(request) + _FRAME_OVERHEAD <= MSG_MAX_LEN:
+            held, held_priority, held_generation = self._take()
+            if held_generation is None:
+               generation = None
+            self._queue(out, held + request,
+               min(priority, held_priority), generation)
+            self.messages += 1
+            request = None
+         else:
+            self._send(out)
+            with self._order:
+               behind = self._turn != self._tickets
+            if behind:
+               self._queue(out, request, priority, generation)
+               request = None
+      self._write(out)
+      if request is not None:
+         # Nothing to keep in order, so don't hold up other writers
+         self._pico._message(request, priority, generation)
+
+   def cancel(self):
+      """
+      Starts a new writer generation and drops the held output
+      writes, which were made before it.
+      """
+      with self._cond:
+         self._pico._writer.cancel()
+         kept = [(key, r) for key, r in self._held if key is None]
+         self.superseded += len(self._held) - len(kept)
+         self._held = kept
+         self._length = sum(len(r) for _, r in kept)
+         if not kept:
+            self._deadline = None
+
+   def flush(self):
+      """
+      Sends the held requests now.
+      """
+      out = []
+      with self._cond:
+         self._send(out)
+      self._write(out)
+
+   def run(self):
+      while True:
+         out = []
+         with self._cond:
+            if not self._running:
+               return
+            if self._deadline is None:
+               self._cond.wait()
+               continue
+            delay = self._deadline - time.perf_counter()
+            if delay > 0:
+               self._cond.wait(delay)
+            else:
+               self._send(out)
+         self._write(out)
+
+   def stop(self):
+      """
+      Sends the held requests and stops the thread.
+      """
+      out = []
+      with self._cond:
+         self._send(out)
+         self._running = False
+         self._cond.notify()
+      self._write(out)
+
 class _callback_ADT:
    """
    An ADT class to hold level callback information.
@@ -649,12 +1062,12 @@ class _reply_callback:
    A class to provide reply callbacks.
    """
 
-   def __init__(self, notify, command_id, func):
+   def __init__(self, notify, queue, command_id, func):
       """
       Initialise a reply callback and adds it to the notification thread.
       """
       self._notify = notify
-      self.callb = _reply_ADT(self._thread_data.queue, command_id, func)
+      self.callb = _reply_ADT(queue, command_id, func)
       self._notify.append_reply_callback(self.callb)
 
    def cancel(self):
@@ -684,36 +1097,225 @@ class _event_callback:
       """
       self._notify.remove_event_callback(self.callb)
 
-class pico():
+class _sequence:
+   """
+   A class to build a timed GPIO sequence.
+   """
 
-   def _message(self, request=bytearray()):
+   def __init__(self, pico):
       """
-      <------------ Length bytes ------------>
-      +---+-------+-------+----------+-------+
-      |Hdr|Length | CRC1  |Request(s)| CRC2  |
-      |xFF|msb|lsb|msb|lsb|          |msb|lsb|
-      +---+---+---+---+---+----------+---+---+
+      Initialises an empty sequence for a pico instance.
+      """
+      self._pico = pico
+      self._requests = []
 
-      CRC1: Hdr+Length
-      CRC2: Hdr+Length+CRC1+Request(s)
+   def _add(self, req, data):
+      self._requests.append(_pack_request(req, data))
+      return self
+
+   def GPIO_set_dir(self, inout_GPIO, out_GPIO, out_LEVEL):
+      """
+      Adds a direction and level change of a group of GPIO.
+      """
+      return self._add(_CMD_GPIO_SET_IN_OUT,
+         struct.pack(">III", inout_GPIO, out_GPIO, out_LEVEL))
+
+   def gpio_set_input(self, gpio):
+      """
+      Adds setting a single GPIO as an input.
+      """
+      assert GPIO_MIN <= gpio <= GPIO_MAX
+      return self.GPIO_set_dir(1<<gpio, 0, 0)
+
+   def gpio_set_output(self, gpio, level):
+      """
+      Adds setting a single GPIO as an output with an initial level.
+      """
+      assert GPIO_MIN <= gpio <= GPIO_MAX
+      assert 0 <= level <= 1
+      return self.GPIO_set_dir(1<<gpio, 1<<gpio, level<<gpio)
+
+   def GPIO_write(self, out_GPIO, out_LEVEL):
+      """
+      Adds setting the level of a group of GPIO.
+      """
+      return self._add(_CMD_GPIO_WRITE,
+         struct.pack(">II", out_GPIO, out_LEVEL))
+
+   def gpio_write(self, gpio, level):
+      """
+      Adds setting the level of a single GPIO.
+      """
+      assert GPIO_MIN <= gpio <= GPIO_MAX
+      assert 0 <= level <= 1
+      return self.GPIO_write(1<<gpio, level<<gpio)
+
+   def GPIO_set_pulls(self, GPIO, PULLS):
+      """
+      Adds setting the pulls of a group of GPIO.
+      """
+      return self._add(_CMD_PULLS_SET, struct.pack(">III",
+         GPIO, PULLS & 0xffffffff, (PULLS >> 32) & 0xffffffff))
+
+   def gpio_set_pull(self, gpio, pull):
+      """
+      Adds setting the pull of a single GPIO.
+      """
+      assert GPIO_MIN <= gpio <= GPIO_MAX
+      assert PULL_NONE <= pull <= PULL_BOTH
+      return self.GPIO_set_pulls(1<<gpio, pull<<(gpio*2))
+
+   def GPIO_set_functions(self, GPIO, FUNCS):
+      """
+      Adds setting the functions of a group of GPIO.
+      """
+      return self._add(_CMD_FUNCTION_SET, struct.pack(">IIIII", GPIO,
+         FUNCS & 0xffffffff, (FUNCS >> 32) & 0xffffffff,
+         (FUNCS >> 64) & 0xffffffff, (FUNCS >> 96) & 0xffffffff))
+
+   def gpio_set_function(self, gpio, func):
+      """
+      Adds setting the function of a single GPIO.
+      """
+      assert GPIO_MIN <= gpio <= GPIO_MAX
+      assert FUNC_XIP <= func <= FUNC_NULL
+      return self.GPIO_set_functions(1<<gpio, func<<(gpio*4))
+
+   def tx_servo(self, gpioAB, pulsewidth, frequency=50):
+      """
+      Adds starting (or with a pulsewidth of 0 stopping) servo
+      pulses on a single GPIO.
+      """
+      assert GPIO_MIN <= gpioAB <= GPIO_MAX
+      assert 40 <= frequency <= 500
+      assert pulsewidth == 0 or 500 <= pulsewidth <= 2500
+      div, steps, high = _servo_raw(pulsewidth, frequency)
+      return self._add(_CMD_SERVO,
+         struct.pack(">BBHH", gpioAB, div&255, steps, high))
+
+   def sleep_us(self, micros):
+      """
+      Adds a Pico sleep of micros microseconds.
+
+      Sleeps longer than the Pico's 2 second limit are split
+      into several sleeps.
+      """
+      micros = int(micros)
+      assert micros > 0
+      while micros > 0:
+         chunk = min(micros, SLEEP_MAX_US)
+         self._add(_CMD_SLEEP_US, struct.pack(">I", chunk))
+         micros -= chunk
+      return self
+
+   def sleep(self, secs):
+      """
+      Adds a Pico sleep of secs seconds.
       """
+      return self.sleep_us(secs * 1e6)
 
-      length = len(request) + MSG_HEADER_LEN + 2
+   def frames(self):
+      """
+      Returns the sequence encoded as a list of framed messages.
+
+      The requests are split across messages so that no message
+      is longer than MSG_MAX_LEN.
+      """
+      room = MSG_MAX_LEN - MSG_HEADER_LEN - 2
+      frames = []
+      request = bytearray()
+      for r in self._requests:
+         if len(request) + len(r) > room:
+            frames.append(bytes(_frame(request)))
+            request = bytearray()
+         request += r
+      if len(request):
+         frames.append(bytes(_frame(request)))
+      return frames
 
-      msg = struct.pack(">BH", 0xff, length)
+   def compile(self):
+      """
+      Encodes the sequence and caches it on the pico instance.
 
-      crc1 = binascii.crc_hqx(msg, 0)
+      Returns a handle for [*sequence_run*].
+      """
+      return self._pico._sequence_store(self.frames())
 
-      msg += struct.pack(">H", crc1)
+   def run(self):
+      """
+      Sends the sequence once without caching it.
+      """
+      self._pico._sequence_send(self.frames())
 
-      msg += request
+class pico():
 
-      crc2 = binascii.crc_hqx(msg, 0)
+   def _message(self, request=bytearray(), priority=PRIORITY_NORMAL,
+      generation=None):
+      """
+      Frames the request(s) and writes the message to the Pico
+      in the given priority lane.  A message given the writer
+      generation it was made in is dropped if a stop came since.
+      """
 
-      msg += struct.pack(">H", crc2)
+      msg = _frame(request)
 
       #print("serial_write", _byte2hex(msg))
-      self._pico_serial_write(msg)
+      sent = self._writer.write(msg, priority, generation)
+      if sent is not None:
+         self._thread_data.sent = sent
+
+   def _reply_queue(self):
+      """
+      Returns the calling thread's reply queue, allotting one on
+      its first request.
+      """
+      td = self._thread_data
+      if td.queue is None:
+         with self._queue_lock:
+            if self._free_queues:
+               td.queue = self._free_queues.pop()
+               weakref.finalize(threading.current_thread(),
+                  self._release_queue, td.queue)
+            else:
+               td.queue = _SHARED_QUEUE
+      return td.queue
+
+   def _release_queue(self, queue):
+      with self._queue_lock:
+         self._sync[queue] = []
+         self._free_queues.append(queue)
+
+   def _queue_request(self, req, data, reply):
+      td = self._thread_data
+      if not len(td.pending):
+         td.pending_generation = self._writer.generation
+         td.pending_outputs = True
+      td.pending += _pack_request(req, data, reply, self._reply_queue())
+      td.pending_priority = min(
+         td.pending_priority, _PRIORITY.get(req, PRIORITY_NORMAL))
+      if reply != REPLY_NONE or req not in _OUTPUT_REQUESTS:
+         td.pending_outputs = False
+
+   def _flush_pending(self, priority=PRIORITY_BULK, hold=False):
+      """
+      Sends the thread's queued requests.  With coalescing on they
+      are held for the next shared message if hold is set, and
+      otherwise go out in one message behind any requests held.
+      """
+      td = self._thread_data
+      pending = td.pending
+      priority = min(priority, td.pending_priority)
+      generation = td.pending_generation if td.pending_outputs else None
+      td.pending = bytearray()
+      td.pending_priority = PRIORITY_BULK
+
+      coalescer = self._coalescer
+      if coalescer is None:
+         self._message(pending, priority, generation)
+      elif hold:
+         coalescer.add(pending, priority, generation)
+      else:
+         coalescer.send_with(pending, priority, generation)
 
    def _request(self, req, data=bytearray(), reply=REPLY_NOW, flush=True):
       """
@@ -725,23 +1327,21 @@ class pico():
       +---+---+---+---+-------------+
       """
 
-      length = len(data) + 4
-
-      flags = (reply << 6) | self._thread_data.queue
-
-      msg = struct.pack(">HBB", length, flags, req) + data
-
-      self._pending += msg
+      if reply != REPLY_NOW:
+         self._queue_request(req, data, reply)
+         if flush:
+            self._flush_pending(hold=(reply == REPLY_NONE))
+         return STATUS_NO_REPLY, None
 
-      if reply == REPLY_NOW or flush:
-         self._message(self._pending)
-         self._pending = bytearray()
-
-      if reply == REPLY_NOW:
+      # Only threads sharing the last queue ever wait on this lock
+      with self._reply_locks[self._reply_queue()]:
+         self._queue_request(req, data, reply)
+         self._flush_pending()
+         queue = self._sync[self._thread_data.queue]
          until = time.time() + 2.0
          while True:
-            if len(self._sync[self._thread_data.queue]):
-               data = self._sync[self._thread_data.queue].pop(0)
+            if len(queue):
+               data = queue.pop(0)
                #print(_byte2hex(data))
                if data[0] == req:
                   return data[1], data[2:]
@@ -750,7 +1350,50 @@ class pico():
             time.sleep(0.01)
          return STATUS_TIMED_OUT, None
 
-      return STATUS_NO_REPLY, None
+   def _request_many(self, requests, reply=REPLY_NOW, priority=None):
+      """
+      Sends several requests in a single message.
+
+      requests:= a list of (req, data) tuples.
+      priority:= the message's lane, by default the highest of
+                 its requests.
+
+      The requests are executed by the Pico in order.  If reply is
+      REPLY_NOW a list of (status, data) tuples, one per request, is
+      returned.  A request whose reply does not arrive in time has a
+      status of STATUS_TIMED_OUT.
+      """
+
+      if priority is None:
+         priority = PRIORITY_BULK
+
+      if reply != REPLY_NOW:
+         for req, data in requests:
+            self._queue_request(req, data, reply)
+         self._flush_pending(priority, hold=(reply == REPLY_NONE))
+         return [(STATUS_NO_REPLY, None)] * len(requests)
+
+      replies = []
+      with self._reply_locks[self._reply_queue()]:
+         for req, data in requests:
+            self._queue_request(req, data, reply)
+         self._flush_pending(priority)
+         queue = self._sync[self._thread_data.queue]
+         until = time.time() + 2.0
+         while len(replies) < len(requests):
+            if len(queue):
+               data = queue.pop(0)
+               if data[0] == requests[len(replies)][0]:
+                  replies.append((data[1], data[2:]))
+               continue
+            if time.time() > until:
+               break
+            time.sleep(0.001)
+
+      while len(replies) < len(requests):
+         replies.append((STATUS_TIMED_OUT, None))
+
+      return replies
 
    # GPIO --------------------------------------------------------------------
 
@@ -1702,6 +2345,11 @@ class pico():
       assert 0 <= steps <= 65535
       assert 0 <= high <= 65535
 
+      if high:
+         self._outputs[gpioAB] = (mode, clkdiv, steps)
+      else:
+         self._outputs.pop(gpioAB, None)
+
       return self._request(mode,
          struct.pack(">BBHH", gpioAB, clkdiv, steps, high),
             reply=reply, flush=flush)[0]
@@ -1768,15 +2416,7 @@ class pico():
       assert 40 <= frequency <= 500
       assert pulsewidth == 0 or 500 <= pulsewidth <= 2500
 
-      norm = CLOCK_HZ / frequency
-      div = int(norm / 65536) + 1
-      newf = CLOCK_HZ / div
-      steps = int(newf / frequency)
-      micros = 1e6 * steps / newf
-      high = int(pulsewidth * steps / micros)
-
-      if high > steps:
-         high = steps
+      div, steps, high = _servo_raw(pulsewidth, frequency)
 
       #print(pulsewidth, frequency, div, steps, high)
 
@@ -1798,9 +2438,73 @@ class pico():
 
       assert GPIO_MIN <= gpioAB <= GPIO_MAX
 
+      self._outputs.pop(gpioAB, None)
+
       return self._request(_CMD_PWM_CLOSE,
          struct.pack(">B", gpioAB), reply=reply, flush=flush)
 
+   def stop_all_outputs(self, gpios=None):
+      """
+      Zeroes PWM/servo outputs in a single high priority message.
+
+      gpios:= the GPIO to stop, by default every GPIO whose output
+              was started through this instance.
+
+      Returns a tuple of status, the seconds until the message was
+      written, and the seconds until the Pico acknowledged it.  The
+      two latencies are also kept in [#stop_latency#].
+
+      ...
+      status, written, acked = pico.stop_all_outputs()
+
+      print("stopped in {:.1f} ms".format(acked * 1000))
+      ...
+
+      Each output keeps its frequency with a high time of zero, so
+      servos go limp and PWM lines stay low.  The message has a lane
+      of its own ahead of all other messages, so only a message
+      already being written delays it.  Output writes made before the
+      stop, by any thread, that are still waiting to be written (or
+      held for coalescing) are dropped rather than sent after it.
+      """
+
+      start = time.perf_counter()
+
+      if self._coalescer is not None:
+         self._coalescer.cancel()
+      else:
+         self._writer.cancel()
+
+      if gpios is None:
+         gpios = sorted(self._outputs)
+
+      if not len(gpios):
+         self.stop_latency = (0.0, 0.0)
+         return STATUS_OKAY, 0.0, 0.0
+
+      requests = []
+
+      for gpio in gpios:
+         assert GPIO_MIN <= gpio <= GPIO_MAX
+         mode, clkdiv, steps = self._outputs.pop(gpio, None) or \
+            ((_CMD_SERVO,) + _servo_raw(0, 50)[:2])
+         requests.append((mode,
+            struct.pack(">BBHH", gpio, clkdiv&255, steps, 0)))
+
+      replies = self._request_many(
+         requests, reply=REPLY_NOW, priority=PRIORITY_STOP)
+      acked = time.perf_counter() - start
+      written = self._thread_data.sent - start
+
+      status = STATUS_OKAY
+      for s, _ in replies:
+         if s != STATUS_OKAY:
+            status = s
+            break
+
+      self.stop_latency = (written, acked)
+      return status, written, acked
+
    # PWM READ ----------------------------------------------------------------
 
    def _pwm_read_raw(self, gpioB, mode, reply=REPLY_NOW, flush=True):
@@ -1984,6 +2688,56 @@ class pico():
       return self._pwm_read_raw(
          gpioB, _CMD_PWM_READ_EDGE, reply=reply, flush=flush)
 
+   def pwm_read_many(self, gpios, mode, reply=REPLY_NOW):
+      """
+      Returns raw PWM readings of several GPIO in one message.
+
+      gpios:= a list of GPIO to monitor (must be odd numbered GPIO).
+       mode:= PWM_READ_FREQ, PWM_READ_DUTY, or PWM_READ_EDGE.
+
+      Returns a list of (status, count, time) tuples, one per GPIO,
+      in the order of [#gpios#].
+
+      ...
+      readings = pico.pwm_read_many([17, 19, 21], picod.PWM_READ_DUTY)
+
+      for gpio, (status, count, secs) in zip([17, 19, 21], readings):
+         if status == picod.STATUS_OKAY:
+            print(gpio, count, secs)
+      ...
+
+      All the reads are sent to the Pico in a single message so
+      the readings of all the GPIO cover the same period.
+
+      The count and time have the same meaning as for [*_pwm_read_raw*].
+      In particular the first read of a GPIO in a new mode initialises
+      the mode and returns a zero reading.
+      """
+
+      assert PWM_READ_FREQ <= mode <= PWM_READ_EDGE
+
+      requests = []
+
+      for gpioB in gpios:
+         assert GPIO_MIN <= gpioB <= GPIO_MAX
+         assert (gpioB % 2) == 1
+         requests.append((mode, struct.pack(">B", gpioB)))
+
+      readings = []
+
+      for status, data in self._request_many(requests, reply=reply):
+         count = None
+         secs = None
+
+         if status == STATUS_OKAY:
+            countH, countL, microsH, microsL = struct.unpack(">IIII", data)
+            count = countL + (countH<<32)
+            secs = (microsL + (microsH<<32))/1e6
+
+         readings.append((status, count, secs))
+
+      return readings
+
    # SERIAL ---------------------------------------------------------------
 
    def serial_open(self,
@@ -2514,6 +3268,119 @@ class pico():
 
       return status, value
 
+   def coalesce(self, window=0.0002, size=USB_PACKET):
+      """
+      Turns coalescing of unacknowledged requests on or off.
+
+      window:= seconds requests may be held, 0 turns coalescing off.
+        size:= the message size in bytes at which held requests are
+               sent without waiting for the window to end.
+
+      With coalescing on, requests sent with REPLY_NONE (tx_servo,
+      gpio_write, ...) are not written at once but held, so a burst
+      of them from any thread goes out as one message, one USB
+      transfer.  The first request held waits at most window
+      seconds.  Before a write reaches the Pico, a later write of the
+      same servo/PWM GPIO, or a GPIO write covering the same GPIO,
+      replaces it.  A request that asks for a reply is sent at once,
+      in one message behind the requests held.
+
+      Nothing is returned.
+
+      ...
+      pico.coalesce(0.0002) # hold writes for up to 200 us
+      for gpio in (2, 3, 4, 5):
+         pico.tx_servo(gpio, 1500, reply=picod.REPLY_NONE)
+      ...
+      """
+
+      if self._coalescer is not None:
+         self._coalescer.stop()
+         self._coalescer = None
+
+      if window > 0:
+         assert size <= MSG_MAX_LEN
+         self._coalescer = _coalescer(self, window, size)
+         self._coalescer.start()
+
+   def coalesce_stats(self):
+      """
+      Returns a tuple of the requests held for coalescing, how many of
+      them were replaced by later writes, and the messages they went
+      out in, since coalescing was last turned on.
+      """
+
+      c = self._coalescer
+
+      if c is None:
+         return 0, 0, 0
+
+      return c.requests, c.superseded, c.messages
+
+
+# SEQUENCES ---------------------------------------------------------------
+
+   def sequence(self):
+      """
+      Returns a builder for a timed GPIO sequence.
+
+      ...
+      seq = pico.sequence()
+      seq.gpio_set_output(15, 0).sleep_us(5000).gpio_set_input(15)
+      handle = seq.compile()
+
+      pico.sequence_run(handle)
+      ...
+
+      The builder queues GPIO writes, direction changes, pulls,
+      functions, servo outputs and microsecond sleeps.  When
+      compiled the sequence is encoded once into framed messages
+      which are cached and may be replayed any number of times
+      by handle.
+
+      The Pico executes the requests of a message back to back so
+      the timing between steps is set by the Pico's sleeps rather
+      than by host or USB scheduling.  Sequences longer than one
+      message are split automatically, the timing between messages
+      is then subject to USB latency.
+      """
+      return _sequence(self)
+
+   def _sequence_store(self, frames):
+      handle = self._next_sequence
+      self._next_sequence += 1
+      self._sequences[handle] = frames
+      return handle
+
+   def sequence_run(self, handle):
+      """
+      Replays a compiled sequence.
+
+      handle:= a handle returned by a sequence's compile method.
+
+      Nothing is returned.
+
+      Any requests queued with flush=False are sent first.
+      """
+
+      self._sequence_send(self._sequences[handle])
+
+   def _sequence_send(self, frames):
+      if len(self._thread_data.pending):
+         self._flush_pending()
+
+      if self._coalescer is not None:
+         self._coalescer.flush()
+
+      self._writer.write(b"".join(frames), PRIORITY_NORMAL)
+
+   def sequence_delete(self, handle):
+      """
+      Deletes a compiled sequence.
+
+      handle:= a handle returned by a sequence's compile method.
+      """
+      self._sequences.pop(handle, None)
 
 # CALLBACKS ---------------------------------------------------------------
 
@@ -2689,7 +3556,7 @@ class pico():
       The callback receieves three parameters: the [#command_id#],
       the status, and a bytearray containg any returned data.
       """
-      return _reply_callback(_notify, command_id, func)
+      return _reply_callback(self._notify, self._reply_queue(), command_id, func)
 
 # __init__ ----------------------------------------------------------------
 
@@ -2850,14 +3717,22 @@ class pico():
       self.repr = "<pico transport={}{} device={} (baud={})>".format(
          transport, hp, device, baud)
 
-      self._pending = bytearray()
-      self._thread_data = threading.local()
+      self._writer = _writer(self._pico_serial_write)
+      self._outputs = {} # gpio -> (mode, clkdiv, steps) of started outputs
+      self.stop_latency = None
+      self._thread_data = _thread_local()
       self._thread_data.queue = 0 # main thread is 0
-      self._sync = [[],[],[]] # support main thread plus two more
+      self._sync = [[] for _ in range(_QUEUES)]
+      self._reply_locks = [threading.Lock() for _ in range(_QUEUES)]
+      self._free_queues = list(range(_SHARED_QUEUE - 1, 0, -1))
+      self._queue_lock = threading.Lock()
       self._GPIO_levels = 0
       self._GPIO_tick = 0
       self._GPIO_pulls = 0
       self._GPIO_function = 0
+      self._sequences = {}
+      self._next_sequence = 0
+      self._coalescer = None
 
       self._notify = _callback_thread(self)
 
@@ -2870,6 +3745,8 @@ class pico():
 
       Nothing is returned.
       """
+      self.coalesce(0)
+
       self.connected = False
 
       if self._notify is not None:
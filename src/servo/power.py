@@ -0,0 +1,204 @@
+import time
+import numpy as np
+import picod
+from arm import load_config
+from trajectory import Trajectory
+
+# VSYS reaches ADC channel 3 through a 3:1 divider; readings are 12 bit of 3.3V
+VSYS_CHANNEL = 3
+VSYS_SCALE = 3 * 3.3 / 4096
+
+# Servo currents in A for types that do not give their own
+DEFAULT_CURRENT = {"idle": 0.01, "running": 0.3, "stall": 1.5}
+
+class CurrentModel:
+    """Supply current of each servo from its commanded motion
+
+    A servo draws its "idle" current holding still, rising to its
+    "running" current at rated speed, plus up to its "stall" current
+    while it accelerates at its rated acceleration, which is also what
+    it draws driving flat out after a jump in its command:
+
+        I = idle + (running - idle) |v| / vmax + (stall - running) min(1, |a| / amax)
+    """
+
+    def __init__(self, arm, config=None):
+        if config is None:
+            config = load_config()
+        types = config["servo_types"]
+        currents = [dict(DEFAULT_CURRENT, **types[t].get("current", {})) for t in arm.types]
+        self.idle = np.array([c["idle"] for c in currents])
+        self.running = np.array([c["running"] for c in currents])
+        self.stall = np.array([c["stall"] for c in currents])
+        self.vmax = arm.vmax
+        self.amax = arm.amax
+
+    def draw(self, velocity, accel):
+        """Current of each joint (..., joints) in A at velocity µs/s and acceleration µs/s²"""
+        return (self.idle + (self.running - self.idle) * np.abs(velocity) / self.vmax
+                + (self.stall - self.running) * np.minimum(1.0, np.abs(accel) / self.amax))
+
+    def derivatives(self, setpoints, rate):
+        """Velocity and acceleration of each row of a setpoint table"""
+        setpoints = np.asarray(setpoints, dtype=float)
+        padded = np.concatenate([setpoints[:1], setpoints, setpoints[-1:]])
+        velocity = np.diff(padded, axis=0)[:-1] * rate
+        accel = np.diff(padded, n=2, axis=0) * rate ** 2
+        return velocity, accel
+
+    def trajectory(self, setpoints, rate):
+        """Total current (N,) while the rows of a setpoint table play at `rate`"""
+        return self.draw(*self.derivatives(setpoints, rate)).sum(axis=-1)
+
+class PowerScheduler:
+    """Keeps the servos' combined current within the supply's budget
+
+    The budget ("power" in the arm config: "budget" in A on the servo
+    supply) is shared two ways.  `limit` slows a planned trajectory down
+    where its predicted current would exceed the budget, so joints that
+    would all accelerate at once share it instead.  `enable` switches
+    joints on, or sends them a jump, at staggered times so their stall
+    currents never add up past the budget, in place of fixed sleeps
+    between servos.
+
+    With "vsys_low" set, `adapt` reads VSYS on ADC channel 3: a sag below
+    it cuts the budget by a fifth, and readings above "vsys_ok" restore
+    it a step at a time.  Attach the scheduler as `arm.power` and
+    plan_move limits every move it plans.
+    """
+
+    def __init__(self, arm, budget=None, config=None, clock=time.perf_counter, sleep=time.sleep):
+        if config is None:
+            config = load_config()
+        power = config.get("power", {})
+        self.arm = arm
+        self.model = CurrentModel(arm, config)
+        self.nominal = power.get("budget", 5.0) if budget is None else budget
+        self.budget = self.nominal
+        self.vsys_low = power.get("vsys_low")
+        self.vsys_ok = power.get("vsys_ok", self.vsys_low)
+        self.vsys = None
+        self.clock = clock
+        self.sleep = sleep
+
+    def read_vsys(self):
+        """VSYS in volts, or None if the read failed"""
+        status, _, value = self.arm.pico.adc_read(VSYS_CHANNEL)
+        if status != picod.STATUS_OKAY:
+            return None
+        self.vsys = value * VSYS_SCALE
+        return self.vsys
+
+    def adapt(self):
+        """Adjust the budget to the supply voltage; returns True while it is sagging"""
+        if self.vsys_low is None or self.read_vsys() is None:
+            return False
+        if self.vsys < self.vsys_low:
+            self.budget = max(0.2 * self.nominal, 0.8 * self.budget)
+            return True
+        if self.vsys >= self.vsys_ok:
+            self.budget = min(self.nominal, self.budget * 1.05)
+        return False
+
+    def stretch(self, setpoints, rate):
+        """How much slower each row must play, >= 1, for the current to fit the budget
+
+        Playing a row s times slower divides its velocity by s and its
+        acceleration by s², so s solves idle + A / s + B / s² = budget.
+        """
+        velocity, accel = self.model.derivatives(setpoints, rate)
+        m = self.model
+        A = np.sum((m.running - m.idle) * np.abs(velocity) / m.vmax, axis=1)
+        B = np.sum((m.stall - m.running) * np.abs(accel) / m.amax, axis=1)
+        headroom = max(self.budget - np.sum(m.idle), 1e-3)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = np.where(B > 0, (np.sqrt(A ** 2 + 4 * B * headroom) - A) / (2 * B),
+                               headroom / A)
+        return np.maximum(1.0, 1.0 / inverse)
+
+    def limit(self, trajectory, start=None, passes=5):
+        """The trajectory, retimed where needed to stay within the budget
+
+        `start` is where the joints are before the first row (default the
+        first row).  Retiming and rounding to whole µs change the
+        accelerations a little, so it is repeated until the result fits.
+        """
+        if start is None:
+            start = trajectory.setpoints[0]
+        for _ in range(passes):
+            retimed = self._retime(trajectory, start)
+            if retimed is trajectory:
+                break
+            trajectory = retimed
+        return trajectory
+
+    def _retime(self, trajectory, start):
+        setpoints = np.vstack([start, trajectory.setpoints]).astype(float)
+        if len(setpoints) < 2:
+            return trajectory
+        stretch = self.stretch(setpoints, trajectory.rate)
+        if stretch.max() <= 1.0:
+            return trajectory
+
+        # Spread each slow-down over its neighbours so the change of pace
+        # does not itself need a burst of acceleration
+        window = 5
+        padded = np.pad(stretch, window // 2, mode="edge")
+        stretch = np.lib.stride_tricks.sliding_window_view(padded, window).max(axis=1)
+
+        t = np.concatenate([[0.0], np.cumsum(stretch[1:])]) / trajectory.rate
+        n = max(1, int(np.ceil(t[-1] * trajectory.rate)))
+        times = np.arange(1, n + 1) / n * t[-1]
+        resampled = np.stack([np.interp(times, t, setpoints[:, j]) for j in range(setpoints.shape[1])],
+                             axis=1)
+        return Trajectory(np.rint(resampled).astype(np.int32), trajectory.rate)
+
+    def stagger(self, widths, mask=None, start=None):
+        """Start times in s for sending `widths` to the `mask` joints one group at a time
+
+        A joint sent a jump drives flat out at its stall current until it
+        arrives; from `start` widths (default: unknown, so the far end of
+        its range) that takes distance / vmax.  Joints are placed largest
+        current first, each at the earliest time the currents already
+        placed over its interval leave room for it.  Joints not in the
+        mask get NaN.
+        """
+        widths = np.asarray(widths, dtype=float)
+        mask = np.ones(len(widths), dtype=bool) if mask is None else np.asarray(mask)
+        if start is None:
+            distance = np.maximum(widths - self.arm.min, self.arm.max - widths)
+        else:
+            distance = np.abs(widths - np.asarray(start, dtype=float))
+        duration = distance / self.arm.vmax + 3 * self.arm.lag
+        current = self.model.stall
+
+        offsets = np.full(len(widths), np.nan)
+        placed = []  # (start, end, current)
+        for i in sorted(np.flatnonzero(mask), key=lambda i: -current[i]):
+            for t in sorted({0.0} | {end for _, end, _ in placed}):
+                load = sum(c for s, e, c in placed if s < t + duration[i] and e > t)
+                if load + current[i] <= self.budget or not placed:
+                    break
+            offsets[i] = t
+            placed.append((t, t + duration[i], current[i]))
+        return offsets
+
+    def enable(self, widths, mask=None, start=None):
+        """Send `widths` to the joints in staggered groups, blocking until the last is sent
+
+        A sagging supply holds the next group back until VSYS recovers
+        (at most a second), and every later group moves back with it.
+        """
+        offsets = self.stagger(widths, mask, start)
+        begin = self.clock()
+        delay = 0.0
+        for offset in np.unique(offsets[np.isfinite(offsets)]):
+            due = begin + offset + delay
+            while self.clock() < due:
+                self.sleep(max(0.0, due - self.clock()))
+            held = self.clock()
+            while self.adapt() and self.clock() - held < 1.0:
+                self.sleep(0.02)
+            delay += self.clock() - held
+            self.arm.set_pulse_array(widths, mask=offsets == offset)
+        return offsets
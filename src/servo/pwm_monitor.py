@@ -0,0 +1,179 @@
+import time
+import sys
+import signal
+import numpy as np
+import picod
+
+MODES = {
+    "frequency": picod.PWM_READ_FREQ,
+    "dutycycle": picod.PWM_READ_DUTY,
+    "high_edges": picod.PWM_READ_EDGE,
+}
+
+class GracefulExit(Exception):
+    pass
+
+def signal_handler(signum, frame):
+    raise GracefulExit()
+
+class PwmMonitor:
+    """Reads the PWM input of several odd GPIO in one message per period
+
+    Readings are kept in a ring buffer of the last `window` periods so
+    per-pin moving statistics are available as NumPy arrays.
+    """
+
+    def __init__(self, pico, gpios, mode="dutycycle", window=20, frequency=50):
+        for gpio in gpios:
+            if gpio % 2 != 1:
+                raise ValueError(f"GPIO {gpio} is not odd, PWM read needs an odd GPIO")
+        self.pico = pico
+        self.gpios = np.array(gpios, dtype=np.int64)
+        self.frequency = frequency
+        self.window = window
+
+        n = len(gpios)
+        self.history = np.full((window, n), np.nan)
+        self.status = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.seconds = np.zeros(n)
+        self.samples = 0
+
+        self.mode = None
+        self._primed = np.zeros(n, dtype=bool)
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        """Change the read mode, discarding all statistics"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {list(MODES)}")
+        if mode != self.mode:
+            self.mode = mode
+            self.reset()
+
+    def clear(self):
+        """Forget the moving statistics, keeping the pins primed"""
+        self.history.fill(np.nan)
+        self.samples = 0
+
+    def reset(self):
+        """Forget the statistics and treat the next reading of every pin as a priming one
+
+        The Pico keeps each pin in its mode; only a mode change makes it
+        re-initialise them.
+        """
+        self.clear()
+        self.count.fill(0)
+        self.seconds.fill(0)
+        self._primed.fill(False)
+
+    def _read_raw(self):
+        readings = self.pico.pwm_read_many(self.gpios.tolist(), MODES[self.mode])
+        status = np.array([r[0] for r in readings], dtype=np.int64)
+        count = np.array([r[1] or 0 for r in readings], dtype=np.int64)
+        secs = np.array([r[2] or 0.0 for r in readings])
+        return status, count, secs
+
+    def read(self):
+        """Read every pin once and return this period's values
+
+        The Pico initialises a mode with a zero reading, so the first read
+        of a pin after a mode change (or a failed read) only primes the pin
+        and its value is NaN.
+        """
+        status, count, secs = self._read_raw()
+        ok = status == picod.STATUS_OKAY
+        valid = ok & self._primed
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.mode == "dutycycle":
+                values = count * 100.0 / (picod.CLOCK_HZ * secs)
+            elif self.mode == "frequency":
+                values = count / secs
+            else:
+                # High edges are cumulative, report the edge rate since the last read
+                values = (count - self.count) / (secs - self.seconds)
+
+        values = np.where(valid, values, np.nan)
+
+        self.status = status
+        self.count = np.where(ok, count, self.count)
+        self.seconds = np.where(ok, secs, self.seconds)
+        self._primed = ok
+
+        self.history[self.samples % self.window] = values
+        self.samples += 1
+        return values
+
+    def high_times(self):
+        """µs each pin has been high since the last read, without recording a sample
+
+        Needs the dutycycle mode.  A read is quick enough to poll every
+        millisecond or so, so the moment a pulse changes can be found far
+        more finely than the moving statistics allow.
+        """
+        if self.mode != "dutycycle":
+            raise ValueError("High times need the dutycycle mode")
+        status, count, _ = self._read_raw()
+        ok = status == picod.STATUS_OKAY
+        self.status = status
+        self._primed = ok
+        return np.where(ok, count * 1e6 / picod.CLOCK_HZ, np.nan)
+
+    def mean(self):
+        """Moving mean per pin over the window"""
+        with np.errstate(invalid="ignore"):
+            return np.nanmean(self.history, axis=0) if self.samples else self.history[0]
+
+    def std(self):
+        """Moving standard deviation per pin over the window"""
+        with np.errstate(invalid="ignore"):
+            return np.nanstd(self.history, axis=0) if self.samples else self.history[0]
+
+    def minimum(self):
+        with np.errstate(invalid="ignore"):
+            return np.nanmin(self.history, axis=0) if self.samples else self.history[0]
+
+    def maximum(self):
+        with np.errstate(invalid="ignore"):
+            return np.nanmax(self.history, axis=0) if self.samples else self.history[0]
+
+    def pulse_widths(self, values=None):
+        """Convert dutycycle readings to pulse widths in µs at `frequency`"""
+        if self.mode != "dutycycle":
+            raise ValueError("Pulse widths need the dutycycle mode")
+        if values is None:
+            values = self.mean()
+        return values * 1e4 / self.frequency
+
+def main():
+    gpios = [int(arg) for arg in sys.argv[1:]]
+    if not gpios:
+        print("Usage: python pwm_monitor.py GPIO [GPIO ...]  (odd GPIO looped back from servo lines)")
+        return
+
+    pico = None
+    try:
+        signal.signal(signal.SIGINT, signal_handler)
+        pico = picod.pico()
+        if not pico.connected:
+            raise Exception("Failed to connect to Pico")
+
+        monitor = PwmMonitor(pico, gpios)
+        while True:
+            monitor.read()
+            widths = monitor.pulse_widths()
+            jitter = monitor.pulse_widths(monitor.std())
+            print("  ".join(f"{g}: {w:7.1f}µs ±{j:4.1f}" for g, w, j in zip(gpios, widths, jitter)))
+            time.sleep(0.3)
+
+    except GracefulExit:
+        print("\nReceived Ctrl+C, shutting down gracefully...")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        if pico:
+            pico.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import signal
+import numpy as np
+import picod
+from arm import Arm
+from scheduler import Scheduler, SERVO_RATE
+from trajectory import plan_move
+
+RECORDING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+class GracefulExit(Exception):
+    pass
+
+def signal_handler(signum, frame):
+    raise GracefulExit()
+
+def _columns(joints, feedback):
+    """Column name -> (dtype, shape of one row)"""
+    columns = {
+        "host_time": ("<f8", []),  # time.time() when the command was sent
+        "pico_tick": ("<u4", []),  # Pico µs tick at the same moment
+        "command": ("<i2", [joints]),  # commanded pulse widths, 0 = off
+    }
+    if feedback:
+        columns["measured"] = ("<f4", [joints])  # measured widths, NaN if none
+    return columns
+
+class Recorder:
+    """Appends commanded pulse widths to a recording as they are sent
+
+    A recording is a directory holding meta.json and one raw file per
+    column.  Rows are buffered and appended in blocks, so the files only
+    ever grow and a crash loses at most the unflushed block.  Recording
+    into an existing directory continues it.
+
+    Pico timestamps come from mapping host time onto a pico.tick() read
+    taken at the start and every `sync_interval` seconds, so only the
+    syncs cost a round trip.
+    """
+
+    def __init__(self, path, arm, feedback=False, block=250, sync_interval=10.0):
+        self.path = path
+        self.pico = arm.pico
+        self.block = block
+        self.sync_interval = sync_interval
+        joints = len(arm)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            if self.meta["joints"] != arm.ids:
+                raise ValueError(f"Recording {path} was made with joints {self.meta['joints']}")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {
+                "joints": arm.ids,
+                "names": arm.names,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "columns": _columns(joints, feedback),
+            }
+            with open(meta_path, "w") as f:
+                json.dump(self.meta, f, indent=2)
+
+        self.columns = {name: (np.dtype(dtype), tuple(shape))
+                        for name, (dtype, shape) in self.meta["columns"].items()}
+        self.buffers = {name: np.zeros((block,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in self.columns.items()}
+        self.files = {name: open(os.path.join(path, name + ".bin"), "ab") for name in self.columns}
+        self.count = 0
+        self.rows = 0
+        self._sync_host = None
+        self._sync_tick = 0
+        self._sync()
+
+    def _sync(self):
+        host = time.time()
+        status, tick = self.pico.tick() if self.pico else (picod.STATUS_NO_REPLY, 0)
+        after = time.time()
+        if status == picod.STATUS_OKAY:
+            self._sync_host = (host + after) / 2
+            self._sync_tick = tick
+        elif self._sync_host is None:
+            self._sync_host = host
+
+    def _pico_tick(self, host):
+        return int(self._sync_tick + (host - self._sync_host) * 1e6) & 0xFFFFFFFF
+
+    def record(self, command, measured=None):
+        host = time.time()
+        if host - self._sync_host > self.sync_interval:
+            self._sync()
+        n = self.count
+        self.buffers["host_time"][n] = host
+        self.buffers["pico_tick"][n] = self._pico_tick(host)
+        self.buffers["command"][n] = command
+        if "measured" in self.buffers:
+            self.buffers["measured"][n] = np.nan if measured is None else measured
+        self.count += 1
+        if self.count == self.block:
+            self.flush()
+
+    def flush(self):
+        for name, f in self.files.items():
+            f.write(self.buffers[name][:self.count].tobytes())
+            f.flush()
+        self.rows += self.count
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+class Recording:
+    """A recording memory-mapped for reading; nothing is loaded up front"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.columns = {}
+        for name, (dtype, shape) in self.meta["columns"].items():
+            dtype = np.dtype(dtype)
+            filename = os.path.join(path, name + ".bin")
+            rows = os.path.getsize(filename) // (dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+            self.columns[name] = np.memmap(filename, dtype=dtype, mode="r", shape=(rows,) + tuple(shape)) \
+                if rows else np.zeros((0,) + tuple(shape), dtype=dtype)
+        # A crash can leave the columns at different lengths; use whole rows
+        self.rows = min(len(column) for column in self.columns.values())
+        self.host_time = self.columns["host_time"]
+        self.pico_tick = self.columns["pico_tick"]
+        self.command = self.columns["command"]
+        self.measured = self.columns.get("measured")
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def duration(self):
+        if self.rows < 2:
+            return 0.0
+        return float(self.host_time[self.rows - 1] - self.host_time[0])
+
+    def index_at(self, seconds):
+        """Row being output `seconds` into the recording"""
+        target = self.host_time[0] + seconds
+        return max(0, int(np.searchsorted(self.host_time[:self.rows], target, side="right")) - 1)
+
+class RecordingPlayer:
+    """Streams a recording to the arm at its original timing, scaled by `speed`
+
+    Playback first moves the arm to the row under the playhead, as
+    PatternPlayer does.  Then every control tick the playhead advances
+    by speed / rate seconds and the latest row at or before it is sent
+    as one batched servo update.  Rows are read straight from the
+    mapping, so long sessions play without loading them into memory.
+    """
+
+    def __init__(self, arm, recording, speed=1.0, loop=False, rate=SERVO_RATE):
+        if recording.meta["joints"] != arm.ids:
+            raise ValueError(f"Recording was made with joints {recording.meta['joints']}")
+        self.arm = arm
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.rate = rate
+        self.playhead = 0.0
+        self.index = 0
+        self.approach = None
+
+    def start(self):
+        """Plan the move to the row under the playhead; joints it has off stay put"""
+        if not len(self.recording):
+            return
+        row = np.asarray(self.recording.command[self.index])
+        first = np.where(row > 0, row, self.arm.position)
+        self.approach = plan_move(self.arm, first, rate=self.rate)
+
+    @property
+    def done(self):
+        return not self.loop and self.approach is None and self.playhead > self.recording.duration
+
+    def seek(self, seconds):
+        self.playhead = min(max(0.0, seconds), self.recording.duration)
+        self.index = self.recording.index_at(self.playhead)
+
+    def tick(self):
+        """Output the row under the playhead and advance it; returns False when finished"""
+        if not len(self.recording) or self.done:
+            return False
+        if self.approach is not None:
+            row = self.approach.next()
+            if row is not None:
+                self.arm.set_pulse_array(row)
+                return True
+            self.approach = None
+
+        duration = self.recording.duration
+        if self.playhead > duration:
+            self.seek(self.playhead % duration if duration else 0.0)
+
+        # Rows are in time order, so only step forward from the last one
+        times = self.recording.host_time
+        target = times[0] + self.playhead
+        while self.index + 1 < len(self.recording) and times[self.index + 1] <= target:
+            self.index += 1
+        self.arm.set_pulse_array(self.recording.command[self.index])
+        self.playhead += self.speed / self.rate
+        return True
+
+    def run(self):
+        """Move to the playhead and play at the control rate, blocking until done (or forever when looping)"""
+        self.start()
+        scheduler = Scheduler()
+
+        def output():
+            if not self.tick():
+                scheduler.stop()
+
+        scheduler.add("playback", self.rate, output)
+        scheduler.run()
+        return scheduler
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: recording.py <recording> [speed] [start seconds] [loop]")
+        return
+    recording = Recording(sys.argv[1])
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    start = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    loop = len(sys.argv) > 4 and sys.argv[4] == "loop"
+    print(f"{len(recording)} rows, {recording.duration:.1f}s, recorded {recording.meta['created']}")
+
+    pico = None
+    arm = None
+    try:
+        signal.signal(signal.SIGINT, signal_handler)
+        pico = picod.pico()
+        if not pico.connected:
+            raise Exception("Failed to connect to Pico")
+
+        arm = Arm(pico)
+        player = RecordingPlayer(arm, recording, speed=speed, loop=loop)
+        player.seek(start)
+        scheduler = player.run()
+        print(scheduler.report())
+
+    except GracefulExit:
+        print("\nReceived Ctrl+C, shutting down gracefully...")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        if arm:
+            arm.off()
+        if pico:
+            pico.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import time
+import bisect
+import numpy as np
+
+SERVO_RATE = 50  # tx_servo's default frequency, one setpoint per PWM period
+
+# Lateness histogram bin edges in µs, the last bin collects everything above
+JITTER_BINS_US = (0, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+
+class Task:
+    """A function run at a fixed rate with deadline and jitter accounting"""
+
+    __slots__ = ("name", "func", "period", "deadline", "runs", "overruns",
+                 "skipped", "late_max", "late_total", "histogram")
+
+    def __init__(self, name, rate, func, start):
+        self.name = name
+        self.func = func
+        self.period = 1.0 / rate
+        self.deadline = start
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.late_max = 0.0
+        self.late_total = 0.0
+        self.histogram = [0] * len(JITTER_BINS_US)
+
+    def record(self, late):
+        self.runs += 1
+        self.late_total += late
+        self.late_max = max(self.late_max, late)
+        self.histogram[bisect.bisect_right(JITTER_BINS_US, late * 1e6) - 1] += 1
+
+class Scheduler:
+    """Runs registered tasks at fixed rates against absolute deadlines
+
+    Each task's deadlines are start + n * period, so the rate does not
+    drift with the time the tasks take.  A task that finishes after its
+    next deadline counts an overrun; whole periods missed are skipped
+    rather than run back to back.  The last `spin` seconds before a
+    deadline are busy-waited to avoid the host's sleep granularity.
+    """
+
+    def __init__(self, spin=0.0005, clock=time.perf_counter, sleep=time.sleep):
+        self.tasks = []
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.running = False
+
+    def add(self, name, rate, func):
+        task = Task(name, rate, func, self.clock())
+        self.tasks.append(task)
+        return task
+
+    def remove(self, name):
+        self.tasks = [t for t in self.tasks if t.name != name]
+
+    def wait_until(self, deadline):
+        remaining = deadline - self.clock()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        while self.clock() < deadline:
+            pass
+
+    def run_once(self):
+        """Wait for the next due task and run it"""
+        task = min(self.tasks, key=lambda t: t.deadline)
+        self.wait_until(task.deadline)
+
+        start = self.clock()
+        task.record(start - task.deadline)
+        task.func()
+        end = self.clock()
+
+        task.deadline += task.period
+        if end > task.deadline:
+            task.overruns += 1
+            missed = int((end - task.deadline) / task.period)
+            if missed:
+                task.skipped += missed
+                task.deadline += missed * task.period
+
+    def run(self):
+        self.running = True
+        while self.running and self.tasks:
+            self.run_once()
+
+    def stop(self):
+        self.running = False
+
+    def histogram(self, name):
+        """Return (counts, bin edges in µs) of a task's start lateness"""
+        for task in self.tasks:
+            if task.name == name:
+                return np.array(task.histogram), np.array(JITTER_BINS_US + (np.inf,))
+        raise KeyError(name)
+
+    def stats(self):
+        """Per-task counters keyed by task name"""
+        return {
+            t.name: {
+                "rate": 1.0 / t.period,
+                "runs": t.runs,
+                "overruns": t.overruns,
+                "skipped": t.skipped,
+                "late_mean_us": t.late_total / t.runs * 1e6 if t.runs else 0.0,
+                "late_max_us": t.late_max * 1e6,
+                "histogram": list(t.histogram),
+            }
+            for t in self.tasks
+        }
+
+    def report(self):
+        """Human readable summary of every task's timing"""
+        lines = []
+        for name, s in self.stats().items():
+            lines.append(f"{name}: {s['rate']:.0f}Hz runs={s['runs']} overruns={s['overruns']} "
+                         f"skipped={s['skipped']} late mean={s['late_mean_us']:.0f}µs "
+                         f"max={s['late_max_us']:.0f}µs")
+            edges = JITTER_BINS_US
+            for i, count in enumerate(s["histogram"]):
+                if count:
+                    upper = f"{edges[i + 1]}µs" if i + 1 < len(edges) else "inf"
+                    lines.append(f"    {edges[i]:>6}µs - {upper:>8}: {count}")
+        return "\n".join(lines)
@@ -2,6 +2,7 @@ import time
 import picod
 import sys
 import signal
+from arm import Arm
 
 class GracefulExit(Exception):
     pass
@@ -15,8 +16,8 @@ class PWMTester:
         if not self.pico.connected:
             raise Exception("Failed to connect to Pico")
         
-        # Using only pin 7 for testing
-        self.test_pin = 5
+        # Using only the wrist servo's pin for testing
+        self.test_pin = Arm(self.pico).joint(5).pin
         print(f"Initialized PWM tester on pin {self.test_pin}")
         
         # Test positions
@@ -0,0 +1,216 @@
+import time
+import sys
+import json
+import signal
+import numpy as np
+import picod
+from pwm_monitor import PwmMonitor
+from arm import Arm
+
+CORRECTIONS_FILE = "servo_corrections.json"
+
+class GracefulExit(Exception):
+    pass
+
+def signal_handler(signum, frame):
+    raise GracefulExit()
+
+def quantized_pulse(pulsewidth, frequency=50):
+    """Pulse width the Pico can actually produce for a commanded width"""
+    div, steps, _ = picod._servo_raw(0, frequency)
+    micros = 1e6 * steps * div / picod.CLOCK_HZ
+    widths = np.asarray(pulsewidth, dtype=float)
+    high = [picod._servo_raw(width, frequency)[2] for width in widths.ravel()]
+    return np.reshape(high, widths.shape) * micros / steps
+
+class CorrectionTable:
+    """Maps wanted pulse widths to the widths to command, per joint"""
+
+    def __init__(self, table=None):
+        self.table = table or {}
+
+    @classmethod
+    def load(cls, path=CORRECTIONS_FILE):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path=CORRECTIONS_FILE):
+        with open(path, "w") as f:
+            json.dump(self.table, f, indent=2)
+
+    def add(self, joint, commanded, measured):
+        commanded = np.asarray(commanded, dtype=float)
+        measured = np.asarray(measured, dtype=float)
+        ok = ~np.isnan(measured)
+        order = np.argsort(measured[ok])
+        self.table[str(joint)] = {
+            "commanded": commanded[ok][order].tolist(),
+            "measured": measured[ok][order].tolist(),
+        }
+
+    def apply(self, joint, pulsewidth):
+        """Width to command so the joint measures `pulsewidth`"""
+        entry = self.table.get(str(joint))
+        if not entry or not entry["measured"]:
+            return pulsewidth
+        return np.interp(pulsewidth, entry["measured"], entry["commanded"])
+
+class ServoVerifier:
+    """Sweeps servo outputs and measures them on looped-back odd GPIO
+
+    `loopbacks` maps an arm joint id to the odd GPIO wired to that
+    joint's servo pin.  All joints are swept at the same time.
+    """
+
+    def __init__(self, arm, loopbacks, steps=9, settle=0.3, period=0.04,
+                 tolerance=10, poll=0.001):
+        self.arm = arm
+        self.joints = list(loopbacks)
+        self.indices = [arm.index(j) for j in self.joints]
+        self.pins = arm.pins[self.indices].tolist()
+        self.steps = steps
+        self.settle = settle
+        self.period = period
+        self.poll = poll
+        self.tolerance = tolerance
+        self.frequency = arm.frequency
+        self.monitor = PwmMonitor(arm.pico, [loopbacks[j] for j in self.joints],
+                                  window=max(1, int(settle / period)),
+                                  frequency=arm.frequency)
+
+    def sweep_points(self):
+        """Pulse widths to visit, one column per joint"""
+        lo = self.arm.min[self.indices]
+        hi = self.arm.max[self.indices]
+        return np.linspace(lo, hi, self.steps).round()
+
+    def command(self, widths):
+        """Send every joint's pulse width in one message"""
+        self.arm.set_pulses(dict(zip(self.joints, widths)))
+
+    def wait_for(self, expected, sent):
+        """Poll the pins until each shows a whole pulse of its expected width
+
+        Returns each joint's latency, from `sent` to the rising edge of
+        its first pulse of the new width (NaN if none came within
+        `settle`).  Each poll returns the high time since the previous
+        one, so a pulse split across polls is summed back together, and
+        its rising edge is placed between the previous poll and the
+        latest moment it can have started.
+        """
+        n = len(self.joints)
+        latency = np.full(n, np.nan)
+        pulse = np.zeros(n)  # high time of the pulse being seen
+        edge = np.zeros(n)  # and when it started
+        whole = np.zeros(n, dtype=bool)  # it started after a poll saw the pin low
+        low = np.zeros(n, dtype=bool)
+        before = 0.0
+        while np.isnan(latency).any() and before < self.settle:
+            high = np.nan_to_num(self.monitor.high_times())
+            now = time.perf_counter() - sent
+            rising = (high > 0) & (pulse == 0)
+            edge[rising] = (before + np.maximum(before, now - high[rising] * 1e-6)) / 2
+            whole[rising] = low[rising]
+            pulse += high
+            ended = (high == 0) & (pulse > 0)
+            arrived = ended & whole & np.isnan(latency) & (np.abs(pulse - expected) <= self.tolerance)
+            latency[arrived] = edge[arrived]
+            pulse[ended] = 0
+            low |= high == 0
+            before = now
+            time.sleep(self.poll)
+        return latency
+
+    def measure_step(self, widths):
+        """Command one sweep point, returning measured widths, jitter and latency
+
+        The statistics only start once every joint has shown its new
+        width, so no sample straddles the change.
+        """
+        expected = quantized_pulse(widths, self.frequency)
+
+        self.monitor.high_times()  # restart the sampling interval
+        sent = time.perf_counter()
+        self.command(widths)
+        latency = self.wait_for(expected, sent)
+
+        self.monitor.clear()
+        for _ in range(self.monitor.window):
+            time.sleep(self.period)
+            self.monitor.read()
+
+        return self.monitor.pulse_widths(), self.monitor.pulse_widths(self.monitor.std()), latency
+
+    def run(self):
+        """Run the sweep, returning a report dict keyed by joint id"""
+        points = self.sweep_points()
+        measured = np.empty_like(points, dtype=float)
+        jitter = np.empty_like(measured)
+        latency = np.empty_like(measured)
+
+        for i, widths in enumerate(points):
+            measured[i], jitter[i], latency[i] = self.measure_step(widths)
+
+        quantized = quantized_pulse(points, self.frequency)
+        report = {}
+        for k, joint in enumerate(self.joints):
+            report[joint] = {
+                "commanded": points[:, k],
+                "measured": measured[:, k],
+                "quantization_error": quantized[:, k] - points[:, k],
+                "error": measured[:, k] - points[:, k],
+                "jitter": jitter[:, k],
+                "latency": latency[:, k],
+            }
+        return report
+
+def print_report(arm, report):
+    for joint, r in report.items():
+        print(f"\n{arm.joint(joint).name} (pin {arm.joint(joint).pin}):")
+        print("  commanded  measured   quant.err  error   jitter  latency")
+        for row in zip(r["commanded"], r["measured"], r["quantization_error"],
+                       r["error"], r["jitter"], r["latency"]):
+            print("  {:7.0f}µs {:8.1f}µs {:7.2f}µs {:6.1f}µs {:5.1f}µs {:6.1f}ms".format(
+                *row[:5], row[5] * 1000))
+
+def main():
+    # Arguments are joint:gpio pairs, e.g. 1:17 2:19
+    loopbacks = {}
+    for arg in sys.argv[1:]:
+        joint, gpio = arg.split(":")
+        loopbacks[int(joint)] = int(gpio)
+    if not loopbacks:
+        print("Usage: python servo_verify.py JOINT:GPIO [JOINT:GPIO ...]")
+        print("  GPIO is the odd GPIO looped back from the joint's servo pin")
+        return
+
+    pico = None
+    verifier = None
+    try:
+        signal.signal(signal.SIGINT, signal_handler)
+        pico = picod.pico()
+        if not pico.connected:
+            raise Exception("Failed to connect to Pico")
+
+        verifier = ServoVerifier(Arm(pico), loopbacks)
+        report = verifier.run()
+        print_report(verifier.arm, report)
+
+        table = CorrectionTable()
+        for joint, r in report.items():
+            table.add(joint, r["commanded"], r["measured"])
+        table.save()
+        print(f"\nCorrection table written to {CORRECTIONS_FILE}")
+
+    except GracefulExit:
+        print("\nReceived Ctrl+C, shutting down gracefully...")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        if pico:
+            if verifier:
+                verifier.arm.off()
+            pico.close()
+
+if __name__ == "__main__":
+    main()
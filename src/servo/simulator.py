@@ -0,0 +1,283 @@
+import sys
+import time
+from collections import deque
+import numpy as np
+import picod
+from arm import Arm, load_config
+from kinematics import Kinematics
+from estimator import servo_response
+from scheduler import SERVO_RATE
+from trajectory import plan_move
+from ik import IKSolver
+from patterns import compile_patterns, PatternPlayer
+
+# Physics step of the servo model, seconds
+PHYSICS_DT = 0.001
+
+class SimulatedPico:
+    """Stands in for picod.pico, handing servo outputs to a Simulator
+
+    Only the calls the arm scripts make are provided.  Every request
+    succeeds; requests that ask for no reply return STATUS_NO_REPLY as
+    the real connection does.
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.connected = True
+        self.messages = 0
+
+    def _status(self, reply, flush):
+        if reply == picod.REPLY_NOW or flush:
+            self.messages += 1
+        return picod.STATUS_OKAY if reply == picod.REPLY_NOW else picod.STATUS_NO_REPLY
+
+    def tx_servo(self, gpioAB, pulsewidth, frequency=50, reply=picod.REPLY_NOW, flush=True):
+        assert pulsewidth == 0 or 500 <= pulsewidth <= 2500
+        self.simulator.command(gpioAB, pulsewidth)
+        return self._status(reply, flush)
+
+    def stop_all_outputs(self, gpios=None):
+        for gpio in self.simulator._pin_index if gpios is None else gpios:
+            self.simulator.command(gpio, 0)
+        self.messages += 1
+        return picod.STATUS_OKAY, 0.0, 0.0
+
+    def sequence(self):
+        return _SimulatedSequence(self)
+
+    def tick(self, reply=picod.REPLY_NOW, flush=True):
+        return self._status(reply, flush), int(self.simulator.time * 1e6) & 0xFFFFFFFF
+
+    def close(self):
+        self.connected = False
+
+class _SimulatedSequence:
+    """A picod sequence for the simulator: servo outputs are kept, the rest ignored"""
+
+    def __init__(self, pico):
+        self.pico = pico
+        self.servos = []
+
+    def GPIO_set_functions(self, GPIO, FUNCS):
+        return self
+
+    def GPIO_set_pulls(self, GPIO, PULLS):
+        return self
+
+    def tx_servo(self, gpioAB, pulsewidth, frequency=50):
+        self.servos.append((gpioAB, pulsewidth))
+        return self
+
+    def run(self):
+        for gpio, width in self.servos:
+            self.pico.simulator.command(gpio, width)
+        self.pico.messages += 1
+
+class Simulator:
+    """Headless model of the arm's servos, driven by the arm's own commands
+
+    `arm` is a normal Arm talking to a SimulatedPico, so the control
+    stack runs unchanged.  A command reaches its servo `latency` seconds
+    after it is sent, at the start of the next PWM frame.  Each servo
+    then follows it as estimator.servo_response models, with the lag and
+    deadband of its type.  Joints with their output off hold where they
+    are.
+
+    Simulated time only advances in `advance` and `run`, so runs go as
+    fast as the host allows.  The commanded and simulated widths of every
+    physics step are kept for the last `history` seconds for `tracking`.
+    """
+
+    def __init__(self, config=None, kinematics=None, dt=PHYSICS_DT, latency=0.0015, history=60.0):
+        if config is None:
+            config = load_config()
+        self.pico = SimulatedPico(self)
+        self.arm = Arm(self.pico, config)
+        self.kinematics = kinematics or Kinematics.from_config(config)
+        self.dt = dt
+        self.latency = latency
+        self.frame = 1.0 / self.arm.frequency
+
+        self._pin_index = {int(pin): i for i, pin in enumerate(self.arm.pins)}
+
+        self.time = 0.0
+        self.actual = self.arm.home.astype(float)  # µs the servos are at
+        self.target = self.actual.copy()  # µs the servos are driving to
+        self.powered = np.zeros(len(self.arm), dtype=bool)
+        self.commanded = np.full(len(self.arm), np.nan)  # last width sent, NaN while off
+        self._pending = deque()
+        self.subscribers = []
+
+        n = max(1, int(history / dt))
+        self._times = np.zeros(n)
+        self._commands = np.zeros((n, len(self.arm)))
+        self._actuals = np.zeros((n, len(self.arm)))
+        self._count = 0
+
+    def command(self, gpio, width):
+        """Take a servo output change sent now (called by SimulatedPico)"""
+        i = self._pin_index.get(gpio)
+        if i is None:
+            return
+        self.commanded[i] = width if width else np.nan
+        due = np.ceil((self.time + self.latency) / self.frame - 1e-9) * self.frame
+        self._pending.append((due, i, width))
+
+    def subscribe(self, func):
+        """Call func(time, angles, poses) after every control tick of `run`"""
+        self.subscribers.append(func)
+
+    def angles(self):
+        """Simulated joint angles in radians"""
+        return self.arm.pulse_to_angle(self.actual)
+
+    def poses(self):
+        """Simulated poses of the base, every link frame and the tool, (joints + 2, 4, 4)"""
+        return self.kinematics.forward_all(self.angles())[0]
+
+    def step(self):
+        """Advance the servo model by one physics step"""
+        while self._pending and self._pending[0][0] <= self.time:
+            _, i, width = self._pending.popleft()
+            self.powered[i] = width != 0
+            if width:
+                self.target[i] = width
+
+        moved = servo_response(self.actual, self.target, self.dt,
+                               self.arm.lag, self.arm.vmax, self.arm.deadband)
+        self.actual = np.where(self.powered, moved, self.actual)
+        self.time += self.dt
+
+        k = self._count % len(self._times)
+        self._times[k] = self.time
+        self._commands[k] = self.commanded
+        self._actuals[k] = self.actual
+        self._count += 1
+
+    def advance(self, seconds):
+        for _ in range(int(round(seconds / self.dt))):
+            self.step()
+
+    def run(self, tick, duration=None, rate=SERVO_RATE, settle=0.5, realtime=False):
+        """Call `tick` at `rate` in simulated time, stepping the servos in between
+
+        Stops when `tick` returns None or False, or after `duration`
+        seconds, then lets the servos settle for `settle` seconds.  With
+        `realtime` each tick waits for the wall clock, for use with a UI;
+        otherwise the run takes only as long as the computation.
+        """
+        period = 1.0 / rate
+        ticks = np.inf if duration is None else int(round(duration * rate))
+        start = time.perf_counter()
+        n = 0
+        while n < ticks:
+            if realtime:
+                delay = start + n * period - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            result = tick()
+            if result is None or result is False:
+                break
+            self.advance(period)
+            n += 1
+            if self.subscribers:
+                angles = self.angles()
+                poses = self.poses()
+                for func in self.subscribers:
+                    func(self.time, angles, poses)
+        self.advance(settle)
+        return n / rate
+
+    def reset_stats(self):
+        self._count = 0
+
+    def history(self):
+        """(times, commanded, simulated) widths of every stored step, oldest first"""
+        n = min(self._count, len(self._times))
+        order = (np.arange(self._count - n, self._count)) % len(self._times)
+        return self._times[order], self._commands[order], self._actuals[order]
+
+    def tracking(self, max_latency=0.3):
+        """Tracking error and latency of the simulated arm against its commands
+
+        Errors compare the simulated widths with the last width sent at
+        the same moment, so they include the transport and servo delays.
+        The latency is the delay that best lines the simulated motion up
+        with the commands.  Joints that were never driven are left out.
+        """
+        times, commanded, actual = self.history()
+        driven = ~np.isnan(commanded)
+        joints = driven.any(axis=0)
+        if not len(times) or not joints.any():
+            return None
+
+        degrees = np.where(driven, np.abs(actual - commanded) / np.abs(self.arm.us_per_degree), np.nan)
+        rms = np.sqrt(np.nanmean(degrees[:, joints] ** 2, axis=0))
+        peak = np.nanmax(degrees[:, joints], axis=0)
+
+        rows = driven.all(axis=1)
+        tip = np.zeros(0)
+        if rows.any():
+            q = self.arm.pulse_to_angle(np.stack([commanded[rows], actual[rows]]))
+            ends = self.kinematics.positions(q.reshape(-1, len(self.arm))).reshape(2, -1, 3)
+            tip = np.linalg.norm(ends[0] - ends[1], axis=1) * 1000
+
+        # Shift the commands later step by step and keep the best fit
+        filled = np.where(driven, commanded, actual)
+        costs = []
+        for k in range(min(int(max_latency / self.dt), len(times) - 1) + 1):
+            diff = actual[k:, joints] - filled[:len(times) - k, joints]
+            costs.append(np.mean(diff ** 2))
+        latency = int(np.argmin(costs)) * self.dt
+
+        return {
+            "duration": float(times[-1] - times[0]) if len(times) > 1 else 0.0,
+            "joints": [self.arm.names[i] for i in np.flatnonzero(joints)],
+            "rms_deg": rms,
+            "max_deg": peak,
+            "tip_rms_mm": float(np.sqrt(np.mean(tip ** 2))) if len(tip) else np.nan,
+            "tip_max_mm": float(tip.max()) if len(tip) else np.nan,
+            "latency": latency,
+        }
+
+    def report(self):
+        stats = self.tracking()
+        if stats is None:
+            return "no commands"
+        lines = [f"{stats['duration']:.1f}s simulated, latency {stats['latency'] * 1000:.0f}ms, "
+                 f"tip error rms {stats['tip_rms_mm']:.1f}mm max {stats['tip_max_mm']:.1f}mm"]
+        for name, rms, peak in zip(stats["joints"], stats["rms_deg"], stats["max_deg"]):
+            lines.append(f"    {name:<8} rms {rms:5.1f}°  max {peak:5.1f}°")
+        return "\n".join(lines)
+
+def main():
+    """Run every demo pattern through the simulated arm and report how well it follows"""
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    sim = Simulator()
+    arm = sim.arm
+    arm.set_pulse_array(arm.home)
+    sim.advance(1.0)
+
+    def follow(trajectory):
+        row = trajectory.next()
+        if row is not None:
+            arm.set_pulse_array(row)
+        return row
+
+    patterns = compile_patterns(arm, solver=IKSolver.from_arm(arm))
+    for name, pattern in patterns.items():
+        home = plan_move(arm, arm.home)
+        sim.run(lambda: follow(home))
+        player = PatternPlayer(arm, pattern)
+        player.start()
+        sim.reset_stats()
+        start = time.perf_counter()
+        simulated = sim.run(player.tick, duration=seconds)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {simulated:.1f}s in {elapsed:.2f}s ({simulated / elapsed:.0f}x real time)")
+        print(sim.report())
+    arm.off()
+
+if __name__ == "__main__":
+    main()
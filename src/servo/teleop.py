@@ -0,0 +1,447 @@
+import sys
+import json
+import time
+import socket
+import struct
+import signal
+import threading
+import numpy as np
+import picod
+from arm import Arm
+from scheduler import Scheduler, SERVO_RATE
+from ik import IKSolver
+from estimator import PositionEstimator
+from power import PowerScheduler
+from bringup import bring_up, park
+
+TELEOP_PORT = 9870
+WEBSOCKET_PORT = 9871
+
+# UDP packet: magic, sequence number, sender clock in µs, wrist position
+# x, y, z in metres, wrist orientation quaternion w, x, y, z, and pinch
+# from 0 (open) to 1 (closed), all in the headset's world frame
+PACKET = struct.Struct("<4sIQ3f4ff")
+MAGIC = b"OCTP"
+
+# Headset world axes (x right, y up, -z forward, as visionOS reports them)
+# expressed in the arm's base frame (x forward, y left, z up)
+HEADSET_TO_BASE = np.array([[0.0, 0.0, -1.0],
+                            [-1.0, 0.0, 0.0],
+                            [0.0, 1.0, 0.0]])
+
+# A sample this old is stale: the arm holds rather than chase it
+STALE = 0.2
+
+# With nothing accepted for this long any sequence number is taken, so a
+# restarted sender counting from 0 is not dropped as old
+RESYNC = 1.0
+
+class GracefulExit(Exception):
+    pass
+
+def signal_handler(signum, frame):
+    raise GracefulExit()
+
+class PoseSample:
+    """One wrist pose from the headset"""
+
+    __slots__ = ("seq", "sent", "received", "position", "orientation", "pinch")
+
+    def __init__(self, seq, sent, received, position, orientation, pinch):
+        self.seq = seq
+        self.sent = sent  # sender's clock, µs
+        self.received = received  # time.perf_counter() on arrival
+        self.position = position
+        self.orientation = orientation
+        self.pinch = pinch
+
+def encode(seq, position, orientation=(1.0, 0.0, 0.0, 0.0), pinch=0.0, sent=None):
+    """A UDP packet carrying one wrist pose"""
+    if sent is None:
+        sent = int(time.perf_counter() * 1e6)
+    return PACKET.pack(MAGIC, seq & 0xFFFFFFFF, sent & 0xFFFFFFFFFFFFFFFF,
+                       *position, *orientation, pinch)
+
+def decode(data, received=None):
+    """The PoseSample in a UDP packet or a JSON text message
+
+    JSON messages carry the same fields: {"seq", "t" (µs), "position",
+    "orientation", "pinch"}; orientation and pinch are optional.
+    """
+    if received is None:
+        received = time.perf_counter()
+    if data[:1] == b"{":
+        message = json.loads(data)
+        try:
+            position = np.array(message["position"], dtype=float).reshape(3)
+            orientation = np.array(message.get("orientation", (1, 0, 0, 0)), dtype=float).reshape(4)
+            return PoseSample(int(message["seq"]) & 0xFFFFFFFF, int(message.get("t", 0)), received,
+                              position, orientation, float(message.get("pinch", 0.0)))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Bad pose message: {e}")
+    if len(data) != PACKET.size:
+        raise ValueError(f"Pose packet of {len(data)} bytes, expected {PACKET.size}")
+    fields = PACKET.unpack(data)
+    if fields[0] != MAGIC:
+        raise ValueError("Not a pose packet")
+    return PoseSample(fields[1], fields[2], received, np.array(fields[3:6]),
+                      np.array(fields[6:10]), fields[10])
+
+class Mailbox:
+    """Holds only the latest pose sample; the control loop takes it each tick
+
+    Nothing queues, and neither side takes a lock: `put` swaps the new
+    sample in with one reference assignment, which is atomic in CPython,
+    so `take` sees either the previous sample or the new one whole.  A
+    burst of samples between two ticks just overwrites the slot.
+
+    A sample is dropped unless its 32 bit sequence number is newer than
+    the held one's (compared modulo 2^32, so it may wrap), except after
+    `resync` seconds without one.  With two receivers putting at the same
+    moment the older of the two can win, until the next sample.
+    """
+
+    def __init__(self, resync=RESYNC, clock=time.perf_counter):
+        self.resync = resync
+        self.clock = clock
+        self._sample = None
+        self._taken = None
+        self.accepted = 0
+        self.dropped = 0  # older than the sample held
+        self.skipped = 0  # overwritten before the control loop took them
+
+    def put(self, sample):
+        current = self._sample
+        if current is not None and sample.received - current.received < self.resync:
+            if not 0 < (sample.seq - current.seq) & 0xFFFFFFFF < 1 << 31:
+                self.dropped += 1
+                return False
+            if current is not self._taken:
+                self.skipped += 1
+        self._sample = sample
+        self.accepted += 1
+        return True
+
+    def take(self, max_age=STALE):
+        """The latest sample if it was not taken before and is not stale, else None"""
+        sample = self._sample
+        if sample is None or sample is self._taken or self.clock() - sample.received > max_age:
+            return None
+        self._taken = sample
+        return sample
+
+    def age(self):
+        """Seconds since the latest sample arrived, inf if none has"""
+        sample = self._sample
+        return np.inf if sample is None else self.clock() - sample.received
+
+class TeleopServer:
+    """Receives wrist poses over UDP, and WebSocket if started, into a Mailbox
+
+    Each receiver is a daemon thread blocked in its read, so a sample is
+    decoded and posted the moment it arrives, and the control loop never
+    waits on the network.  Packets that do not decode are counted in
+    `malformed` and ignored.
+    """
+
+    def __init__(self, mailbox=None, host="0.0.0.0", port=TELEOP_PORT):
+        self.mailbox = Mailbox() if mailbox is None else mailbox
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.malformed = 0
+        self.running = False
+        self._threads = []
+        self._socket = None
+        self._loop = None
+        self._stopped = None
+
+    def _receive(self, data, received):
+        self.received += 1
+        try:
+            sample = decode(data, received)
+        except ValueError:
+            self.malformed += 1
+            return
+        self.mailbox.put(sample)
+
+    def start(self):
+        """Start the UDP receiver; returns the port bound (useful with port 0)"""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.settimeout(0.2)
+        self.port = self._socket.getsockname()[1]
+        self.running = True
+        self._start_thread(self._udp_loop, "teleop-udp")
+        return self.port
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _udp_loop(self):
+        while self.running:
+            try:
+                data = self._socket.recv(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self._receive(data, time.perf_counter())
+
+    def start_websocket(self, port=WEBSOCKET_PORT):
+        """Also accept samples as WebSocket messages (needs the websockets package)"""
+        import asyncio
+        import websockets
+
+        self._loop = asyncio.new_event_loop()
+        self._stopped = self._loop.create_future()
+
+        async def handle(connection):
+            async for message in connection:
+                received = time.perf_counter()
+                if isinstance(message, str):
+                    message = message.encode()
+                self._receive(message, received)
+
+        async def serve():
+            async with websockets.serve(handle, self.host, port):
+                await self._stopped
+
+        self.running = True
+        self._start_thread(lambda: self._loop.run_until_complete(serve()), "teleop-ws")
+
+    def stop(self):
+        self.running = False
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set_result, None)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def report(self):
+        m = self.mailbox
+        return (f"{self.received} received, {m.accepted} accepted, {m.dropped} out of order, "
+                f"{m.skipped} superseded between ticks, {self.malformed} malformed")
+
+class TeleopFollower:
+    """Drives the tool to follow the headset wrist, one step per control tick
+
+    The wrist's motion is turned into the base frame, scaled, and added
+    to where the tool was when following started, so the operator can
+    begin from any comfortable pose.  Each fresh sample is solved by IK,
+    warm-started from the current joints, and every tick moves the
+    joints toward the solution no faster than their servos.  Targets
+    just outside the workspace are followed to the nearest pose IK finds
+    within `slack` metres; further ones are skipped.  Once the samples
+    go stale the arm holds, and the next fresh sample anchors the
+    mapping again.
+
+    Orientation and pinch are received but not used: the arm keeps its
+    approach pitch, and has no gripper.
+    """
+
+    def __init__(self, arm, mailbox, solver=None, scale=1.0, rate=SERVO_RATE, max_age=STALE,
+                 slack=0.02):
+        self.arm = arm
+        self.mailbox = mailbox
+        self.solver = IKSolver.from_arm(arm) if solver is None else solver
+        self.scale = scale
+        self.max_age = max_age
+        self.slack = slack
+        self.max_step = arm.vmax / rate
+        self.anchor = None  # (wrist, tool) base frame positions following started from
+        self.target = None
+        self.inexact = 0
+        self.unreachable = 0
+        self.samples = 0
+        self.delay_total = 0.0
+        self.delay_max = 0.0
+
+    def _retarget(self, sample):
+        wrist = HEADSET_TO_BASE @ sample.position
+        if self.anchor is None:
+            q = self.arm.pulse_to_angle(self.arm.estimated_position())
+            self.anchor = (wrist, self.solver.kin.positions(q)[0])
+        goal = self.anchor[1] + self.scale * (wrist - self.anchor[0])
+        pulses, ok, error = self.solver.solve_pulses(self.arm, goal[None])
+        if ok[0]:
+            self.target = pulses[0]
+        elif error[0] <= self.slack:
+            self.target = pulses[0]
+            self.inexact += 1
+        else:
+            self.unreachable += 1
+
+        # Arrival to solved target: the host's share of the teleop latency
+        delay = time.perf_counter() - sample.received
+        self.samples += 1
+        self.delay_total += delay
+        self.delay_max = max(self.delay_max, delay)
+
+    def tick(self):
+        """Take the newest sample and step toward it; always True, for Simulator.run"""
+        sample = self.mailbox.take(self.max_age)
+        if sample is not None:
+            self._retarget(sample)
+        elif self.mailbox.age() > self.max_age:
+            self.anchor = None
+            self.target = None
+
+        if self.target is not None:
+            step = np.clip(self.target - self.arm.position, -self.max_step, self.max_step)
+            self.arm.set_pulse_array(self.arm.position + np.rint(step))
+        return True
+
+    def report(self):
+        if not self.samples:
+            return "no samples followed"
+        return (f"{self.samples} samples, {self.inexact} followed to the nearest pose, "
+                f"{self.unreachable} out of reach, "
+                f"arrival to target {self.delay_total / self.samples * 1000:.2f}ms mean "
+                f"{self.delay_max * 1000:.2f}ms max")
+
+class FakeSender:
+    """Streams a wrist circling in front of the headset, for testing without one
+
+    Packets go out at `rate` on absolute deadlines.  A `drop` fraction
+    is never sent and a `reorder` fraction is held back and sent after
+    the next packet, to exercise the mailbox.
+    """
+
+    def __init__(self, host="127.0.0.1", port=TELEOP_PORT, rate=90.0, radius=0.05, period=4.0,
+                 drop=0.0, reorder=0.0, seed=0):
+        self.address = (host, port)
+        self.rate = rate
+        self.radius = radius
+        self.period = period
+        self.drop = drop
+        self.reorder = reorder
+        self.random = np.random.default_rng(seed)
+        self.sent = 0
+        self.running = False
+        self._thread = None
+
+    def pose(self, t):
+        """Wrist position in the headset frame at `t` seconds: a circle facing the user"""
+        angle = 2 * np.pi * t / self.period
+        return (self.radius * np.cos(angle), 1.2 + self.radius * np.sin(angle), -0.4)
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="teleop-fake", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        start = time.perf_counter()
+        held = None
+        seq = 0
+        while self.running:
+            due = start + seq / self.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            packet = encode(seq, self.pose(seq / self.rate))
+            seq += 1
+            if self.random.random() < self.drop:
+                continue
+            if held is None and self.random.random() < self.reorder:
+                held = packet
+                continue
+            sock.sendto(packet, self.address)
+            self.sent += 1
+            if held is not None:
+                sock.sendto(held, self.address)
+                self.sent += 1
+                held = None
+        sock.close()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join()
+
+# Joint angles of a pose with room to move every way; home is at the edge
+# of the workspace
+FAKE_START = (0.0, -0.47, -0.46, -0.3, 0.0)
+
+def run_fake(seconds=10.0):
+    """Follow a fake sender with the simulated arm and report how it went"""
+    from simulator import Simulator
+
+    sim = Simulator()
+    arm = sim.arm
+    arm.set_pulse_array(arm.angle_to_pulse(np.array(FAKE_START)))
+    sim.advance(1.0)
+
+    server = TeleopServer(host="127.0.0.1", port=0)
+    port = server.start()
+    sender = FakeSender(port=port, radius=0.03, drop=0.02, reorder=0.05)
+    follower = TeleopFollower(arm, server.mailbox)
+    sender.start()
+    try:
+        sim.reset_stats()
+        sim.run(follower.tick, duration=seconds, realtime=True)
+    finally:
+        sender.stop()
+        server.stop()
+    print(f"{sender.sent} sent at {sender.rate:.0f}Hz; {server.report()}")
+    print(follower.report())
+    print(sim.report())
+
+def main():
+    args = sys.argv[1:]
+    if "fake" in args:
+        run_fake()
+        return
+
+    pico = None
+    arm = None
+    server = None
+    scheduler = Scheduler()
+    try:
+        signal.signal(signal.SIGINT, signal_handler)
+        pico = picod.pico()
+        if not pico.connected:
+            raise Exception("Failed to connect to Pico")
+        pico.coalesce()
+
+        arm = Arm(pico)
+        arm.estimator = PositionEstimator(arm)
+        arm.power = PowerScheduler(arm)
+        bring_up(arm)
+
+        server = TeleopServer()
+        server.start()
+        if "ws" in args:
+            server.start_websocket()
+        print(f"Listening for poses on UDP port {server.port}"
+              + (f" and WebSocket port {WEBSOCKET_PORT}" if "ws" in args else ""))
+
+        follower = TeleopFollower(arm, server.mailbox)
+        scheduler.add("teleop", SERVO_RATE, follower.tick)
+        scheduler.add("status", 1, lambda: print(f"\r{server.report()}", end="", flush=True))
+        scheduler.run()
+
+    except GracefulExit:
+        print("\nReceived Ctrl+C, shutting down gracefully...")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        if server:
+            server.stop()
+            print(server.report())
+        if arm:
+            park(arm)
+        if pico:
+            pico.close()
+        print(scheduler.report())
+
+if __name__ == "__main__":
+    main()
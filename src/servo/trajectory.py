@@ -0,0 +1,251 @@
+import multiprocessing
+import numpy as np
+from scheduler import Scheduler, SERVO_RATE
+
+# Peak velocity and acceleration of the unit minimum-jerk profile
+MIN_JERK_PEAK_VELOCITY = 1.875
+MIN_JERK_PEAK_ACCEL = 5.7735
+
+# Largest joint move between samples time_optimal plans on, µs
+PATH_STEP = 2.0
+
+# Path samples below which time_optimal runs faster in-process than on a pool
+POOL_MIN_SAMPLES = 20000
+
+class Trajectory:
+    """Joint setpoints sampled at the control rate, streamed one row per tick
+
+    The setpoints are computed once when the move is planned; playback
+    only hands out views of the precomputed rows.
+    """
+
+    def __init__(self, setpoints, rate):
+        self.setpoints = setpoints
+        self.rate = rate
+        self.index = 0
+
+    def __len__(self):
+        return len(self.setpoints)
+
+    @property
+    def duration(self):
+        return len(self.setpoints) / self.rate
+
+    @property
+    def done(self):
+        return self.index >= len(self.setpoints)
+
+    def next(self):
+        """The next setpoint row, or None when the move is complete"""
+        if self.index >= len(self.setpoints):
+            return None
+        row = self.setpoints[self.index]
+        self.index += 1
+        return row
+
+    def __iter__(self):
+        while not self.done:
+            yield self.next()
+
+def _samples(duration, rate):
+    n = max(1, int(np.ceil(duration * rate)))
+    return np.arange(1, n + 1) / n, n / rate
+
+def min_jerk(start, end, vmax, amax, rate=SERVO_RATE, duration=None):
+    """Plan a minimum-jerk move; all joints start and finish together
+
+    The duration is the shortest for which every joint stays within its
+    velocity and acceleration limits, or `duration` if that is longer.
+    """
+    start = np.asarray(start, dtype=float)
+    distance = np.abs(np.asarray(end, dtype=float) - start)
+    needed = np.max(np.maximum(MIN_JERK_PEAK_VELOCITY * distance / vmax,
+                               np.sqrt(MIN_JERK_PEAK_ACCEL * distance / amax)))
+    tau, _ = _samples(max(needed, duration or 0.0), rate)
+
+    s = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    setpoints = start + np.outer(s, np.asarray(end, dtype=float) - start)
+    return Trajectory(np.rint(setpoints).astype(np.int32), rate)
+
+def trapezoidal(start, end, vmax, amax, rate=SERVO_RATE, duration=None):
+    """Plan a trapezoidal velocity move; all joints start and finish together
+
+    Each joint accelerates at its own limit, cruises, then decelerates,
+    with the cruise velocity chosen so it arrives at the common end time
+    set by the slowest joint.
+    """
+    start = np.asarray(start, dtype=float)
+    delta = np.asarray(end, dtype=float) - start
+    distance = np.abs(delta)
+
+    # Shortest time per joint: triangular if it never reaches vmax
+    triangular = distance < vmax ** 2 / amax
+    fastest = np.where(triangular, 2 * np.sqrt(distance / amax), distance / vmax + vmax / amax)
+    tau, total = _samples(max(np.max(fastest), duration or 0.0), rate)
+
+    # Cruise velocity that covers the distance in `total` at acceleration amax
+    v = (amax * total - np.sqrt(np.maximum(0.0, (amax * total) ** 2 - 4 * amax * distance))) / 2
+    ta = np.where(v > 0, v / amax, 0.0)
+
+    t = tau[:, None] * total
+    accel = 0.5 * amax * t ** 2
+    cruise = 0.5 * amax * ta ** 2 + v * (t - ta)
+    decel = distance - 0.5 * amax * (total - t) ** 2
+    travelled = np.where(t < ta, accel, np.where(t <= total - ta, cruise, decel))
+
+    setpoints = start + np.sign(delta) * np.minimum(travelled, distance)
+    return Trajectory(np.rint(setpoints).astype(np.int32), rate)
+
+PROFILES = {"min_jerk": min_jerk, "trapezoidal": trapezoidal}
+
+def _acceleration_bounds(dq, ddq, x, amax):
+    """Range of path acceleration allowed at squared path speed x, per sample
+
+    Each joint needs |dq * u + ddq * x| <= amax; joints that barely move
+    along the path (dq ~ 0) only limit x, which the caller handles.
+    """
+    moving = np.abs(dq) > 1e-9
+    safe = np.where(moving, dq, 1.0)
+    a = (amax - ddq * x[:, None]) / safe
+    b = (-amax - ddq * x[:, None]) / safe
+    upper = np.where(moving, np.where(dq > 0, a, b), np.inf)
+    lower = np.where(moving, np.where(dq > 0, b, a), -np.inf)
+    return lower.max(axis=1), upper.min(axis=1)
+
+def _densify(path, step=PATH_STEP):
+    """The path resampled so no joint moves more than `step` µs between samples
+
+    A coarse path's curvature falls between its samples, where the
+    finite differences cannot see it.  New samples lie on the cubic
+    (Catmull-Rom) curve through the old ones, so the corners a straight
+    line between them would add do not slow the move down.
+    """
+    # Every interval gets the same number of samples: an uneven spacing
+    # would itself show up as acceleration
+    gap = int(np.ceil(np.max(np.abs(np.diff(path, axis=0))) / step))
+    if gap <= 1:
+        return path
+    i = np.repeat(np.arange(len(path) - 1), gap)
+    u = np.tile(np.arange(1, gap + 1) / gap, len(path) - 1)[:, None]
+    tangent = np.gradient(path, axis=0)
+    dense = ((2 * u ** 3 - 3 * u ** 2 + 1) * path[i] + (u ** 3 - 2 * u ** 2 + u) * tangent[i]
+             + (-2 * u ** 3 + 3 * u ** 2) * path[i + 1] + (u ** 3 - u ** 2) * tangent[i + 1])
+    return np.vstack([path[:1], dense])
+
+def time_optimal(path, vmax, amax, rate=SERVO_RATE, safety=0.9):
+    """Fastest timing of a joint-space path within each servo's limits
+
+    `path` is (M, joints) pulse widths along the path, starting and
+    ending at rest.  With s the sample index, every joint must satisfy
+    |dq/ds * s'| <= vmax and |dq/ds * s'' + d2q/ds2 * s'^2| <= amax,
+    scaled by `safety`.  The largest feasible s'^2 at each sample (the
+    maximum velocity curve) is found by bisection, vectorized over all
+    samples; a forward pass at maximum acceleration and a backward pass
+    at maximum deceleration then give the time-optimal speed profile,
+    which is sampled at the control rate.  Coarse paths are first
+    resampled to at most PATH_STEP µs between samples.
+    """
+    path = np.asarray(path, dtype=float)
+    if len(path) < 2 or not np.any(path != path[0]):
+        return Trajectory(np.rint(path[-1:]).astype(np.int32), rate)
+    path = _densify(path)
+    vmax = np.asarray(vmax, dtype=float) * safety
+    amax = np.asarray(amax, dtype=float) * safety
+    dq = np.gradient(path, axis=0)
+    ddq = np.gradient(dq, axis=0)
+
+    # Velocity limit, then bisection on the acceleration limit
+    with np.errstate(divide="ignore"):
+        mvc = np.min((vmax / np.abs(dq)) ** 2, axis=1)
+        mvc = np.minimum(mvc, np.min(amax / np.abs(ddq), axis=1))
+    lo = np.zeros(len(path))
+    hi = np.minimum(mvc, 1e12)
+    lower, upper = _acceleration_bounds(dq, ddq, hi, amax)
+    bad = lower > upper
+    for _ in range(40):
+        if not bad.any():
+            break
+        mid = (lo + hi) / 2
+        lower, upper = _acceleration_bounds(dq, ddq, mid, amax)
+        ok = lower <= upper
+        lo = np.where(bad & ok, mid, lo)
+        hi = np.where(bad & ~ok, mid, hi)
+    mvc = np.where(bad, lo, hi)
+
+    x = mvc.copy()
+    x[0] = x[-1] = 0.0
+    for i in range(len(x) - 1):
+        _, up = _acceleration_bounds(dq[i:i + 1], ddq[i:i + 1], x[i:i + 1], amax)
+        x[i + 1] = min(x[i + 1], x[i] + 2 * max(up[0], 0.0))
+    for i in range(len(x) - 1, 0, -1):
+        low, _ = _acceleration_bounds(dq[i:i + 1], ddq[i:i + 1], x[i:i + 1], amax)
+        x[i - 1] = min(x[i - 1], x[i] - 2 * min(low[0], 0.0))
+
+    return Trajectory(np.rint(_sample_profile(path, x, rate)).astype(np.int32), rate)
+
+def _sample_profile(path, x, rate):
+    """Path positions at the control ticks of squared path speed profile `x`
+
+    Between samples the path acceleration is constant, so s(t) is a
+    quadratic in each interval; sampling it there keeps the profile's
+    accelerations, where interpolating linearly in time would not.
+    """
+    speed = np.sqrt(np.maximum(x, 0.0))
+    accel = np.diff(x) / 2
+    dt = 2.0 / np.maximum(speed[:-1] + speed[1:], 1e-12)
+    t = np.concatenate([[0.0], np.cumsum(dt)])
+    n = max(1, int(np.ceil(t[-1] * rate)))
+    times = np.arange(1, n + 1) / n * t[-1]
+    i = np.clip(np.searchsorted(t, times, side="right") - 1, 0, len(dt) - 1)
+    tau = np.minimum(times - t[i], dt[i])
+    s = np.clip(i + speed[i] * tau + 0.5 * accel[i] * tau ** 2, i, i + 1)
+    samples = np.arange(len(path))
+    return np.stack([np.interp(s, samples, path[:, j]) for j in range(path.shape[1])], axis=1)
+
+def plan_segments(arm, segments, rate=SERVO_RATE, safety=0.9, processes=None):
+    """Time-optimal trajectory through several joint-space path segments
+
+    Each segment (M, joints) is timed independently, starting and ending
+    at rest, and the results are joined.  Long paths are spread over a
+    pool of worker processes; short ones are quicker to time in-process.
+    """
+    args = [(segment, arm.vmax, arm.amax, rate, safety) for segment in segments]
+    samples = sum(len(segment) for segment in segments)
+    if len(args) > 1 and processes != 1 and samples >= POOL_MIN_SAMPLES:
+        with multiprocessing.Pool(processes) as pool:
+            trajectories = pool.starmap(time_optimal, args)
+    else:
+        trajectories = [time_optimal(*a) for a in args]
+    return Trajectory(np.concatenate([t.setpoints for t in trajectories]), rate)
+
+def plan_move(arm, targets, profile="min_jerk", rate=SERVO_RATE, duration=None):
+    """Plan a move of the arm's joints from their positions to `targets`
+
+    `targets` is a pulse width array with one entry per joint, or a
+    {joint: µs} dict where unlisted joints stay where they are.  The move
+    starts from where the arm is estimated to be, which may lag behind
+    its last command, and is slowed down where needed to keep within
+    the arm's power budget.
+    """
+    if isinstance(targets, dict):
+        targets = arm.pose(targets)
+    start = arm.estimated_position()
+    trajectory = PROFILES[profile](start, arm.clamp(targets), arm.vmax, arm.amax,
+                                   rate=rate, duration=duration)
+    if arm.power:
+        trajectory = arm.power.limit(trajectory, start)
+    return trajectory
+
+def play(arm, trajectory):
+    """Stream a trajectory to the arm at its rate, blocking until it completes"""
+    scheduler = Scheduler()
+
+    def output():
+        row = trajectory.next()
+        if row is None:
+            scheduler.stop()
+            return
+        arm.set_pulse_array(row)
+
+    scheduler.add("trajectory", trajectory.rate, output)
+    scheduler.run()
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import numpy as np
+from arm import Arm
+from kinematics import Kinematics
+
+WORKSPACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workspace_table")
+
+def joint_limits(arm):
+    """Lower and upper joint angles in radians (us_per_degree may be negative)"""
+    a = arm.pulse_to_angle(arm.min)
+    b = arm.pulse_to_angle(arm.max)
+    return np.minimum(a, b), np.maximum(a, b)
+
+def table_hash(arm, kinematics):
+    """Hash of what a table samples: the arm's joint limits and the kinematic model"""
+    k = kinematics
+    parts = joint_limits(arm) + (k.a, k.alpha, k.d, k.offset, k.base, k.tool)
+    data = np.concatenate([np.ravel(part) for part in parts]).astype(np.float64)
+    return hashlib.sha256(data.tobytes()).hexdigest()
+
+class KDTree:
+    """Nearest-neighbour index over a fixed point set, stored as flat arrays
+
+    The tree is implicit: node i has children 2i+1 and 2i+2 and every node
+    covers half its parent's range of the reordered points, so only the
+    split dimension and value of each internal node are kept.  Leaves are
+    contiguous runs of points, scanned with NumPy.  The arrays can be
+    memory-mapped straight from disk.
+    """
+
+    def __init__(self, points, split_dim, split_val):
+        self.points = points
+        self.split_dim = split_dim
+        self.split_val = split_val
+        self.internal = len(split_dim)
+
+    @staticmethod
+    def build(points, leaf_size=16):
+        """Split the points at the median of their widest dimension
+
+        Returns the permutation that orders the points for the tree and
+        the split dimension and value arrays.
+        """
+        n = len(points)
+        depth = max(0, int(np.ceil(np.log2(max(n, 1) / leaf_size))))
+        internal = 2 ** depth - 1
+        perm = np.arange(n)
+        split_dim = np.zeros(internal, dtype=np.int8)
+        split_val = np.zeros(internal, dtype=points.dtype)
+
+        ranges = [(0, n)]
+        for node in range(internal):
+            lo, hi = ranges[node]
+            mid = (lo + hi) // 2
+            pts = points[perm[lo:hi]]
+            if hi - lo > 1:
+                dim = int(np.argmax(np.ptp(pts, axis=0)))
+                order = np.argpartition(pts[:, dim], mid - lo)
+                perm[lo:hi] = perm[lo:hi][order]
+                split_dim[node] = dim
+                split_val[node] = points[perm[mid], dim]
+            ranges += [(lo, mid), (mid, hi)]
+        return perm, split_dim, split_val
+
+    def query(self, x, k=1, limit=np.inf):
+        """The k nearest points to each target, as (squared distances, indices) sorted nearest first
+
+        x is one target (dims,), giving (k,) arrays, or many (N, dims),
+        giving (N, k).  All targets descend the tree together, one level
+        per step: first to the leaf each falls in, whose k-th nearest
+        point bounds the search, then down every branch that could hold
+        something nearer.  Points further than `limit` are not searched
+        for; missing neighbours have an infinite distance and index -1.
+        """
+        x = np.asarray(x, dtype=float)
+        single = x.ndim == 1
+        x = np.atleast_2d(x)
+        n = len(self.points)
+        depth = int(np.log2(self.internal + 1))
+
+        target = np.arange(len(x))
+        node = np.zeros(len(x), dtype=np.int64)
+        lo = np.zeros(len(x), dtype=np.int64)
+        hi = np.full(len(x), n, dtype=np.int64)
+        for _ in range(depth):
+            right = x[target, self.split_dim[node]] >= self.split_val[node]
+            mid = (lo + hi) // 2
+            node = 2 * node + 1 + right
+            lo, hi = np.where(right, mid, lo), np.where(right, hi, mid)
+        home, _ = self._nearest(x, target, lo, hi, k)
+        bound = np.minimum(home[:, -1], limit * limit)
+
+        node = np.zeros(len(x), dtype=np.int64)
+        lo = np.zeros(len(x), dtype=np.int64)
+        hi = np.full(len(x), n, dtype=np.int64)
+        near = np.zeros(len(x))
+        for _ in range(depth):
+            diff = x[target, self.split_dim[node]] - self.split_val[node]
+            far = np.maximum(near, diff * diff)
+            mid = (lo + hi) // 2
+            left = diff < 0
+            target = np.concatenate([target, target])
+            node = np.concatenate([2 * node + 1, 2 * node + 2])
+            lo, hi = np.concatenate([lo, mid]), np.concatenate([mid, hi])
+            near = np.concatenate([np.where(left, near, far), np.where(left, far, near)])
+            keep = near <= bound[target]
+            target, node, lo, hi, near = target[keep], node[keep], lo[keep], hi[keep], near[keep]
+
+        best_d, best_i = self._nearest(x, target, lo, hi, k)
+        missing = best_d >= limit * limit
+        best_d[missing], best_i[missing] = np.inf, -1
+        if single:
+            return best_d[0], best_i[0]
+        return best_d, best_i
+
+    def _nearest(self, x, target, lo, hi, k):
+        """k nearest points to each target among the leaves lo:hi paired with it, each (N, k)"""
+        size = int(np.max(hi - lo, initial=0))
+        index = lo[:, None] + np.arange(size)
+        inside = index < hi[:, None]
+        index = np.where(inside, index, 0)
+        d = np.sum((self.points[index] - x[target][:, None, :]) ** 2, axis=2)
+        d = np.where(inside, d, np.inf).ravel()
+        index = index.ravel()
+        owner = np.repeat(target, size)
+
+        order = np.lexsort((d, owner))
+        owner, d, index = owner[order], d[order], index[order]
+        rank = np.arange(len(owner)) - np.searchsorted(owner, owner)
+        take = (rank < k) & np.isfinite(d)
+        best_d = np.full((len(x), k), np.inf)
+        best_i = np.full((len(x), k), -1)
+        best_d[owner[take], rank[take]] = d[take]
+        best_i[owner[take], rank[take]] = index[take]
+        return best_d, best_i
+
+class WorkspaceTable:
+    """Sampled joint configurations and their end-effector positions
+
+    Built offline by sampling the joint space within the arm's limits and
+    running forward kinematics on every sample.  The samples are stored
+    as .npy files in KD-tree order and memory-mapped when loaded, so the
+    table costs nothing until it is queried.  A target further than
+    `margin` from every sample is treated as out of reach.
+
+    The metadata records a hash of the joint limits sampled and the
+    kinematic model; loading a table built for a different arm fails,
+    and `ensure` rebuilds it.  The kinematics default to the DH
+    parameters of the config the arm was built from.
+    """
+
+    FILES = ("positions", "pitch", "joints", "split_dim", "split_val")
+
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.meta = meta
+        self.hash = meta["hash"]
+        self.margin = meta["margin"]
+        self.positions = arrays["positions"]
+        self.pitch = arrays["pitch"]
+        self.joints = arrays["joints"]
+        self.tree = KDTree(self.positions, arrays["split_dim"], arrays["split_val"])
+
+    def __len__(self):
+        return len(self.positions)
+
+    @classmethod
+    def build(cls, arm, kinematics=None, samples=200000, path=WORKSPACE_DIR, leaf_size=16, seed=0):
+        """Sample the joint space, run FK and write the table to `path`"""
+        if kinematics is None:
+            kinematics = Kinematics.from_config(arm.config)
+        lower, upper = joint_limits(arm)
+        rng = np.random.default_rng(seed)
+        joints = rng.uniform(lower, upper, (samples, len(lower)))
+
+        pose = kinematics.forward(joints)
+        positions = pose[:, :3, 3]
+        approach = pose[:, :3, 2]
+        bearing = np.arctan2(positions[:, 1], positions[:, 0])
+        pitch = np.arctan2(approach[:, 2], approach[:, 0] * np.cos(bearing) + approach[:, 1] * np.sin(bearing))
+
+        perm, split_dim, split_val = KDTree.build(positions, leaf_size)
+        arrays = {
+            "positions": positions[perm].astype(np.float32),
+            "pitch": pitch[perm].astype(np.float32),
+            "joints": joints[perm].astype(np.float32),
+            "split_dim": split_dim,
+            "split_val": split_val.astype(np.float32),
+        }
+
+        # Gap between neighbouring samples: a target further than this
+        # from every sample lies outside the sampled workspace
+        tree = KDTree(arrays["positions"], split_dim, arrays["split_val"])
+        probe = rng.choice(samples, min(samples, 1000), replace=False)
+        gaps = np.sqrt(tree.query(arrays["positions"][probe], k=2)[0][:, 1])
+        meta = {
+            "hash": table_hash(arm, kinematics),
+            "samples": samples,
+            "leaf_size": leaf_size,
+            "margin": float(2 * np.percentile(gaps, 99)),
+            "built": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+        os.makedirs(path, exist_ok=True)
+        for name in cls.FILES:
+            out = np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="w+",
+                                            dtype=arrays[name].dtype, shape=arrays[name].shape)
+            out[:] = arrays[name]
+            out.flush()
+            del out
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        return cls.load(arm, path, kinematics)
+
+    @classmethod
+    def load(cls, arm, path=WORKSPACE_DIR, kinematics=None):
+        """Memory-map a table, failing if it was built for a different arm"""
+        if kinematics is None:
+            kinematics = Kinematics.from_config(arm.config)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["hash"] != table_hash(arm, kinematics):
+            raise ValueError(f"Workspace table in {path} is stale, rebuild it with workspace.py")
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+                  for name in cls.FILES}
+        return cls(path, meta, arrays)
+
+    @classmethod
+    def is_current(cls, arm, path=WORKSPACE_DIR, kinematics=None):
+        if kinematics is None:
+            kinematics = Kinematics.from_config(arm.config)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                return json.load(f)["hash"] == table_hash(arm, kinematics)
+        except (OSError, ValueError, KeyError):
+            return False
+
+    @classmethod
+    def ensure(cls, arm, path=WORKSPACE_DIR, kinematics=None, **kwargs):
+        """Load the table, building it first if it is missing or stale"""
+        if cls.is_current(arm, path, kinematics):
+            return cls.load(arm, path, kinematics)
+        return cls.build(arm, kinematics, path=path, **kwargs)
+
+    def nearest(self, targets, limit=np.inf):
+        """Distance (m) to and index of the nearest sample for each target, each (N,)
+
+        All targets are looked up in one pass down the tree.  Targets
+        with no sample within `limit` get an infinite distance and index
+        -1 without searching the rest of the table.
+        """
+        d, i = self.tree.query(np.atleast_2d(targets), limit=limit)
+        return np.sqrt(d[:, 0]), i[:, 0]
+
+    def seeds(self, targets):
+        """Joint angles and pitch of the nearest samples, and which targets are in reach"""
+        distance, index = self.nearest(targets, limit=self.margin)
+        index = np.maximum(index, 0)
+        return (np.asarray(self.joints[index], dtype=float),
+                np.asarray(self.pitch[index], dtype=float),
+                distance <= self.margin)
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    arm = Arm(None)
+
+    if WorkspaceTable.is_current(arm) and len(sys.argv) <= 1:
+        table = WorkspaceTable.load(arm)
+        print(f"Workspace table is up to date ({len(table)} samples, built {table.meta['built']})")
+        return
+
+    start = time.perf_counter()
+    table = WorkspaceTable.build(arm, samples=samples)
+    print(f"Built {len(table)} samples in {time.perf_counter() - start:.1f}s")
+    print(f"Reach margin: {table.margin * 1000:.1f}mm")
+
+    targets = table.positions[np.random.default_rng(1).choice(len(table), 1000)]
+    start = time.perf_counter()
+    table.nearest(targets)
+    batch = (time.perf_counter() - start) / len(targets)
+    start = time.perf_counter()
+    for target in targets[:100]:
+        table.nearest(target)
+    single = (time.perf_counter() - start) / 100
+    print(f"Nearest-sample lookup: {batch * 1e6:.1f}µs per target in a batch of {len(targets)}, "
+          f"{single * 1e6:.1f}µs alone")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The arm scripts import each other and picod by plain module name
+SERVO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "servo")
+sys.path[:0] = [SERVO_DIR, os.path.join(SERVO_DIR, "picod", "PYTHON")]
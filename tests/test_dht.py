@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import dht
+
+def burst(data, start=1000, leading=(80, 160)):
+    """Rising edge ticks of a read sending the bytes `data`, after the sensor's response edges"""
+    bits = np.unpackbits(np.array(data, dtype=np.uint8))
+    deltas = list(leading) + [120 if bit else 76 for bit in bits]
+    return start + np.concatenate([[0], np.cumsum(deltas)])
+
+def with_checksum(data):
+    return list(data) + [sum(data) & 0xff]
+
+def test_dht22_reading():
+    # 65.2% RH, 35.1C
+    ticks = burst(with_checksum([0x02, 0x8c, 0x01, 0x5f]))
+    assert dht.decode_burst(ticks) == (dht.DHT_GOOD, 35.1, 65.2)
+
+def test_dht22_negative_temperature():
+    ticks = burst(with_checksum([0x01, 0xf4, 0x80, 0x65]))
+    assert dht.decode_burst(ticks) == (dht.DHT_GOOD, -10.1, 50.0)
+
+def test_dht11_reading():
+    ticks = burst(with_checksum([45, 0, 23, 0]))
+    assert dht.decode_burst(ticks) == (dht.DHT_GOOD, 23, 45)
+
+def test_bad_checksum():
+    data = with_checksum([0x02, 0x8c, 0x01, 0x5f])
+    data[4] ^= 1
+    assert dht.decode_burst(burst(data))[0] == dht.DHT_BAD_CHECKSUM
+
+@pytest.mark.parametrize("edges", [0, 1, 20, 40])
+def test_short_reads_time_out(edges):
+    ticks = burst(with_checksum([0x02, 0x8c, 0x01, 0x5f]))[:edges]
+    assert dht.decode_burst(ticks)[0] == dht.DHT_TIMEOUT
+
+def test_only_the_last_burst_is_decoded():
+    old = burst(with_checksum([0x02, 0x8c, 0x01, 0x5f]))
+    new = burst(with_checksum([0x01, 0xf4, 0x00, 0xfa]), start=old[-1] + 2 * dht.BURST_GAP_US)
+    assert dht.decode_burst(np.concatenate([old, new])) == (dht.DHT_GOOD, 25.0, 50.0)
+
+def test_tick_wrap():
+    ticks = burst(with_checksum([0x02, 0x8c, 0x01, 0x5f]), start=(1 << 32) - 500) % (1 << 32)
+    assert dht.decode_burst(ticks) == (dht.DHT_GOOD, 35.1, 65.2)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from ik import IKSolver
+from simulator import Simulator
+from workspace import WorkspaceTable
+
+@pytest.fixture(scope="module", params=[False, True], ids=["no table", "table"])
+def solver(request, tmp_path_factory):
+    arm = Simulator().arm
+    table = None
+    if request.param:
+        table = WorkspaceTable.ensure(arm, path=str(tmp_path_factory.mktemp("workspace_table")))
+    return arm, IKSolver.from_arm(arm, table=table)
+
+def test_round_trip(solver):
+    arm, ik = solver
+    q = np.random.default_rng(3).uniform(ik.lower, ik.upper, (500, len(arm)))
+    positions = ik.kin.positions(q)
+    solved, ok, error = ik.solve_batch(positions, arm.pulse_to_angle(arm.position))
+    assert ok.mean() > 0.95
+    assert (error[ok] < ik.tolerance).all()
+    assert np.allclose(ik.kin.positions(solved[ok]), positions[ok], atol=ik.tolerance)
+    assert ((solved >= ik.lower - 1e-9) & (solved <= ik.upper + 1e-9)).all()
+
+def test_round_trip_keeps_the_seed_pose(solver):
+    arm, ik = solver
+    q = np.random.default_rng(4).uniform(ik.lower, ik.upper, len(arm)) * 0.5
+    pitch, roll = ik.pitch_roll(q)
+    solved, ok = ik.solve(ik.kin.positions(q)[0], q, pitch[0], roll[0])
+    assert ok
+    assert np.allclose(solved, q, atol=1e-3)
+
+def test_every_reachable_target_is_in_the_envelope(solver):
+    arm, ik = solver
+    q = np.random.default_rng(5).uniform(ik.lower, ik.upper, (5000, len(arm)))
+    assert ik.in_envelope(ik.kin.positions(q)).all()
+
+def test_unreachable_targets_fail_at_once(solver, monkeypatch):
+    arm, ik = solver
+    centre, near, far = ik.envelope
+    targets = centre + np.array([[far + 0.05, 0, 0], [0, 0, -(far + 0.05)], [near / 2, 0, 0]])
+
+    def searched(*args):
+        raise AssertionError("searched for an unreachable target")
+
+    monkeypatch.setattr(ik, "_search_pitch", searched)
+    monkeypatch.setattr(ik, "_dls", searched)
+    _, ok, _ = ik.solve_batch(targets, arm.pulse_to_angle(arm.position))
+    assert not ok.any()
+
+def test_a_table_is_stale_once_the_sampled_limits_change(tmp_path):
+    arm = Simulator().arm
+    path = str(tmp_path)
+    WorkspaceTable.build(arm, samples=2000, path=path)
+    assert WorkspaceTable.is_current(arm, path)
+
+    arm.max[0] -= 100
+    assert not WorkspaceTable.is_current(arm, path)
+    with pytest.raises(ValueError):
+        WorkspaceTable.load(arm, path)
+    assert len(WorkspaceTable.ensure(arm, path, samples=1000)) == 1000
+    assert WorkspaceTable.is_current(arm, path)
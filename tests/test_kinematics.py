@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from kinematics import Kinematics
+
+def dh_matrix(theta, a, alpha, d):
+    """Standard DH link transform, written out in full"""
+    ct, st, ca, sa = np.cos(theta), np.sin(theta), np.cos(alpha), np.sin(alpha)
+    return np.array([
+        [ct, -st * ca, st * sa, a * ct],
+        [st, ct * ca, -ct * sa, a * st],
+        [0.0, sa, ca, d],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+
+def transform(rng):
+    """A random rigid transform"""
+    q, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    out = np.eye(4)
+    out[:3, :3] = q * np.sign(np.linalg.det(q))
+    out[:3, 3] = rng.normal(size=3) * 0.1
+    return out
+
+@pytest.fixture(params=["config", "random"])
+def kin(request):
+    if request.param == "config":
+        return Kinematics.from_config()
+    rng = np.random.default_rng(7)
+    dh = np.column_stack([rng.uniform(-0.2, 0.2, 5), rng.uniform(-np.pi, np.pi, 5),
+                          rng.uniform(-0.2, 0.2, 5), rng.uniform(-np.pi, np.pi, 5)])
+    return Kinematics(dh, base=transform(rng), tool=transform(rng))
+
+def configurations(kin, n=50):
+    return np.random.default_rng(8).uniform(-np.pi, np.pi, (n, kin.joints))
+
+def test_forward_matches_dh_product(kin):
+    q = configurations(kin)
+    expected = []
+    for row in q:
+        pose = kin.base
+        for i, angle in enumerate(row):
+            pose = pose @ dh_matrix(angle + kin.offset[i], kin.a[i], kin.alpha[i], kin.d[i])
+        expected.append(pose @ kin.tool)
+    assert np.allclose(kin.forward(q), expected)
+    assert np.allclose(kin.forward_all(q)[:, -1], expected)
+    assert np.allclose(kin.forward(q[0]), expected[0])
+
+def test_jacobian_matches_numeric_differentiation(kin):
+    q = configurations(kin)
+    h = 1e-6
+    J = kin.jacobian(q)
+    rotation = kin.forward(q)[:, :3, :3]
+    for i in range(kin.joints):
+        step = np.zeros(kin.joints)
+        step[i] = h
+        linear = (kin.positions(q + step) - kin.positions(q - step)) / (2 * h)
+        assert np.allclose(J[:, :3, i], linear, atol=1e-6)
+
+        # dR R^T is the skew matrix of the angular velocity
+        dR = (kin.forward(q + step)[:, :3, :3] - kin.forward(q - step)[:, :3, :3]) / (2 * h)
+        skew = dR @ rotation.transpose(0, 2, 1)
+        angular = np.stack([skew[:, 2, 1], skew[:, 0, 2], skew[:, 1, 0]], axis=1)
+        assert np.allclose(J[:, 3:, i], angular, atol=1e-6)
+
+def test_reach_bounds_every_position():
+    kin = Kinematics.from_config()
+    q = np.random.default_rng(9).uniform(-np.pi, np.pi, (5000, kin.joints))
+    assert (np.linalg.norm(kin.positions(q), axis=1) <= kin.reach + 1e-12).all()
@@ -0,0 +1,61 @@
+import numpy as np
+from motion import MotionQueue
+from simulator import Simulator
+
+def run(queue, ticks=1000):
+    """Tick the queue until it is idle, returning the commanded pose of every tick"""
+    poses = []
+    for _ in range(ticks):
+        if queue.idle():
+            break
+        queue.tick()
+        poses.append(queue.commanded.copy())
+    assert queue.idle()
+    return np.array(poses)
+
+def pose(arm, offsets):
+    return {joint: int(arm.home[i]) + offset for i, (joint, offset) in enumerate(zip(arm.ids, offsets))}
+
+def test_cancelling_a_blended_move_leaves_no_offset():
+    arm = Simulator().arm
+    queue = MotionQueue(arm, blend=0.5)
+    first = queue.move_to(pose(arm, [400, 0, 0, 0, 0]), duration=1.0)
+    second = queue.move_to(pose(arm, [400, 300, 0, 0, 0]), duration=1.0)
+    for _ in range(40):
+        queue.tick()
+    assert not second.done and second.state == "running"
+
+    first.cancel()
+    run(queue)
+    assert second.state == "done"
+    assert np.array_equal(queue.commanded, second.target)
+    assert np.array_equal(arm.position, second.target)
+
+def test_blended_moves_stay_within_vmax():
+    arm = Simulator().arm
+    queue = MotionQueue(arm, blend=1.0)
+    # Two fast moves the same way overlap at full speed
+    far = [600, 600, 600, 600, 600]
+    queue.move_to(pose(arm, [o // 2 for o in far]))
+    last = queue.move_to(pose(arm, far))
+    poses = run(queue)
+    steps = np.abs(np.diff(poses, axis=0))
+    assert (steps <= queue.max_step).all()
+    assert np.array_equal(queue.commanded, last.target)
+
+def test_emergency_stop_goes_out_before_motion_is_cancelled():
+    arm = Simulator().arm
+    stops = []
+    stop_all_outputs = arm.pico.stop_all_outputs
+
+    def recording(gpios=None):
+        stops.append(arm.motion is not None)
+        return stop_all_outputs(gpios)
+
+    arm.pico.stop_all_outputs = recording
+    arm.move_to(pose(arm, [400, 300, 0, 0, 0]), duration=1.0)
+    arm.emergency_stop()
+    # The first stop is sent while the control loop still runs
+    assert stops[0]
+    assert arm.motion is None
+    assert not arm.active.any()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from patterns import Expression, evaluate, load_patterns
+
+def test_expressions_match_numpy():
+    t = np.linspace(0, 5, 11)
+    value = evaluate("center + 200 * sin(2 * pi * t / 5) - -abs(t) ** 2 / 4 % 3", t, center=1500.0)
+    expected = 1500.0 + 200 * np.sin(2 * np.pi * t / 5) - -np.abs(t) ** 2 / 4 % 3
+    assert np.allclose(value, expected)
+    assert evaluate(3, t).shape == t.shape
+
+@pytest.mark.parametrize("source", [
+    "__import__('os').system('true')",
+    "t.__class__",
+    "(1).real",
+    "open('x')",
+    "sin(t, out=t)",
+    "lambda: 1",
+    "[t][0]",
+    "t if t else 1",
+    "t < 1",
+    "True",
+    "'text'",
+    "unknown + 1",
+    "1 +",
+])
+def test_anything_else_is_refused_when_parsed(source):
+    with pytest.raises(ValueError):
+        Expression(source)
+
+def test_missing_names_are_value_errors():
+    with pytest.raises(ValueError):
+        evaluate("center + 1")
+
+def test_patterns_are_parsed_when_loaded():
+    for spec in load_patterns().values():
+        for entry in spec.get("joints", {}).values():
+            if isinstance(entry, dict):
+                assert all(not isinstance(frame[1], str) for frame in entry["keyframes"])
+            else:
+                assert not isinstance(entry, str)
@@ -0,0 +1,207 @@
+import struct
+import threading
+import time
+import picod
+
+class FakeLink:
+    """Stands in for the serial link: logs each message and answers REPLY_NOW requests
+
+    A tick request is answered with the number of the reply queue it
+    came from, so a thread can tell whether it got its own reply.
+    """
+
+    def __init__(self, pico, delay=0.005, write_time=0.0):
+        self.pico = pico
+        self.delay = delay
+        self.write_time = write_time
+        self.messages = []  # the requests of each message, [(req, flags, data)]
+        pico._writer._write = self.write
+
+    def write(self, msg):
+        msg = bytes(msg)
+        body = msg[5:-2]
+        requests = []
+        i = 0
+        while i < len(body):
+            length, flags, req = struct.unpack_from(">HBB", body, i)
+            requests.append((req, flags, body[i + 4:i + length]))
+            i += length
+        self.messages.append(requests)
+        if self.write_time:
+            time.sleep(self.write_time)
+        for req, flags, data in requests:
+            if flags >> 6 == picod.REPLY_NOW:
+                queue = flags & 63
+                reply = bytes([req, picod.STATUS_OKAY])
+                if req == picod._CMD_TICK:
+                    reply += struct.pack(">I", queue)
+                threading.Timer(self.delay, self.pico._sync[queue].append, (reply,)).start()
+
+    def servo_writes(self):
+        """(gpio, high steps) of every servo request sent, in order"""
+        return [(data[0], struct.unpack(">H", data[4:6])[0])
+                for requests in self.messages for req, _, data in requests
+                if req == picod._CMD_SERVO]
+
+def null_pico():
+    return picod.pico(transport="null")
+
+def test_threads_get_their_own_replies():
+    pico = null_pico()
+    FakeLink(pico)
+    results = {}
+
+    def ask(name):
+        queue = pico._reply_queue()
+        got = [pico.tick() for _ in range(5)]
+        results[name] = (queue, got)
+
+    threads = [threading.Thread(target=ask, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    ask("main")
+    for t in threads:
+        t.join()
+
+    queues = [queue for queue, _ in results.values()]
+    assert len(set(queues)) == len(queues)
+    for queue, got in results.values():
+        assert got == [(picod.STATUS_OKAY, queue)] * 5
+
+def test_writer_drops_output_messages_from_before_a_cancel():
+    written = []
+    writer = picod._writer(written.append)
+    old = writer.generation
+    writer.cancel()
+    assert writer.write(b"setpoint", picod.PRIORITY_HIGH, old) is None
+    assert writer.write(b"other", picod.PRIORITY_HIGH) is not None
+    assert writer.write(b"new", picod.PRIORITY_HIGH, writer.generation) is not None
+    assert written == [b"other", b"new"]
+
+def wait_until(condition, timeout=1.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.001)
+
+def test_stop_goes_ahead_of_setpoints_and_cancels_them():
+    pico = null_pico()
+    link = FakeLink(pico, write_time=0.05)
+
+    # A bulk transfer holds the link while setpoints queue up behind it
+    bulk = threading.Thread(target=pico.i2c_write, args=(0, 0x40, bytes(100)),
+                            kwargs={"reply": picod.REPLY_NONE})
+    bulk.start()
+    wait_until(lambda: link.messages)
+    setpoints = [threading.Thread(target=pico.tx_servo, args=(gpio, 1500),
+                                  kwargs={"reply": picod.REPLY_NONE}) for gpio in (2, 3, 4)]
+    for t in setpoints:
+        t.start()
+    wait_until(lambda: sum(pico._writer._waiting) == 3)
+
+    status, written, acked = pico.stop_all_outputs([2, 3, 4])
+    for t in [bulk] + setpoints:
+        t.join()
+
+    assert status == picod.STATUS_OKAY
+    assert link.servo_writes() == [(2, 0), (3, 0), (4, 0)]
+    assert pico._writer.cancelled == 3
+    # Written right after the bulk transfer in flight, not after the setpoints
+    assert written < 0.15
+
+    # Setpoints made after the stop go out
+    pico.tx_servo(2, 1500, reply=picod.REPLY_NONE)
+    assert link.servo_writes()[-1][0] == 2
+    assert link.servo_writes()[-1][1] > 0
+
+def test_stop_drops_held_setpoints():
+    pico = null_pico()
+    link = FakeLink(pico)
+    pico.coalesce(window=0.5)
+    pico.tx_servo(2, 1500, reply=picod.REPLY_NONE)
+    pico.stop_all_outputs([2])
+    pico.coalesce(0)
+    assert link.servo_writes() == [(2, 0)]
+
+def coalescing_pico(window=0.5):
+    pico = null_pico()
+    link = FakeLink(pico)
+    pico.coalesce(window=window)
+    return pico, link
+
+def test_coalescer_sends_the_latest_write_of_each_servo_in_one_message():
+    pico, link = coalescing_pico()
+    for width in (1000, 1200, 1400):
+        for gpio in (2, 3, 4):
+            pico.tx_servo(gpio, width + gpio, reply=picod.REPLY_NONE)
+    assert link.messages == []
+    pico.coalesce(0)
+
+    assert len(link.messages) == 1
+    expected = [(gpio, picod._servo_raw(1400 + gpio, 50)[2]) for gpio in (2, 3, 4)]
+    assert link.servo_writes() == expected
+    assert pico.coalesce_stats() == (0, 0, 0)  # coalescing is off again
+
+def test_coalescer_stats():
+    pico, link = coalescing_pico()
+    for width in (1000, 1500):
+        pico.tx_servo(2, width, reply=picod.REPLY_NONE)
+    pico._coalescer.flush()
+    assert pico.coalesce_stats() == (2, 1, 1)
+    pico.coalesce(0)
+
+def test_gpio_writes_supersede_earlier_ones():
+    pico, link = coalescing_pico()
+    pico.gpio_write(5, 1)
+    pico.gpio_write(6, 1)
+    pico.gpio_write(5, 0)
+    pico.coalesce(0)
+    writes = [data for requests in link.messages for req, _, data in requests
+              if req == picod._CMD_GPIO_WRITE]
+    masks = [struct.unpack_from(">I", data)[0] for data in writes]
+    assert masks == [1 << 6, 1 << 5]
+
+def test_nothing_is_superseded_across_a_barrier():
+    pico, link = coalescing_pico()
+    pico.tx_servo(2, 1000, reply=picod.REPLY_NONE)
+    pico.gpio_set_output(7, 1)
+    pico.tx_servo(2, 2000, reply=picod.REPLY_NONE)
+    pico.coalesce(0)
+    assert len(link.messages) == 1
+    assert [req for req, _, _ in link.messages[0]] == \
+        [picod._CMD_SERVO, picod._CMD_GPIO_SET_IN_OUT, picod._CMD_SERVO]
+    assert [high for _, high in link.servo_writes()] == \
+        [picod._servo_raw(w, 50)[2] for w in (1000, 2000)]
+
+def test_a_request_for_a_reply_goes_out_behind_the_held_writes():
+    pico, link = coalescing_pico()
+    pico.tx_servo(2, 1000, reply=picod.REPLY_NONE)
+    pico.tx_servo(3, 1000, reply=picod.REPLY_NONE)
+    assert pico.tick()[0] == picod.STATUS_OKAY
+    assert len(link.messages) == 1
+    assert [req for req, _, _ in link.messages[0]] == \
+        [picod._CMD_SERVO, picod._CMD_SERVO, picod._CMD_TICK]
+    pico.coalesce(0)
+
+def test_stop_is_not_held_up_by_a_coalesced_write_in_flight():
+    pico = null_pico()
+    link = FakeLink(pico, write_time=0.05)
+    pico.coalesce(size=17)  # every servo write fills a message
+
+    bulk = threading.Thread(target=pico.i2c_write, args=(0, 0x40, bytes(100)),
+                            kwargs={"reply": picod.REPLY_NONE})
+    bulk.start()
+    wait_until(lambda: link.messages)
+    setpoint = threading.Thread(target=pico.tx_servo, args=(2, 1500),
+                                kwargs={"reply": picod.REPLY_NONE})
+    setpoint.start()
+    # The setpoint's message is taken and waits behind the bulk one
+    wait_until(lambda: pico._coalescer._tickets == 2)
+
+    pico.stop_all_outputs([2])
+    for t in (bulk, setpoint):
+        t.join()
+    pico.coalesce(0)
+
+    assert link.servo_writes() == [(2, 0)]
+    assert pico._writer.cancelled == 1
@@ -0,0 +1,70 @@
+import pytest
+from scheduler import Scheduler
+
+class FakeClock:
+    """Simulated time: sleeping advances it, and every reading moves it on a microsecond"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        self.now += 1e-6
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def scheduler():
+    clock = FakeClock()
+    return clock, Scheduler(clock=clock, sleep=clock.sleep)
+
+def test_tasks_run_on_absolute_deadlines():
+    clock, s = scheduler()
+    starts = []
+    task = s.add("work", 50, lambda: starts.append(clock.now))
+    first = task.deadline
+    for _ in range(100):
+        s.run_once()
+    # Deadlines do not drift however long the task's bookkeeping takes
+    for n, start in enumerate(starts):
+        assert start == pytest.approx(first + n * 0.02, abs=1e-5)
+    assert task.overruns == task.skipped == 0
+    assert s.stats()["work"]["late_max_us"] < 10
+
+def test_rates_interleave():
+    clock, s = scheduler()
+    runs = []
+    s.add("fast", 100, lambda: runs.append("fast"))
+    s.add("slow", 25, lambda: runs.append("slow"))
+    for _ in range(50):
+        s.run_once()
+    assert runs.count("fast") == 4 * runs.count("slow")
+
+def test_overrun_skips_missed_periods():
+    clock, s = scheduler()
+    calls = []
+
+    def work():
+        calls.append(clock.now)
+        if len(calls) == 3:
+            clock.sleep(0.075)
+
+    task = s.add("work", 50, work)
+    first = task.deadline
+    for _ in range(6):
+        s.run_once()
+    # It ends 15ms into the sixth period: the fourth and fifth are
+    # skipped, the sixth runs late and the next is back on the grid
+    assert task.overruns == 1
+    assert task.skipped == 2
+    assert calls[3] == pytest.approx(first + 0.115, abs=1e-5)
+    assert calls[4] == pytest.approx(first + 6 * 0.02, abs=1e-5)
+
+def test_lateness_histogram():
+    clock, s = scheduler()
+    s.add("work", 50, lambda: None)
+    s.run_once()
+    counts, edges = s.histogram("work")
+    assert counts.sum() == 1 and counts[0] == 1
+    with pytest.raises(KeyError):
+        s.histogram("missing")
@@ -0,0 +1,86 @@
+import time
+import numpy as np
+import pytest
+from teleop import FakeSender, Mailbox, RESYNC, STALE, TeleopServer, decode, encode
+
+class FakeClock:
+    def __init__(self):
+        self.now = 10.0
+
+    def __call__(self):
+        return self.now
+
+def sample(seq, received):
+    return decode(encode(seq, (0.1, 0.2, 0.3)), received=received)
+
+def test_only_newer_samples_are_accepted():
+    clock = FakeClock()
+    box = Mailbox(clock=clock)
+    assert box.put(sample(5, clock.now))
+    assert not box.put(sample(4, clock.now))
+    assert not box.put(sample(5, clock.now))
+    assert box.put(sample(6, clock.now))
+    assert box.take().seq == 6
+    assert (box.accepted, box.dropped, box.skipped) == (2, 2, 1)
+
+def test_each_sample_is_taken_once():
+    clock = FakeClock()
+    box = Mailbox(clock=clock)
+    assert box.take() is None
+    box.put(sample(1, clock.now))
+    assert box.take().seq == 1
+    assert box.take() is None
+    box.put(sample(2, clock.now))
+    assert box.take().seq == 2
+
+def test_sequence_numbers_wrap():
+    clock = FakeClock()
+    box = Mailbox(clock=clock)
+    box.put(sample(0xFFFFFFFE, clock.now))
+    assert box.put(sample(0xFFFFFFFF, clock.now))
+    assert box.put(sample(0, clock.now))
+    assert box.put(sample(1, clock.now))
+    assert not box.put(sample(0xFFFFFFFF, clock.now))
+    assert box.take().seq == 1
+
+def test_a_restarted_sender_is_taken_after_resync():
+    clock = FakeClock()
+    box = Mailbox(clock=clock)
+    box.put(sample(1000, clock.now))
+    assert not box.put(sample(0, clock.now + RESYNC / 2))
+    clock.now += RESYNC
+    assert box.put(sample(0, clock.now))
+    assert box.take().seq == 0
+
+def test_stale_samples_are_not_taken():
+    clock = FakeClock()
+    box = Mailbox(clock=clock)
+    box.put(sample(1, clock.now))
+    clock.now += STALE * 2
+    assert box.take() is None
+    assert box.age() == pytest.approx(STALE * 2)
+    assert Mailbox().age() == np.inf
+
+def test_server_receives_a_fake_sender_over_loopback():
+    server = TeleopServer(host="127.0.0.1", port=0)
+    port = server.start()
+    sender = FakeSender(port=port, rate=500.0, reorder=0.2, seed=1)
+    try:
+        sender.start()
+        time.sleep(0.3)
+        sender.stop()
+        end = time.monotonic() + 1.0
+        while server.received < sender.sent and time.monotonic() < end:
+            time.sleep(0.01)
+    finally:
+        server.stop()
+
+    box = server.mailbox
+    assert sender.sent > 50
+    assert server.received == sender.sent
+    assert server.malformed == 0
+    # Each packet held back arrives after a newer one and is dropped
+    assert box.dropped > 0
+    assert box.accepted + box.dropped == server.received
+    assert server.report().startswith(f"{sender.sent} received, {box.accepted} accepted, "
+                                      f"{box.dropped} out of order")
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from trajectory import min_jerk, time_optimal, trapezoidal
+
+RATE = 50
+VMAX = np.array([3333.0, 3333.0, 3333.0, 3022.0, 5555.0])
+AMAX = np.array([16666.0, 16666.0, 13333.0, 11111.0, 33333.0])
+
+# Rounding each setpoint to a whole µs moves a second difference by up to 2 µs
+ROUNDING = 2 * RATE ** 2
+
+def curve(samples):
+    th = np.linspace(0, np.pi, samples)
+    return np.stack([1500 + 400 * np.cos(th), 1500 + 400 * np.sin(th), 1500 + 300 * np.sin(2 * th),
+                     1500 + 200 * np.cos(3 * th), 1500 + 0 * th], axis=1)
+
+def played(path, trajectory):
+    """Setpoints as the servos see them: at rest at the start, then held at the end"""
+    return np.vstack([path[:1], trajectory.setpoints, trajectory.setpoints[-1:]]).astype(float)
+
+PATHS = {
+    "straight": np.linspace([1000] * 5, [2000] * 5, 20),
+    "skewed": np.linspace([1000] * 5, [2000, 1500, 1200, 1800, 1000], 20),
+    "coarse curve": curve(20),
+    "curve": curve(200),
+    "dense curve": curve(2000),
+}
+
+MOVES = {
+    "all joints": ([1000] * 5, [2000] * 5),
+    "one joint": ([1500] * 5, [1500, 1500, 2100, 1500, 1500]),
+    "mixed": ([1000, 2000, 1500, 1200, 1800], [2000, 1000, 1510, 2200, 800]),
+    "short": ([1500] * 5, [1520, 1490, 1500, 1503, 1500]),
+}
+
+@pytest.mark.parametrize("profile", [min_jerk, trapezoidal])
+@pytest.mark.parametrize("name", MOVES)
+def test_profile_limits(profile, name):
+    start, end = (np.array(p, dtype=float) for p in MOVES[name])
+    trajectory = profile(start, end, VMAX, AMAX, rate=RATE)
+    setpoints = played(start[None], trajectory)
+    velocity = np.abs(np.diff(setpoints, axis=0)) * RATE
+    accel = np.abs(np.diff(setpoints, n=2, axis=0)) * RATE ** 2
+    assert np.all(velocity <= VMAX + RATE)
+    assert np.all(accel <= AMAX + ROUNDING)
+    assert np.array_equal(trajectory.setpoints[-1], np.rint(end))
+
+@pytest.mark.parametrize("profile", [min_jerk, trapezoidal])
+def test_profile_duration(profile):
+    start, end = np.full(5, 1000.0), np.full(5, 2000.0)
+    fastest = profile(start, end, VMAX, AMAX, rate=RATE)
+    # Every joint finishes together, and a longer duration is kept
+    assert len(np.unique(np.argmax(fastest.setpoints == np.rint(end), axis=0))) == 1
+    assert profile(start, end, VMAX, AMAX, rate=RATE, duration=3.0).duration == pytest.approx(3.0)
+    assert profile(start, end, VMAX, AMAX, rate=RATE, duration=0.01).duration == fastest.duration
+
+@pytest.mark.parametrize("name", PATHS)
+def test_time_optimal_limits(name):
+    path = PATHS[name]
+    trajectory = time_optimal(path, VMAX, AMAX, rate=RATE)
+    setpoints = played(path, trajectory)
+    velocity = np.abs(np.diff(setpoints, axis=0)) * RATE
+    accel = np.abs(np.diff(setpoints, n=2, axis=0)) * RATE ** 2
+    assert np.all(velocity <= VMAX + RATE)
+    assert np.all(accel <= AMAX + ROUNDING)
+    assert np.array_equal(trajectory.setpoints[-1], np.rint(path[-1]))
+
+def test_time_optimal_uses_the_limits():
+    # The straight move is acceleration limited: it should not be far slower than bang-bang
+    path = PATHS["straight"]
+    trajectory = time_optimal(path, VMAX, AMAX, rate=RATE)
+    distance = 1000.0
+    fastest = max(2 * np.sqrt(distance / (0.9 * AMAX.min())), distance / (0.9 * VMAX.min()))
+    assert trajectory.duration < fastest * 1.3